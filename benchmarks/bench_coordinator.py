@@ -0,0 +1,253 @@
+# benchmarks/bench_coordinator.py
+"""
+Multi-worker run on one host: a local coordinator (src/coordinator/server.py)
+owns a synthetic notebook's queue and N worker processes, sharing one data
+directory (and so the notebook's near-duplicate and answer indexes), lease
+batches from it over HTTP and push their results back. Workers use the stub
+generator and stub verifiers of bench_pipeline; afterwards every row of the
+shared near-duplicate index and every duplicate_of link is checked against
+the committed cards.
+
+--kill-after S kills the first worker S seconds after it is up (model imports
+take several seconds); its leased chunks are
+handed out again once their lease (--lease-seconds) expires, and the run checks
+that every chunk still ends up COMPLETED exactly once.
+
+Usage:
+    PYTHONPATH=src python3 benchmarks/bench_coordinator.py --workers 4 --batch 8
+    PYTHONPATH=src python3 benchmarks/bench_coordinator.py --workers 3 --kill-after 2 --lease-seconds 5
+"""
+
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+NOTEBOOK = "bench"
+ROOT = Path(__file__).resolve().parent.parent
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def base_env(data_dir):
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": os.pathsep.join([str(ROOT / "src"), str(Path(__file__).resolve().parent)]),
+        "ZERO_DATA_DIR": str(data_dir),
+        "TARGET_NOTEBOOK": NOTEBOOK,
+        "ZERO_METRICS_ENABLED": "false",
+        "HF_HUB_OFFLINE": "1",
+        "TRANSFORMERS_OFFLINE": "1",
+        "TQDM_DISABLE": "1",
+    })
+    return env
+
+def populate(data_dir, args):
+    """
+    Chunks a synthetic corpus into the coordinator's database; returns the chunk count.
+    """
+    os.environ.update(base_env(data_dir))
+    sys.path[:0] = [str(ROOT / "src"), str(Path(__file__).resolve().parent)]
+    from corpus import CorpusGenerator
+    from ingestion.chunker import SemanticChunker
+    from db.db_manager import DBManager
+
+    db = DBManager(Path(data_dir) / "zeroloss.db")
+    chunker = SemanticChunker()
+    count = 0
+    for filename, markdown in CorpusGenerator(args.seed).documents(args.docs, args.doc_chars, "markdown"):
+        db.add_document_to_library(filename, NOTEBOOK)
+        for chunk in chunker.chunk_text(markdown, metadata={"source_file": filename, "path": filename}):
+            db.insert_chunk(chunk["chunk_id"], chunk["content"], chunk["metadata"], NOTEBOOK, filename)
+            count += 1
+    return count
+
+def wait_for(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"{url}/pending?notebook={NOTEBOOK}", timeout=2) as response:
+                return json.loads(response.read())["pending"]
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Coordinator at {url} did not come up")
+
+def check_shared_index(data_dir, coordinator_db, threshold=0.95):
+    """
+    Checks the near-duplicate index the workers share against the committed
+    cards (the stub embedder is deterministic). Returns (rows whose vector is
+    not the embedding of the card named by their id, cards whose duplicate_of
+    names a card below the similarity threshold).
+    """
+    import numpy as np
+    from stubs import HashingEmbedder
+    from verification.dedup import DuplicateIndex
+    from verification.embedding_store import EmbeddingStore
+
+    conn = sqlite3.connect(coordinator_db)
+    outputs = {chunk_id: json.loads(output)["flashcards"] for chunk_id, output in conn.execute(
+        "SELECT chunk_id, output_json FROM processing_queue WHERE status = 'COMPLETED'")}
+    conn.close()
+    store = EmbeddingStore(NOTEBOOK, "cards", index_dir=Path(data_dir) / "index", read_only=True)
+    if not len(store):
+        return 0, 0
+    embedder = HashingEmbedder(store.dim)
+
+    def embedding(card_id):
+        chunk_id, position = card_id.rsplit(":", 1)
+        cards = outputs.get(chunk_id, [])
+        if int(position) >= len(cards):
+            return None
+        return embedder.encode([DuplicateIndex.card_text(cards[int(position)])], normalize_embeddings=True)[0]
+
+    vectors = store.vectors()
+    misaligned = 0
+    for i, row_id in enumerate(store.ids()[:len(store)]):
+        if row_id.rsplit(":", 1)[0] not in outputs:
+            continue
+        expected = embedding(row_id)
+        if expected is None or float(np.dot(expected, vectors[i])) < 0.99:
+            misaligned += 1
+
+    wrong_duplicates = 0
+    for cards in outputs.values():
+        for card in cards:
+            if card.get("duplicate_of"):
+                earlier = embedding(card["duplicate_of"])
+                vector = embedder.encode([DuplicateIndex.card_text(card)], normalize_embeddings=True)[0]
+                if earlier is None or float(np.dot(earlier, vector)) < threshold - 0.01:
+                    wrong_duplicates += 1
+    return misaligned, wrong_duplicates
+
+def run_worker(args):
+    """
+    Worker process: drains the coordinator's queue with the stub models and
+    prints {"processed", "failed"} as JSON. Keeps polling for
+    --idle-seconds after the queue runs dry so expired leases are picked up.
+    """
+    from bench_pipeline import build_worker
+    worker = build_worker(args)
+    processed = failed = 0
+    idle_since = None
+    while True:
+        job = worker.next_job()
+        if job is None:
+            idle_since = idle_since or time.time()
+            if time.time() - idle_since > args.idle_seconds:
+                break
+            time.sleep(0.5)
+            continue
+        idle_since = None
+        try:
+            worker.process_job(job)
+            processed += 1
+        except Exception as e:
+            failed += 1
+            worker.db.update_chunk_status(chunk_id=job["chunk_id"], status='FAILED', error_log=str(e), notebook=NOTEBOOK)
+    print(json.dumps({"processed": processed, "failed": failed}))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--batch", type=int, default=4, help="Chunks leased per request (ZERO_QUEUE_BATCH_SIZE)")
+    parser.add_argument("--lease-seconds", type=int, default=30)
+    parser.add_argument("--kill-after", type=float, default=None, help="Kill the first worker this many seconds after it is up")
+    parser.add_argument("--docs", type=int, default=4)
+    parser.add_argument("--doc-chars", type=int, default=60_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cards-per-chunk", type=int, default=8)
+    parser.add_argument("--truncate-every", type=int, default=0)
+    parser.add_argument("--verifier", choices=["stub", "minilm"], default="stub")
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--idle-seconds", type=float, default=None,
+                        help="How long idle workers keep polling (default: lease + 2s with --kill-after, else 1s)")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary data directories")
+    args = parser.parse_args()
+    if args.idle_seconds is None:
+        args.idle_seconds = args.lease_seconds + 2 if args.kill_after else 1
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    workdir = Path(tempfile.mkdtemp(prefix="zeroloss-coord-"))
+    coordinator_dir = workdir / "coordinator"
+    coordinator_dir.mkdir()
+    chunks = populate(coordinator_dir, args)
+
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = base_env(coordinator_dir)
+    env.update({"ZERO_COORDINATOR_PORT": str(port), "ZERO_QUEUE_LEASE_SECONDS": str(args.lease_seconds)})
+    coordinator = subprocess.Popen([sys.executable, str(ROOT / "src" / "coordinator" / "server.py")], env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    workers = []
+    try:
+        print(f"Coordinator on {url}: {wait_for(url)} pending chunks of {chunks}")
+        worker_args = [sys.executable, __file__, "--worker", "--cards-per-chunk", str(args.cards_per_chunk),
+                       "--truncate-every", str(args.truncate_every), "--verifier", args.verifier,
+                       "--threads", str(args.threads), "--idle-seconds", str(args.idle_seconds)]
+        start = time.perf_counter()
+        worker_dir = workdir / "workers"
+        worker_dir.mkdir()
+        for i in range(args.workers):
+            env = base_env(worker_dir)
+            env.update({"ZERO_COORDINATOR_URL": url, "ZERO_QUEUE_BATCH_SIZE": str(args.batch)})
+            workers.append(subprocess.Popen(worker_args, env=env, stdout=subprocess.PIPE,
+                                            stderr=subprocess.DEVNULL, text=True))
+        if args.kill_after:
+            # The worker opens its local database once its imports are done
+            while not (worker_dir / "zeroloss.db").exists() and workers[0].poll() is None:
+                time.sleep(0.1)
+            time.sleep(args.kill_after)
+            workers[0].kill()
+            print(f"Killed worker 0 {args.kill_after}s after startup")
+
+        reports = []
+        for i, proc in enumerate(workers):
+            out, _ = proc.communicate()
+            report = json.loads(out.strip().splitlines()[-1]) if proc.returncode == 0 and out.strip() else None
+            reports.append(report)
+            print(f"worker-{i}: {report if report else f'exited with {proc.returncode}'}")
+        elapsed = time.perf_counter() - start
+    finally:
+        for proc in workers:
+            if proc.poll() is None:
+                proc.kill()
+        coordinator.terminate()
+        coordinator.wait()
+
+    conn = sqlite3.connect(coordinator_dir / "zeroloss.db")
+    statuses = dict(conn.execute("SELECT status, COUNT(*) FROM processing_queue GROUP BY status").fetchall())
+    conn.close()
+    processed = sum(r["processed"] for r in reports if r)
+    completed = statuses.get("COMPLETED", 0)
+    print(f"\n{chunks} chunks, {args.workers} workers, batch {args.batch}: {elapsed:.2f}s, "
+          f"{completed / elapsed:.1f} chunks/s")
+    print(f"Final statuses: {statuses}")
+    if processed > completed:
+        print(f"{processed - completed} chunk(s) processed twice (lease expiry)")
+    misaligned, wrong_duplicates = check_shared_index(worker_dir, coordinator_dir / "zeroloss.db")
+    print(f"Shared near-duplicate index: {misaligned} misaligned rows, {wrong_duplicates} wrong duplicate_of links")
+
+    if args.keep:
+        print(f"Work directory: {workdir}")
+    else:
+        import shutil
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if completed != chunks or misaligned or wrong_duplicates:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
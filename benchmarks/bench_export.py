@@ -0,0 +1,87 @@
+# benchmarks/bench_export.py
+"""
+Measures CSVExporter throughput and peak RSS on a synthetic notebook.
+
+Usage:
+    PYTHONPATH=src python3 benchmarks/bench_export.py --cards 2000000
+"""
+
+import argparse
+import json
+import os
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+NOTEBOOK = "bench"
+
+def populate(db_path, num_cards, cards_per_chunk, num_sources):
+    from db.db_manager import DBManager
+    DBManager(db_path)  # creates the schema
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    num_chunks = max(1, num_cards // cards_per_chunk)
+    conn.executemany(
+        "INSERT INTO documents (notebook, filename, status) VALUES (?, ?, 'COMPLETED')",
+        [(NOTEBOOK, f"lecture_{s:04d}.pdf") for s in range(num_sources)]
+    )
+
+    def rows():
+        for c in range(num_chunks):
+            filename = f"lecture_{c % num_sources:04d}.pdf"
+            cards = [{
+                "front": f"Synthetic question {c}-{i}: what does term {i} of chunk {c} define?",
+                "back": f"Term {i} of chunk {c} defines a synthetic fact used for benchmarking the exporter.",
+                "type": "definition",
+                "source_quote": f"Term {i} of chunk {c} is defined here."
+            } for i in range(cards_per_chunk)]
+            yield (f"chunk-{c:08d}", NOTEBOOK, filename, "",
+                   json.dumps({"source_file": filename}), json.dumps({"flashcards": cards}))
+
+    conn.executemany("""
+        INSERT INTO processing_queue (chunk_id, notebook, filename, source_text, metadata, status, output_json)
+        VALUES (?, ?, ?, ?, ?, 'COMPLETED', ?)
+    """, rows())
+    conn.commit()
+    conn.close()
+    return num_chunks * cards_per_chunk
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cards", type=int, default=1_000_000)
+    parser.add_argument("--cards-per-chunk", type=int, default=20)
+    parser.add_argument("--sources", type=int, default=200)
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="zeroloss-bench-"))
+    os.environ["ZERO_DATA_DIR"] = str(workdir)
+    os.environ["TARGET_NOTEBOOK"] = NOTEBOOK
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+    from config import settings
+    start = time.perf_counter()
+    total = populate(str(settings.db_path), args.cards, args.cards_per_chunk, args.sources)
+    print(f"Populated {total} cards in {time.perf_counter() - start:.1f}s "
+          f"(db {settings.db_path.stat().st_size / 2**20:.0f} MB)")
+
+    from utils.exporter import CSVExporter
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    CSVExporter().export_all()
+    elapsed = time.perf_counter() - start
+
+    print(f"Export: {elapsed:.2f}s, {total / elapsed:,.0f} cards/s")
+    print(f"Peak RSS: {peak_rss_mb():.0f} MB (before export: {rss_before:.0f} MB)")
+    print(f"Work directory: {workdir}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+# benchmarks/bench_pipeline.py
+"""
+Offline end-to-end benchmark: synthetic corpus -> SemanticChunker -> DBManager
+insert -> worker loop (claim / process / commit) -> CSVExporter.
+
+The worker runs the real StudyWorker.process_job with a deterministic stub
+generator. Verification uses hashing/overlap stub models by default, or the
+real MiniLM models on CPU (--verifier minilm, weights must already be cached).
+Nothing touches the network or a GPU.
+
+Usage:
+    PYTHONPATH=src python3 benchmarks/bench_pipeline.py --docs 20 --output results.json
+    PYTHONPATH=src python3 benchmarks/bench_pipeline.py --baseline results.json
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+NOTEBOOK = "bench"
+ROOT = Path(__file__).resolve().parent.parent
+
+# Per stage: metric -> True when higher is better
+COMPARED_METRICS = {"throughput": True, "p50_ms": False, "p90_ms": False}
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def latency_summary(samples):
+    """
+    Percentiles (ms) of a list of durations in seconds.
+    """
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000, 3)
+    return {
+        "p50_ms": pct(50), "p90_ms": pct(90), "p99_ms": pct(99),
+        "max_ms": round(ordered[-1] * 1000, 3),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+    }
+
+def stage_result(seconds, items, unit, samples=None, **extra):
+    return {
+        "seconds": round(seconds, 4),
+        "items": items,
+        "unit": unit,
+        "throughput": round(items / seconds, 2) if seconds > 0 else None,
+        **latency_summary(samples or []),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        **extra,
+    }
+
+def timed(samples, fn):
+    """
+    Wraps fn so every call's duration is appended to samples.
+    """
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            samples.append(time.perf_counter() - start)
+    return wrapper
+
+def setup_environment(workdir, args):
+    # Must run before config.settings is imported
+    os.environ["ZERO_DATA_DIR"] = str(workdir)
+    os.environ["TARGET_NOTEBOOK"] = NOTEBOOK
+    os.environ["ZERO_METRICS_ENABLED"] = "true" if args.spans else "false"
+    os.environ["HF_HUB_OFFLINE"] = "1"
+    os.environ["TRANSFORMERS_OFFLINE"] = "1"
+    os.environ["TQDM_DISABLE"] = "1"
+    sys.path.insert(0, str(ROOT / "src"))
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+def quiet_loggers():
+    # Loggers are configured at import, so call this after importing the modules
+    for name in ("Worker", "StudyEngine", "CSVExporter", "CoverageReport", "verification.audit",
+                 "verification.dedup", "inference.json_parser"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+def bench_chunking(documents, args):
+    from ingestion.chunker import SemanticChunker
+    chunker = SemanticChunker()
+    samples, chunks, chars = [], [], 0
+    start = time.perf_counter()
+    for filename, markdown in documents:
+        t = time.perf_counter()
+        doc_chunks = chunker.chunk_text(markdown, metadata={"source_file": filename, "path": filename})
+        samples.append(time.perf_counter() - t)
+        chunks.extend((filename, chunk) for chunk in doc_chunks)
+        chars += len(markdown)
+    elapsed = time.perf_counter() - start
+    return chunks, stage_result(elapsed, len(chunks), "chunks", samples,
+                                chars=chars, chars_per_second=round(chars / elapsed, 1))
+
+def bench_insert(db, chunks):
+    samples = []
+    insert = timed(samples, db.insert_chunk)
+    start = time.perf_counter()
+    for filename in sorted({filename for filename, _ in chunks}):
+        db.add_document_to_library(filename, NOTEBOOK)
+    for filename, chunk in chunks:
+        insert(chunk_id=chunk["chunk_id"], source_text=chunk["content"], metadata=chunk["metadata"],
+               notebook=NOTEBOOK, filename=filename)
+    return stage_result(time.perf_counter() - start, len(chunks), "chunks", samples)
+
+def build_worker(args):
+    from worker import StudyWorker
+    from verification.audit import CoverageAuditor, FactChecker
+    from verification.dedup import DuplicateIndex
+    from verification.semantic import AnswerIndex
+    from stubs import StubGenerator, HashingEmbedder, OverlapCrossEncoder
+    quiet_loggers()
+
+    worker = StudyWorker()
+    worker.generator = StubGenerator(cards_per_chunk=args.cards_per_chunk, truncate_every=args.truncate_every)
+    if args.verifier == "minilm":
+        worker.auditor = CoverageAuditor(backend="cpu-int8", num_threads=args.threads)
+        worker.fact_checker = FactChecker(backend="cpu-int8", num_threads=args.threads)
+    else:
+        worker.auditor = CoverageAuditor(model=HashingEmbedder())
+        worker.fact_checker = FactChecker(model=OverlapCrossEncoder())
+    dim = worker.auditor.model.get_sentence_embedding_dimension()
+    worker.dedup_index = DuplicateIndex(NOTEBOOK, worker.auditor.model)
+    worker.answer_index = AnswerIndex(NOTEBOOK, dim=dim)
+    return worker
+
+def bench_worker(worker, limit):
+    claim_samples, process_samples, commit_samples = [], [], []
+    claim = timed(claim_samples, worker.db.get_pending_chunk)
+    worker.db.update_chunk_status = timed(commit_samples, worker.db.update_chunk_status)
+    processed = failed = cards = 0
+    start = time.perf_counter()
+    while limit is None or processed + failed < limit:
+        job = claim(NOTEBOOK)
+        if job is None:
+            break
+        t = time.perf_counter()
+        try:
+            cards += worker.process_job(job)
+            processed += 1
+        except Exception as e:
+            failed += 1
+            worker.db.update_chunk_status(chunk_id=job["chunk_id"], status='FAILED', error_log=str(e), notebook=NOTEBOOK)
+        process_samples.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+    return stage_result(
+        elapsed, processed, "chunks", process_samples,
+        failed=failed, cards=cards,
+        cards_per_second=round(cards / elapsed, 1) if elapsed > 0 else None,
+        claim=latency_summary(claim_samples),
+        commit=latency_summary(commit_samples),
+    )
+
+def bench_export():
+    from utils.exporter import CSVExporter
+    quiet_loggers()
+    exporter = CSVExporter()
+    start = time.perf_counter()
+    exporter.export_all(full=True)
+    elapsed = time.perf_counter() - start
+    master = exporter.output_dir / "master_study_cards.csv"
+    with open(master, encoding="utf-8", newline="") as f:
+        # Card text can span lines, so count CSV records rather than lines
+        rows = max(0, sum(1 for _ in csv.reader(f)) - 1)
+    return stage_result(elapsed, rows, "cards")
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def compare(results, baseline, tolerance):
+    """
+    Prints per-stage deltas against a baseline run and returns the regressions.
+    """
+    regressions = []
+    print(f"\n{'stage':<12} {'metric':<12} {'baseline':>12} {'current':>12} {'change':>9}")
+    for stage, current in results["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if not previous or "skipped" in current or "skipped" in previous:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            flag = "  REGRESSION" if worse > tolerance else ""
+            if flag:
+                regressions.append((stage, metric, change))
+            print(f"{stage:<12} {metric:<12} {old:>12.2f} {new:>12.2f} {change:>+8.1%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=10, help="Synthetic documents per flavour")
+    parser.add_argument("--doc-chars", type=int, default=60_000, help="Approximate characters per document")
+    parser.add_argument("--flavour", choices=["markdown", "pdf", "both"], default="both")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cards-per-chunk", type=int, default=8)
+    parser.add_argument("--truncate-every", type=int, default=10,
+                        help="Truncate every Nth stub generation to exercise JSON recovery (0 = never)")
+    parser.add_argument("--worker-chunks", type=int, default=None, help="Process at most this many chunks")
+    parser.add_argument("--verifier", choices=["stub", "minilm"], default="stub")
+    parser.add_argument("--threads", type=int, default=0, help="CPU threads for --verifier minilm")
+    parser.add_argument("--spans", action="store_true", help="Keep span instrumentation (utils.metrics) on")
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    parser.add_argument("--baseline", type=Path, help="Compare against an earlier --output file")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Relative change counted as a regression")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary data directory")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="zeroloss-bench-"))
+    setup_environment(workdir, args)
+
+    from corpus import CorpusGenerator
+    from db.db_manager import DBManager
+    from config import settings
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        },
+        "stages": {},
+    }
+    stages = results["stages"]
+
+    flavours = ["markdown", "pdf"] if args.flavour == "both" else [args.flavour]
+    generator = CorpusGenerator(args.seed)
+    start = time.perf_counter()
+    documents = [doc for flavour in flavours for doc in generator.documents(args.docs, args.doc_chars, flavour)]
+    stages["corpus"] = stage_result(time.perf_counter() - start, len(documents), "documents",
+                                    chars=sum(len(md) for _, md in documents))
+
+    chunks, stages["chunking"] = bench_chunking(documents, args)
+    del documents
+
+    db = DBManager(settings.db_path)
+    stages["db_insert"] = bench_insert(db, chunks)
+
+    try:
+        worker = build_worker(args)
+    except ImportError as e:
+        # e.g. sentence-transformers/torch missing: report instead of failing the suite
+        stages["worker"] = {"skipped": f"missing dependency: {e}"}
+        worker = None
+    if worker:
+        stages["worker"] = bench_worker(worker, args.worker_chunks)
+
+    if worker:
+        stages["export"] = bench_export()
+    else:
+        stages["export"] = {"skipped": "no processed chunks"}
+
+    print(f"{'stage':<12} {'items':>9} {'seconds':>9} {'per sec':>11} {'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10} {'rss MB':>8}")
+    for name, r in stages.items():
+        if "skipped" in r:
+            print(f"{name:<12} skipped: {r['skipped']}")
+            continue
+        latency = "".join(f"{r[k]:>10.3f}" if k in r else f"{'-':>10}" for k in ("p50_ms", "p90_ms", "p99_ms"))
+        print(f"{name:<12} {r['items']:>9} {r['seconds']:>9.3f} {r['throughput'] or 0:>11.1f}{latency} {r['peak_rss_mb']:>8.0f}")
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+        print(f"\nResults written to {args.output}")
+
+    regressions = []
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        regressions = compare(results, baseline, args.tolerance)
+
+    if args.keep:
+        print(f"Work directory: {workdir}")
+    else:
+        import shutil
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if regressions:
+        print(f"\n{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
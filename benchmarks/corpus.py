@@ -0,0 +1,105 @@
+# benchmarks/corpus.py
+"""
+Deterministic synthetic corpora for the benchmarks.
+
+Two flavours:
+  markdown  clean lecture notes (headings, paragraphs, lists, formulas)
+  pdf       Docling-style markdown converted from PDFs: page headers and
+            footers, hyphenated line breaks, tables and image placeholders
+"""
+
+import random
+
+SUBJECTS = ["cell biology", "thermodynamics", "linear algebra", "microeconomics", "organic chemistry",
+            "neuroscience", "probability", "control theory", "immunology", "compilers"]
+NOUNS = ["enzyme", "gradient", "membrane", "matrix", "equilibrium", "vector", "receptor", "market",
+         "entropy", "operator", "catalyst", "signal", "kernel", "antibody", "parser", "reaction"]
+VERBS = ["regulates", "transforms", "binds", "stabilizes", "measures", "reduces", "amplifies",
+         "encodes", "limits", "converts", "predicts", "separates"]
+ADJECTIVES = ["stable", "linear", "dominant", "reversible", "sparse", "adaptive", "partial",
+              "orthogonal", "selective", "periodic"]
+
+class CorpusGenerator:
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+
+    def term(self):
+        return f"{self.rng.choice(ADJECTIVES)} {self.rng.choice(NOUNS)}"
+
+    def sentence(self):
+        r = self.rng
+        return (f"The {self.term()} {r.choice(VERBS)} the {self.term()} "
+                f"when the {r.choice(NOUNS)} is {r.choice(ADJECTIVES)}.")
+
+    def definition(self):
+        return f"A {self.term()} is defined as the {self.term()} that {self.rng.choice(VERBS)} every {self.rng.choice(NOUNS)}."
+
+    def paragraph(self, sentences=None):
+        n = sentences or self.rng.randint(3, 7)
+        parts = [self.definition() if self.rng.random() < 0.3 else self.sentence() for _ in range(n)]
+        return " ".join(parts)
+
+    def section(self, level, title):
+        r = self.rng
+        blocks = [f"{'#' * level} {title}", self.paragraph()]
+        if r.random() < 0.4:
+            blocks.append("\n".join(f"- {self.sentence()}" for _ in range(r.randint(3, 6))))
+        if r.random() < 0.2:
+            blocks.append(f"$$ {r.choice(NOUNS)}(x) = \\sum_i w_i x_i^{r.randint(2, 4)} $$")
+        blocks.append(self.paragraph())
+        return "\n\n".join(blocks)
+
+    def markdown_document(self, target_chars):
+        subject = self.rng.choice(SUBJECTS)
+        parts = [f"# Lecture notes: {subject}"]
+        size = len(parts[0])
+        chapter = 0
+        while size < target_chars:
+            chapter += 1
+            parts.append(self.section(2, f"{chapter}. {self.term().title()}"))
+            for sub in range(self.rng.randint(1, 3)):
+                parts.append(self.section(3, f"{chapter}.{sub + 1} {self.term().title()}"))
+            size += sum(len(p) for p in parts[-4:])
+        return "\n\n".join(parts)
+
+    def table(self):
+        rows = ["| Term | Value | Note |", "|---|---|---|"]
+        for _ in range(self.rng.randint(3, 8)):
+            rows.append(f"| {self.term()} | {self.rng.uniform(0, 100):.2f} | {self.rng.choice(ADJECTIVES)} |")
+        return "\n".join(rows)
+
+    def pdf_document(self, target_chars, chars_per_page=3000):
+        """
+        Markdown as Docling emits it for a PDF: the text is broken into pages
+        with running headers/footers, words hyphenated across line ends, plus
+        tables and image placeholders.
+        """
+        subject = self.rng.choice(SUBJECTS)
+        body = self.markdown_document(target_chars)
+        pages = [body[i:i + chars_per_page] for i in range(0, len(body), chars_per_page)]
+        out = []
+        for number, page in enumerate(pages, 1):
+            words = page.split(" ")
+            for i in range(0, len(words), 40):
+                # Hyphenation at a line end
+                if len(words[i]) > 6:
+                    cut = len(words[i]) // 2
+                    words[i] = f"{words[i][:cut]}-\n{words[i][cut:]}"
+            out.append(f"{subject.upper()} — Chapter notes")
+            out.append(" ".join(words))
+            if self.rng.random() < 0.3:
+                out.append(self.table())
+            if self.rng.random() < 0.3:
+                out.append("<!-- image -->")
+            out.append(f"Page {number} of {len(pages)}")
+        return "\n\n".join(out)
+
+    def documents(self, count, chars, flavour="markdown"):
+        """
+        Yields (filename, markdown) pairs.
+        """
+        for i in range(count):
+            if flavour == "pdf":
+                yield f"scan_{i:04d}.pdf", self.pdf_document(chars)
+            else:
+                yield f"notes_{i:04d}.pdf", self.markdown_document(chars)
@@ -0,0 +1,116 @@
+# benchmarks/stubs.py
+"""
+Offline stand-ins for the GPU models, so the worker loop can be benchmarked on
+a CPU-only box without network access.
+
+StubGenerator      deterministic flashcards derived from the chunk's sentences,
+                   emitted as JSON text and parsed by the real parser; usage
+                   reports whitespace-token counts
+HashingEmbedder    SentenceTransformer-compatible bag-of-words hashing encoder
+OverlapCrossEncoder CrossEncoder-compatible token-overlap scorer
+"""
+
+import re
+import json
+import time
+import zlib
+import numpy as np
+from inference.json_parser import loads_lenient, recover_cards
+
+TOKEN = re.compile(r"[a-z0-9]+")
+SENTENCE = re.compile(r"(?<=[.!?])\s+")
+
+class StubGenerator:
+    def __init__(self, cards_per_chunk=8, truncate_every=0):
+        """
+        cards_per_chunk: Maximum cards produced per chunk.
+        truncate_every: Cut the JSON of every Nth generation short (0 = never),
+                        exercising the partial-output recovery path.
+        """
+        self.cards_per_chunk = cards_per_chunk
+        self.truncate_every = truncate_every
+        self.calls = 0
+
+    def _result(self, prompt, kind, sentences):
+        start = time.perf_counter()
+        text, truncated = self._cards_json(sentences)
+        result = self.parse_json_output(text)
+        result["usage"] = {
+            "kind": kind,
+            "prompt_tokens": len(prompt.split()),
+            "completion_tokens": len(text.split()),
+            "finish_reason": "length" if truncated else "stop",
+            "wall_s": time.perf_counter() - start,
+        }
+        return result
+
+    def _cards_json(self, sentences):
+        cards = []
+        for sentence in sentences[:self.cards_per_chunk]:
+            words = sentence.split()
+            cards.append({
+                "front": f"What does the text state about {' '.join(words[1:4])}?",
+                "back": sentence,
+                "type": "definition" if " is defined as " in sentence else "concept",
+                "source_quote": sentence,
+            })
+        text = json.dumps({"flashcards": cards})
+        self.calls += 1
+        truncated = bool(self.truncate_every) and self.calls % self.truncate_every == 0
+        if truncated:
+            text = text[:int(len(text) * 0.7)]
+        return text, truncated
+
+    def generate_cards(self, text):
+        sentences = [s.strip() for s in SENTENCE.split(text) if len(s.strip()) > 10]
+        return self._result(text, "generate", sentences)
+
+    def generate_repair_cards(self, uncovered_sentences):
+        return self._result("\n".join(uncovered_sentences), "repair", list(uncovered_sentences))
+
+    def parse_json_output(self, text):
+        # Mirrors FlashcardGenerator.parse_json_output (which needs vLLM to import)
+        try:
+            start_idx, end_idx = text.find("{"), text.rfind("}")
+            if start_idx == -1 or end_idx == -1:
+                raise ValueError("No JSON block found")
+            return loads_lenient(text[start_idx:end_idx + 1])
+        except ValueError:
+            return {"flashcards": recover_cards(text), "recovered": True}
+
+class HashingEmbedder:
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in TOKEN.findall(text.lower()):
+            h = zlib.crc32(token.encode())
+            vector[h % self.dim] += 1.0 if (h >> 16) & 1 else -1.0
+        return vector
+
+    def encode(self, texts, convert_to_tensor=False, convert_to_numpy=True, normalize_embeddings=False, **kwargs):
+        single = isinstance(texts, str)
+        matrix = np.stack([self._embed(t) for t in ([texts] if single else texts)]) if texts else np.zeros((0, self.dim), np.float32)
+        if normalize_embeddings:
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.maximum(norms, 1e-12)
+        if single:
+            matrix = matrix[0]
+        if convert_to_tensor:
+            import torch
+            return torch.from_numpy(matrix)
+        return matrix
+
+class OverlapCrossEncoder:
+    def predict(self, pairs, batch_size=32, **kwargs):
+        single = pairs and isinstance(pairs[0], str)
+        scores = []
+        for quote, hypothesis in ([pairs] if single else pairs):
+            q = set(TOKEN.findall(quote.lower()))
+            h = set(TOKEN.findall(hypothesis.lower()))
+            scores.append(len(q & h) / max(1, len(q)))
+        return np.asarray(scores[0] if single else scores, dtype=np.float32)
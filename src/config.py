@@ -16,7 +16,72 @@ class Settings(BaseSettings):
     
     # Model Configuration
     model_name: str = "casperhansen/llama-3-8b-instruct-awq"
+    # Constrain generation to the flashcard JSON schema (if vLLM supports it)
+    structured_output: bool = True
+
+    # Verification Configuration
+    # Number of (quote, card) pairs the Cross-Encoder scores per forward pass
+    fact_check_batch_size: int = 32
+    # 'default' shares the GPU with vLLM, 'cpu-int8' runs quantized models on host cores
+    verification_backend: str = "default"
+    # CPU threads for the 'cpu-int8' backend (0 = torch default)
+    verification_threads: int = 0
+    # Flag cards whose embedding is this similar to an earlier card of the notebook
+    dedup_enabled: bool = True
+    dedup_threshold: float = 0.95
+    # Link chunks whose text near-duplicates an earlier chunk of the notebook
+    # (MinHash estimate of word 5-gram Jaccard similarity) to it at ingest, instead of generating again
+    chunk_dedup_enabled: bool = True
+    chunk_dedup_threshold: float = 0.8
+    # Persist the audit's answer embeddings for semantic search
+    semantic_index_enabled: bool = True
+    # Backend of the web server's query encoder ('cpu-int8' keeps it off the GPU)
+    semantic_search_backend: str = "cpu-int8"
     
+    # Work queue: chunks a worker claims per request, and how long a claim is
+    # held without renewal before the chunk is handed out again (above the
+    # worker's 600s per-chunk timeout)
+    queue_batch_size: int = 1
+    queue_lease_seconds: int = 900
+    # Workers on other machines: URL of the coordinator (src/coordinator/server.py)
+    # to lease from instead of the local database; shared bearer token
+    coordinator_url: str = ""
+    coordinator_token: str = ""
+    # Coordinator bind address
+    coordinator_host: str = "127.0.0.1"
+    coordinator_port: int = 8090
+
+    # Storage: zlib-compress source_text / metadata values of at least this
+    # many bytes (0 = store plain; db.codec)
+    db_compress_min_bytes: int = 512
+    # Compaction (src/db/maintenance.py): move the source text of chunks
+    # COMPLETED more than this many days ago to data/archive (0 = keep it)
+    source_retention_days: int = 30
+    # ... and delete raw stage_timings / generation_stats rows older than this
+    # many days; the histogram and token totals /metrics reads are kept (0 = keep)
+    timing_retention_days: int = 14
+
+    # Log files: rotate at this size, keeping this many old files; 'text' or 'json' (JSON lines)
+    log_max_bytes: int = 10 * 1024 * 1024
+    log_backup_count: int = 3
+    log_format: str = "text"
+
+    # Web UI: maximum concurrent live log stream clients
+    log_stream_max_subscribers: int = 32
+    # Web UI: minutes of finished chunks averaged for throughput and ETA
+    progress_window_minutes: int = 10
+    # Web UI: resource sampling period (seconds) and samples kept in memory
+    stats_interval: float = 2.0
+    stats_history: int = 1800
+
+    # Record per-stage span timings (stage_timings table, /metrics)
+    metrics_enabled: bool = True
+
+    # Opt-in profiling of the pipeline entry points: off | cpu | memory | all
+    profile: str = "off"
+    # Units (chunks / documents) per profile dump (0 = one dump per run)
+    profile_every: int = 0
+
     # Internal settings (can also be overridden if needed)
     app_name: str = "Zero-Loss Engine"
     debug: bool = False
@@ -58,6 +123,18 @@ class Settings(BaseSettings):
     def db_path(self) -> Path:
         return self.data_dir / "zeroloss.db"
 
+    @property
+    def archive_dir(self) -> Path:
+        path = self.data_dir / "archive"
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    @property
+    def index_dir(self) -> Path:
+        path = self.data_dir / "index"
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
     @property
     def assets_dir(self) -> Path:
         path = self.data_dir / "assets"
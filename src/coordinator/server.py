@@ -0,0 +1,94 @@
+# src/coordinator/server.py
+"""
+Work coordinator: serves the processing queue of the local database to
+workers on other machines (db.work_queue.HTTPQueue). Workers lease batches of
+chunks, renew the leases while they work through them and push their results
+back; expired leases are handed out again.
+
+On the machine holding data/zeroloss.db:
+    PYTHONPATH=src ZERO_COORDINATOR_HOST=0.0.0.0 python3 src/coordinator/server.py
+On each remote worker (with a local copy of the models):
+    PYTHONPATH=src ZERO_COORDINATOR_URL=http://<host>:8090 TARGET_NOTEBOOK=<name> python3 src/worker.py
+"""
+
+import secrets
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException, Depends, Header
+from pydantic import BaseModel
+from config import settings
+from db.db_manager import DBManager
+from utils.logger import setup_logger
+
+logger = setup_logger("Coordinator", log_file=settings.logs_dir / "coordinator.log")
+
+# Upper bound of one lease request
+MAX_BATCH = 100
+
+def authorize(authorization: Optional[str] = Header(None)):
+    if settings.coordinator_token and not secrets.compare_digest(
+            authorization or "", f"Bearer {settings.coordinator_token}"):
+        raise HTTPException(status_code=401, detail="Invalid coordinator token")
+
+app = FastAPI(title="Zero-Loss Coordinator", dependencies=[Depends(authorize)])
+db = DBManager()
+
+class LeaseRequest(BaseModel):
+    worker: str
+    notebook: str
+    limit: int = 1
+
+class RenewRequest(BaseModel):
+    worker: str
+    chunk_ids: List[str]
+
+class ResultRequest(BaseModel):
+    worker: str
+    chunk_id: str
+    status: str
+    output_json: Optional[str] = None
+    error_log: Optional[str] = None
+    verification_score: Optional[float] = None
+    card_count: Optional[int] = None
+
+class GenerationStatsRequest(BaseModel):
+    rows: List[list]
+
+# Plain (sync) handlers: FastAPI runs them in its thread pool, so blocking
+# SQLite calls do not stall the event loop
+
+@app.post("/lease")
+def lease(request: LeaseRequest):
+    limit = max(1, min(request.limit, MAX_BATCH))
+    chunks = db.queue.claim(request.notebook, limit, worker=request.worker)
+    if chunks:
+        logger.info(f"Leased {len(chunks)} chunk(s) of '{request.notebook}' to {request.worker}")
+    return {"chunks": chunks, "lease_seconds": db.queue.lease_seconds}
+
+@app.post("/renew")
+def renew(request: RenewRequest):
+    return {"chunk_ids": db.queue.renew(request.chunk_ids, worker=request.worker)}
+
+@app.post("/complete")
+def complete(request: ResultRequest):
+    if request.status not in ("COMPLETED", "FAILED"):
+        raise HTTPException(status_code=400, detail="status must be COMPLETED or FAILED")
+    accepted = db.queue.update(
+        request.chunk_id, request.status, output_json=request.output_json, error_log=request.error_log,
+        verification_score=request.verification_score, card_count=request.card_count, worker=request.worker
+    )
+    if not accepted:
+        logger.warning(f"Dropped result for {request.chunk_id} from {request.worker}: leased to another worker")
+    return {"accepted": accepted}
+
+@app.get("/pending")
+def pending(notebook: str):
+    return {"pending": db.queue.pending_count(notebook)}
+
+@app.post("/generation_stats")
+def generation_stats(request: GenerationStatsRequest):
+    db.queue.record_generation_stats([tuple(row) for row in request.rows])
+    return {"recorded": len(request.rows)}
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host=settings.coordinator_host, port=settings.coordinator_port)
@@ -0,0 +1,43 @@
+# src/db/codec.py
+"""
+Transparent compression of the bulky processing_queue columns read only
+from Python (source_text, metadata). Values of at least
+ZERO_DB_COMPRESS_MIN_BYTES are stored as a BLOB: MAGIC followed by the zlib
+stream; shorter values and rows written before compression existed stay plain
+TEXT, and both read back the same through `unpack`.
+
+output_json stays plain JSON: the card triggers expand it in SQL, and the
+schema must work from any SQLite connection (no application functions).
+"""
+
+import zlib
+from config import settings
+
+MAGIC = b"ZLZ1"
+
+def pack(text, min_bytes=None, level=6):
+    """
+    Returns `text` compressed (bytes) when it is long enough and compression
+    pays off, otherwise `text` unchanged.
+    """
+    min_bytes = settings.db_compress_min_bytes if min_bytes is None else min_bytes
+    if text is None or not min_bytes:
+        return text
+    raw = text.encode("utf-8")
+    if len(raw) < min_bytes:
+        return text
+    packed = MAGIC + zlib.compress(raw, level)
+    return packed if len(packed) < len(raw) else text
+
+def unpack(value):
+    """
+    Returns the text of a stored column value (compressed or plain).
+    """
+    if isinstance(value, bytes):
+        if value.startswith(MAGIC):
+            return zlib.decompress(value[len(MAGIC):]).decode("utf-8")
+        return value.decode("utf-8")
+    return value
+
+def is_packed(value):
+    return isinstance(value, bytes) and value.startswith(MAGIC)
@@ -1,100 +1,355 @@
 import sqlite3
 import json
 import os
+import heapq
 from datetime import datetime
 from config import settings
+from db import codec
+from db.init_db import apply_schema, fts_available
+from db.work_queue import SQLiteQueue
+
+# Databases whose schema has been brought up to date by this process
+_schema_checked = set()
 
 class DBManager:
-    def __init__(self, db_path=None):
+    def __init__(self, db_path=None, queue=None):
+        """
+        queue: WorkQueue backing the worker-facing claim/update methods
+               (default: SQLiteQueue on this database).
+        """
         self.db_path = str(db_path) if db_path else str(settings.db_path)
+        if self.db_path not in _schema_checked:
+            conn = self._get_connection()
+            try:
+                apply_schema(conn)
+            finally:
+                conn.close()
+            _schema_checked.add(self.db_path)
+        self.queue = queue or SQLiteQueue(self._get_connection)
 
     def _get_connection(self):
         conn = sqlite3.connect(self.db_path)
         conn.execute("PRAGMA journal_mode=WAL")
         return conn
 
-    def insert_chunk(self, chunk_id, source_text, metadata, notebook, filename):
+    def search_available(self):
+        conn = self._get_connection()
+        try:
+            return fts_available(conn)
+        finally:
+            conn.close()
+
+    def search_cards(self, match, notebook=None, filename=None, include_duplicates=False, limit=20, offset=0):
+        """
+        Full-text search over card fronts, backs and source quotes, ranked by
+        bm25 (front matches weigh most). `match` is an FTS5 query expression;
+        syntax errors raise sqlite3.OperationalError.
+        Returns (total, rows) with matches in snippets wrapped in <mark></mark>.
+        CROSS JOIN keeps the FTS lookup as the outer loop; otherwise the planner
+        may walk the notebook index and probe the FTS table once per card.
+        """
+        where = ["cards_fts MATCH ?"]
+        params = [match]
+        if notebook:
+            where.append("c.notebook = ?")
+            params.append(notebook)
+        if filename:
+            where.append("c.filename = ?")
+            params.append(filename)
+        if not include_duplicates:
+            where.append("c.duplicate_of IS NULL")
+        where = " AND ".join(where)
+
+        conn = self._get_connection()
+        try:
+            total = conn.execute(f"""
+                SELECT COUNT(*) FROM cards_fts CROSS JOIN cards AS c ON c.id = cards_fts.rowid WHERE {where}
+            """, params).fetchone()[0]
+            cursor = conn.execute(f"""
+                SELECT c.id, c.notebook, c.filename, c.chunk_id, c.card_index, c.front, c.back,
+                       c.card_type, c.duplicate_of,
+                       snippet(cards_fts, -1, '<mark>', '</mark>', '…', 16),
+                       bm25(cards_fts, 3.0, 2.0, 1.0) AS rank
+                FROM cards_fts CROSS JOIN cards AS c ON c.id = cards_fts.rowid
+                WHERE {where}
+                ORDER BY rank LIMIT ? OFFSET ?
+            """, params + [limit, offset])
+            columns = ["id", "notebook", "filename", "chunk_id", "card_index", "front", "back",
+                       "type", "duplicate_of", "snippet", "rank"]
+            return total, [dict(zip(columns, row)) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+    def get_cards(self, card_ids):
+        """
+        Looks up cards by '<chunk_id>:<card_index>' id.
+        Returns {card id: card dict}; unknown ids are left out.
+        """
+        keys = {}
+        for card_id in card_ids:
+            chunk_id, _, index = card_id.rpartition(":")
+            if chunk_id and index.isdigit():
+                keys.setdefault(chunk_id, set()).add(int(index))
+        if not keys:
+            return {}
+
+        conn = self._get_connection()
+        try:
+            placeholders = ", ".join("?" * len(keys))
+            cursor = conn.execute(f"""
+                SELECT chunk_id, card_index, notebook, filename, front, back, card_type, duplicate_of
+                FROM cards WHERE chunk_id IN ({placeholders})
+            """, list(keys))
+            cards = {}
+            for chunk_id, index, notebook, filename, front, back, card_type, duplicate_of in cursor.fetchall():
+                if index in keys[chunk_id]:
+                    cards[f"{chunk_id}:{index}"] = {
+                        "id": f"{chunk_id}:{index}", "notebook": notebook, "filename": filename,
+                        "chunk_id": chunk_id, "card_index": index, "front": front, "back": back,
+                        "type": card_type, "duplicate_of": duplicate_of,
+                    }
+            return cards
+        finally:
+            conn.close()
+
+    def record_stage_timings(self, rows):
+        """
+        Bulk-inserts (stage, notebook, filename, chunk_id, duration_s, ok) span rows.
+        """
+        conn = self._get_connection()
+        try:
+            conn.executemany("""
+                INSERT INTO stage_timings (stage, notebook, filename, chunk_id, duration_s, ok)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, rows)
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+        finally:
+            conn.close()
+
+    def get_stage_histograms(self):
+        """
+        Returns {stage: {bucket label: (count, sum_s, errors)}} from stage_histogram.
+        """
+        conn = self._get_connection()
+        try:
+            histograms = {}
+            for stage, bucket, count, sum_s, errors in conn.execute(
+                    "SELECT stage, bucket, count, sum_s, errors FROM stage_histogram ORDER BY stage"):
+                histograms.setdefault(stage, {})[bucket] = (count, sum_s, errors)
+            return histograms
+        finally:
+            conn.close()
+
+    def record_generation_stats(self, rows):
+        """
+        Stores (chunk_id, notebook, filename, model, kind, prompt_tokens,
+        completion_tokens, finish_reason, wall_s) rows, one per LLM call.
+        """
+        self.queue.record_generation_stats(rows)
+
+    def get_generation_totals(self, notebook=None, window_minutes=None):
+        """
+        Token accounting per (notebook, model, kind). All-time totals come from
+        generation_totals; with window_minutes the raw generation_stats rows of
+        that window are aggregated instead.
+        Returns [{notebook, model, kind, calls, prompt_tokens, completion_tokens, wall_s, truncated}].
+        """
+        params = []
+        if window_minutes:
+            query = """
+                SELECT COALESCE(notebook, ''), COALESCE(model, ''), kind, COUNT(*), SUM(prompt_tokens),
+                       SUM(completion_tokens), SUM(wall_s), SUM(finish_reason = 'length')
+                FROM generation_stats WHERE recorded_at >= datetime('now', ?)
+            """
+            params.append(f"-{int(window_minutes)} minutes")
+            if notebook:
+                query += " AND notebook = ?"
+                params.append(notebook)
+            query += " GROUP BY 1, 2, 3"
+        else:
+            query = """
+                SELECT notebook, model, kind, calls, prompt_tokens, completion_tokens, wall_s, truncated
+                FROM generation_totals
+            """
+            if notebook:
+                query += " WHERE notebook = ?"
+                params.append(notebook)
+        query += " ORDER BY 1, 2, 3"
+
+        conn = self._get_connection()
+        try:
+            columns = ["notebook", "model", "kind", "calls", "prompt_tokens", "completion_tokens", "wall_s", "truncated"]
+            return [dict(zip(columns, row)) for row in conn.execute(query, params).fetchall()]
+        finally:
+            conn.close()
+
+    def get_queue_gauges(self):
+        """
+        Returns [(notebook, status, chunks)] from queue_counters.
+        """
+        conn = self._get_connection()
+        try:
+            return conn.execute("""
+                SELECT notebook, status, SUM(count) FROM queue_counters
+                GROUP BY notebook, status HAVING SUM(count) > 0 ORDER BY notebook, status
+            """).fetchall()
+        finally:
+            conn.close()
+
+    def insert_chunk(self, chunk_id, source_text, metadata, notebook, filename, canonical_chunk_id=None, similarity=None):
         """
         Inserts a new chunk into the processing_queue.
+        canonical_chunk_id: Earlier chunk this one near-duplicates; the chunk is
+                            stored as DUPLICATE and never sent to the LLM.
         """
+        status = 'DUPLICATE' if canonical_chunk_id else 'PENDING'
         conn = self._get_connection()
         cursor = conn.cursor()
         try:
             cursor.execute("""
-                INSERT INTO processing_queue (chunk_id, notebook, filename, source_text, metadata, status)
-                VALUES (?, ?, ?, ?, ?, 'PENDING')
+                INSERT INTO processing_queue (chunk_id, notebook, filename, source_text, metadata, status,
+                                              canonical_chunk_id, duplicate_similarity)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
                 ON CONFLICT(chunk_id) DO UPDATE SET
                     source_text=excluded.source_text,
                     metadata=excluded.metadata,
-                    status='PENDING',
+                    status=excluded.status,
+                    canonical_chunk_id=excluded.canonical_chunk_id,
+                    duplicate_similarity=excluded.duplicate_similarity,
                     updated_at=CURRENT_TIMESTAMP
-            """, (chunk_id, notebook, filename, source_text, json.dumps(metadata)))
+            """, (chunk_id, notebook, filename, codec.pack(source_text), codec.pack(json.dumps(metadata)), status,
+                  canonical_chunk_id, similarity))
             conn.commit()
         except sqlite3.Error as e:
             print(f"Database error: {e}")
         finally:
             conn.close()
 
-    def get_pending_chunk(self, notebook):
+    def get_near_duplicate_candidates(self, notebook, keys, exclude_filename=None, batch_size=400):
         """
-        Fetches the next PENDING chunk and marks it as PROCESSING.
-        (Peek-Lock-Process logic)
+        Returns {chunk_id: MinHash signature bytes} of the notebook's canonical
+        chunks sharing at least one (band, bucket) LSH key. Chunks that FAILED
+        are left out: they cannot stand in for a duplicate.
+        exclude_filename: Document being (re-)ingested; its earlier chunks are
+                          about to be superseded and must not stand in for the new ones.
         """
         conn = self._get_connection()
-        cursor = conn.cursor()
         try:
-            cursor.execute("""
-                UPDATE processing_queue 
-                SET status = 'PROCESSING', updated_at = CURRENT_TIMESTAMP
-                WHERE chunk_id = (
-                    SELECT chunk_id FROM processing_queue 
-                    WHERE notebook = ? AND status = 'PENDING' 
-                    ORDER BY created_at ASC LIMIT 1
-                )
-                RETURNING chunk_id, source_text, metadata
-            """, (notebook,))
-            row = cursor.fetchone()
+            signatures = {}
+            for i in range(0, len(keys), batch_size):
+                batch = keys[i:i + batch_size]
+                values = ", ".join("(?, ?)" for _ in batch)
+                cursor = conn.execute(f"""
+                    SELECT DISTINCT s.chunk_id, s.signature
+                    FROM chunk_lsh AS l
+                    JOIN chunk_signatures AS s ON s.chunk_id = l.chunk_id
+                    JOIN processing_queue AS q ON q.chunk_id = l.chunk_id
+                    WHERE l.notebook = ? AND (l.band, l.bucket) IN (VALUES {values}) AND q.status != 'FAILED'
+                      AND q.filename IS NOT ?
+                """, [notebook] + [v for key in batch for v in key] + [exclude_filename])
+                signatures.update(cursor.fetchall())
+            return signatures
+        finally:
+            conn.close()
+
+    def add_chunk_signatures(self, notebook, rows):
+        """
+        Indexes canonical chunks: rows of (chunk_id, signature bytes, [(band, bucket)]).
+        """
+        conn = self._get_connection()
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunk_signatures (chunk_id, notebook, signature) VALUES (?, ?, ?)",
+                [(chunk_id, notebook, signature) for chunk_id, signature, _ in rows]
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO chunk_lsh (notebook, band, bucket, chunk_id) VALUES (?, ?, ?, ?)",
+                [(notebook, band, bucket, chunk_id) for chunk_id, _, keys in rows for band, bucket in keys]
+            )
             conn.commit()
-            if row:
-                return {"chunk_id": row[0], "source_text": row[1], "metadata": json.loads(row[2])}
-            return None
         except sqlite3.Error as e:
             print(f"Database error: {e}")
-            return None
         finally:
             conn.close()
 
+    def get_pending_chunk(self, notebook):
+        """
+        Fetches the next PENDING chunk and marks it as PROCESSING.
+        (Peek-Lock-Process logic; the claim is a lease, see db.work_queue)
+        """
+        jobs = self.claim_chunks(notebook, 1)
+        return jobs[0] if jobs else None
+
+    def claim_chunks(self, notebook, limit):
+        """
+        Leases up to `limit` PENDING chunks of the notebook, oldest first.
+        """
+        return self.queue.claim(notebook, limit)
+
+    def renew_leases(self, chunk_ids):
+        """
+        Extends the leases of claimed chunks; returns the ids still held.
+        """
+        return self.queue.renew(chunk_ids)
+
     def get_pending_count(self, notebook):
         """
         Returns the number of chunks currently in PENDING state.
         """
+        return self.queue.pending_count(notebook)
+
+    def get_status_counts(self, notebook=None):
+        """
+        Chunk counts per document and status from queue_counters.
+        Returns {filename: {status: count}} (filenames of all notebooks when notebook is None).
+        """
         conn = self._get_connection()
-        cursor = conn.cursor()
         try:
-            cursor.execute("SELECT COUNT(*) FROM processing_queue WHERE notebook = ? AND status = 'PENDING'", (notebook,))
-            count = cursor.fetchone()[0]
-            return count
+            if notebook:
+                cursor = conn.execute("SELECT filename, status, count FROM queue_counters WHERE notebook = ? AND count > 0", (notebook,))
+            else:
+                cursor = conn.execute("SELECT filename, status, SUM(count) FROM queue_counters WHERE count > 0 GROUP BY filename, status")
+            counts = {}
+            for filename, status, count in cursor.fetchall():
+                counts.setdefault(filename, {})[status] = count
+            return counts
         except sqlite3.Error as e:
             print(f"Database error: {e}")
-            return 0
+            return {}
         finally:
             conn.close()
 
-    def update_chunk_status(self, chunk_id, status, output_json=None, error_log=None, verification_score=None, notebook=None):
+    def get_throughput(self, window_minutes, notebook=None):
+        """
+        Returns (completed, failed) chunks finished in the last window_minutes whole minutes.
+        """
         conn = self._get_connection()
-        cursor = conn.cursor()
         try:
-            cursor.execute("""
-                UPDATE processing_queue 
-                SET status = ?, output_json = ?, error_log = ?, verification_score = ?, updated_at = CURRENT_TIMESTAMP
-                WHERE chunk_id = ?
-            """, (status, output_json, error_log, verification_score, chunk_id))
-            conn.commit()
+            query = """
+                SELECT COALESCE(SUM(completed), 0), COALESCE(SUM(failed), 0) FROM queue_throughput
+                WHERE minute > CAST(strftime('%s', 'now') AS INTEGER) / 60 - ?
+            """
+            params = (window_minutes,)
+            if notebook:
+                query += " AND notebook = ?"
+                params += (notebook,)
+            return conn.execute(query, params).fetchone()
         except sqlite3.Error as e:
             print(f"Database error: {e}")
+            return (0, 0)
         finally:
             conn.close()
 
+    def update_chunk_status(self, chunk_id, status, output_json=None, error_log=None, verification_score=None, notebook=None, card_count=None):
+        """
+        Stores a chunk's result. Returns False if its lease was taken over by
+        another worker, in which case the result is dropped.
+        """
+        return self.queue.update(chunk_id, status, output_json=output_json, error_log=error_log,
+                                 verification_score=verification_score, card_count=card_count)
+
     def add_document_to_library(self, filename, notebook):
         conn = self._get_connection()
         cursor = conn.cursor()
@@ -104,6 +359,41 @@ class DBManager:
         finally:
             conn.close()
 
+    def set_document_hash(self, filename, content_hash, notebook):
+        """
+        Records the SHA-256 of a document's file, registering it in the library if needed.
+        """
+        conn = self._get_connection()
+        try:
+            conn.execute("""
+                INSERT INTO documents (notebook, filename, status, content_hash) VALUES (?, ?, 'LIBRARY', ?)
+                ON CONFLICT(notebook, filename) DO UPDATE SET content_hash = excluded.content_hash
+            """, (notebook, filename, content_hash))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_document_hash(self, filename, notebook):
+        conn = self._get_connection()
+        try:
+            cursor = conn.execute("SELECT content_hash FROM documents WHERE notebook = ? AND filename = ?", (notebook, filename))
+            row = cursor.fetchone()
+            return row[0] if row else None
+        finally:
+            conn.close()
+
+    def find_document_by_hash(self, content_hash, notebook):
+        """
+        Returns the filename of a document in the notebook with this content, or None.
+        """
+        conn = self._get_connection()
+        try:
+            cursor = conn.execute("SELECT filename FROM documents WHERE notebook = ? AND content_hash = ? LIMIT 1", (notebook, content_hash))
+            row = cursor.fetchone()
+            return row[0] if row else None
+        finally:
+            conn.close()
+
     def get_documents_by_status(self, status, notebook):
         conn = self._get_connection()
         cursor = conn.cursor()
@@ -131,3 +421,152 @@ class DBManager:
             conn.commit()
         finally:
             conn.close()
+
+    def iter_completed_outputs(self, notebook=None, filenames=None):
+        """
+        Streams (filename, output_json) of COMPLETED chunks ordered by source
+        file, without materializing the result set. A DUPLICATE chunk yields
+        the output of its canonical chunk once that one is COMPLETED, so the
+        duplicate's document carries the reused cards.
+        filenames: Optional list restricting the export to these sources.
+        """
+        scope = ""
+        params = []
+        if notebook:
+            scope += " AND q.notebook = ?"
+            params.append(notebook)
+        if filenames is not None:
+            scope += f" AND q.filename IN ({','.join('?' * len(filenames))})"
+            params.extend(filenames)
+
+        conn = self._get_connection()
+        try:
+            completed = conn.execute(f"""
+                SELECT q.filename, q.created_at, q.output_json FROM processing_queue AS q
+                WHERE q.status = 'COMPLETED'{scope} ORDER BY q.filename, q.created_at
+            """, params)
+            reused = conn.execute(f"""
+                SELECT q.filename, q.created_at, c.output_json FROM processing_queue AS q
+                JOIN processing_queue AS c ON c.chunk_id = q.canonical_chunk_id AND c.status = 'COMPLETED'
+                WHERE q.status = 'DUPLICATE'{scope} ORDER BY q.filename, q.created_at
+            """, params)
+            # Both streams are ordered; merging keeps one row in memory per stream
+            for filename, _, output_json in heapq.merge(completed, reused, key=lambda row: (row[0], row[1])):
+                yield filename, output_json
+        finally:
+            conn.close()
+
+    def get_completed_sources(self, notebook=None):
+        """
+        Returns the source files that have at least one COMPLETED chunk (or a
+        DUPLICATE chunk whose canonical chunk is COMPLETED), in export order.
+        """
+        scope, params = (" AND q.notebook = ?", (notebook,)) if notebook else ("", ())
+        conn = self._get_connection()
+        try:
+            cursor = conn.execute(f"""
+                SELECT q.filename FROM processing_queue AS q WHERE q.status = 'COMPLETED'{scope}
+                UNION
+                SELECT q.filename FROM processing_queue AS q
+                JOIN processing_queue AS c ON c.chunk_id = q.canonical_chunk_id AND c.status = 'COMPLETED'
+                WHERE q.status = 'DUPLICATE'{scope}
+                ORDER BY 1
+            """, params * 2)
+            return [row[0] for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+    def get_latest_change(self, notebook=None):
+        """
+        Returns the highest change_seq of the notebook (0 if it has no chunks).
+        """
+        conn = self._get_connection()
+        try:
+            if notebook:
+                cursor = conn.execute("SELECT MAX(change_seq) FROM processing_queue WHERE notebook = ?", (notebook,))
+            else:
+                cursor = conn.execute("SELECT MAX(change_seq) FROM processing_queue")
+            return cursor.fetchone()[0] or 0
+        finally:
+            conn.close()
+
+    def get_changed_sources(self, since, notebook=None):
+        """
+        Returns the source files with any chunk whose change_seq is above
+        `since`, including documents whose DUPLICATE chunks reuse a changed chunk.
+        """
+        conn = self._get_connection()
+        try:
+            scope, params = (" AND q.notebook = ?", (since, notebook)) if notebook else ("", (since,))
+            cursor = conn.execute(f"""
+                SELECT q.filename FROM processing_queue AS q WHERE q.change_seq > ?{scope}
+                UNION
+                SELECT q.filename FROM processing_queue AS q
+                JOIN processing_queue AS c ON c.chunk_id = q.canonical_chunk_id
+                WHERE c.change_seq > ? AND q.status = 'DUPLICATE'{scope}
+            """, params * 2)
+            return [row[0] for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+    def get_export_watermark(self, notebook=None):
+        conn = self._get_connection()
+        try:
+            cursor = conn.execute("SELECT watermark FROM export_state WHERE notebook = ?", (notebook or '',))
+            row = cursor.fetchone()
+            return row[0] if row else None
+        finally:
+            conn.close()
+
+    def set_export_watermark(self, watermark, notebook=None):
+        conn = self._get_connection()
+        try:
+            conn.execute("""
+                INSERT INTO export_state (notebook, watermark, exported_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(notebook) DO UPDATE SET watermark = excluded.watermark, exported_at = CURRENT_TIMESTAMP
+            """, (notebook or '', watermark))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_notebooks(self):
+        """
+        Returns the notebooks that have documents or chunks in the database.
+        """
+        conn = self._get_connection()
+        try:
+            cursor = conn.execute("SELECT notebook FROM documents UNION SELECT notebook FROM processing_queue")
+            return [row[0] for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+    # Per-notebook rows removed with the notebook, including its /metrics token
+    # counters (generation_totals); stage_histogram is not per notebook and stays.
+    NOTEBOOK_TABLES = ["processing_queue", "documents", "queue_counters", "queue_throughput", "export_state",
+                       "stage_timings", "generation_stats", "generation_totals", "chunk_lsh", "chunk_signatures"]
+
+    def delete_notebook(self, notebook):
+        """
+        Removes every row of the notebook (chunks, cards, documents, counters,
+        timings, near-duplicate index). Returns {table: rows deleted}.
+        """
+        conn = self._get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            deleted = {}
+            for table in self.NOTEBOOK_TABLES:
+                deleted[table] = conn.execute(f"DELETE FROM {table} WHERE notebook = ?", (notebook,)).rowcount
+            # change_seq continues from the remaining MAX: export watermarks
+            # above it would hide the next changes
+            conn.execute("""
+                UPDATE export_state SET watermark = (SELECT COALESCE(MAX(change_seq), 0) FROM processing_queue)
+                WHERE watermark > (SELECT COALESCE(MAX(change_seq), 0) FROM processing_queue)
+            """)
+            conn.commit()
+            return deleted
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(f"Database error: {e}")
+            return {}
+        finally:
+            conn.close()
@@ -1,6 +1,7 @@
 import sqlite3
 import os
 from config import settings
+from db import codec
 
 DB_PATH = settings.db_path
 
@@ -10,6 +11,7 @@ CREATE TABLE IF NOT EXISTS documents (
     filename TEXT NOT NULL,
     status TEXT DEFAULT 'LIBRARY',
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    content_hash TEXT,
     PRIMARY KEY (notebook, filename)
 );
 
@@ -26,20 +28,411 @@ CREATE TABLE IF NOT EXISTS processing_queue (
     error_log TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    change_seq INTEGER,
+    card_count INTEGER,
     FOREIGN KEY (notebook, filename) REFERENCES documents(notebook, filename)
 );
+
+-- Watermark (change_seq) of the last successful export ('' = all notebooks)
+CREATE TABLE IF NOT EXISTS export_state (
+    notebook TEXT PRIMARY KEY,
+    watermark INTEGER,
+    exported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Chunk counts per (notebook, document, status), kept current by triggers so
+-- progress polling never scans processing_queue
+CREATE TABLE IF NOT EXISTS queue_counters (
+    notebook TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    status TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (notebook, filename, status)
+);
+
+-- One row per generated card of a COMPLETED chunk, derived from output_json by
+-- triggers; the full-text index (cards_fts) is built over it
+CREATE TABLE IF NOT EXISTS cards (
+    id INTEGER PRIMARY KEY,
+    chunk_id TEXT NOT NULL,
+    notebook TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    card_index INTEGER NOT NULL,
+    front TEXT,
+    back TEXT,
+    source_quote TEXT,
+    card_type TEXT,
+    duplicate_of TEXT
+);
+
+-- Raw span timings (utils.metrics) ...
+CREATE TABLE IF NOT EXISTS stage_timings (
+    id INTEGER PRIMARY KEY,
+    stage TEXT NOT NULL,
+    notebook TEXT,
+    filename TEXT,
+    chunk_id TEXT,
+    duration_s REAL NOT NULL,
+    ok INTEGER NOT NULL DEFAULT 1,
+    recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- ... and their histogram (non-cumulative bucket counts), kept by trigger so
+-- /metrics never aggregates the raw table
+CREATE TABLE IF NOT EXISTS stage_histogram (
+    stage TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    sum_s REAL NOT NULL DEFAULT 0,
+    errors INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (stage, bucket)
+);
+
+-- Token accounting of every LLM call (kind: generate | repair); finish_reason
+-- 'length' means the output was cut at max_tokens
+CREATE TABLE IF NOT EXISTS generation_stats (
+    id INTEGER PRIMARY KEY,
+    chunk_id TEXT,
+    notebook TEXT,
+    filename TEXT,
+    model TEXT,
+    kind TEXT NOT NULL,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    finish_reason TEXT,
+    wall_s REAL NOT NULL DEFAULT 0,
+    recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- ... and its running totals per (notebook, model, kind), kept by trigger
+CREATE TABLE IF NOT EXISTS generation_totals (
+    notebook TEXT NOT NULL,
+    model TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    calls INTEGER NOT NULL DEFAULT 0,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    wall_s REAL NOT NULL DEFAULT 0,
+    truncated INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (notebook, model, kind)
+);
+
+-- MinHash signatures of a notebook's canonical chunks (ingestion.near_dup) and
+-- their LSH band buckets; near-duplicate chunks are linked to a canonical one
+-- (processing_queue.canonical_chunk_id, status DUPLICATE) instead of generated
+CREATE TABLE IF NOT EXISTS chunk_signatures (
+    chunk_id TEXT PRIMARY KEY,
+    notebook TEXT NOT NULL,
+    signature BLOB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS chunk_lsh (
+    notebook TEXT NOT NULL,
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    chunk_id TEXT NOT NULL,
+    PRIMARY KEY (notebook, band, bucket, chunk_id)
+) WITHOUT ROWID;
+
+-- Chunks finished per notebook per minute (unix minute), for throughput and ETA
+CREATE TABLE IF NOT EXISTS queue_throughput (
+    notebook TEXT NOT NULL,
+    minute INTEGER NOT NULL,
+    completed INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (notebook, minute)
+);
+"""
+
+# Expands a chunk's output_json into cards rows; {chunk} is the processing_queue
+# row alias (NEW in triggers, q in the backfill)
+CARD_ROWS_SQL = """
+    SELECT {chunk}.chunk_id, {chunk}.notebook, {chunk}.filename, CAST(j.key AS INTEGER),
+           COALESCE(json_extract(j.value, '$.front'), json_extract(j.value, '$.question'), ''),
+           COALESCE(json_extract(j.value, '$.back'), json_extract(j.value, '$.answer'), ''),
+           json_extract(j.value, '$.source_quote'),
+           COALESCE(json_extract(j.value, '$.type'), 'concept'),
+           json_extract(j.value, '$.duplicate_of')
+    FROM json_each(CASE WHEN {chunk}.status = 'COMPLETED' AND json_valid({chunk}.output_json)
+                        THEN {chunk}.output_json ELSE '{{}}' END, '$.flashcards') AS j
+    WHERE json_type(j.value) = 'object'
 """
 
-def init_db():
-    print(f"Initializing database at: {DB_PATH}")
+CARD_COLUMNS = "chunk_id, notebook, filename, card_index, front, back, source_quote, card_type, duplicate_of"
+
+# Upper bounds (seconds) of the stage duration histogram (utils.metrics, /metrics)
+DURATION_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300]
+
+def _duration_bucket_sql(column):
+    cases = " ".join(f"WHEN {column} <= {b} THEN '{b:g}'" for b in DURATION_BUCKETS)
+    return f"CASE {cases} ELSE '+Inf' END"
+
+# Tables derived from existing rows: (table, SQL populating it when the table is first created)
+TABLE_BACKFILLS = [
+    ("queue_counters",
+     "INSERT INTO queue_counters (notebook, filename, status, count) "
+     "SELECT notebook, filename, status, COUNT(*) FROM processing_queue GROUP BY notebook, filename, status"),
+    ("cards",
+     f"INSERT INTO cards ({CARD_COLUMNS}) " + CARD_ROWS_SQL.format(chunk="q").replace(
+         "FROM json_each", "FROM processing_queue AS q, json_each")),
+]
+
+# Columns added after the first release: (table, column, definition, backfill SQL or None)
+COLUMN_MIGRATIONS = [
+    ("documents", "content_hash", "TEXT", None),
+    ("processing_queue", "change_seq", "INTEGER", None),
+    ("processing_queue", "card_count", "INTEGER",
+     "UPDATE processing_queue SET card_count = json_array_length(output_json, '$.flashcards') "
+     "WHERE output_json IS NOT NULL AND json_valid(output_json)"),
+    # Claim leases (db.work_queue): holder and unix expiry time
+    ("processing_queue", "leased_by", "TEXT", None),
+    ("processing_queue", "lease_expires", "REAL", None),
+    # Near-duplicate link set at ingest (status DUPLICATE) and its estimated Jaccard similarity
+    ("processing_queue", "canonical_chunk_id", "TEXT", None),
+    ("processing_queue", "duplicate_similarity", "REAL", None),
+]
+
+# Triggers superseded by a differently named one, dropped on start: the
+# card and change-sequence triggers that also fired on rewrites of unchanged content
+RETIRED_TRIGGERS = ["trg_queue_change_seq_update", "trg_queue_cards_insert", "trg_queue_cards_update"]
+
+# Indexes and triggers, created once all migrated columns exist
+INDEXES = """
+-- Content-based duplicate detection for uploads and ingestion
+CREATE INDEX IF NOT EXISTS idx_documents_notebook_hash ON documents (notebook, content_hash);
+
+-- Export reads completed chunks grouped by source file
+CREATE INDEX IF NOT EXISTS idx_queue_notebook_status_file
+    ON processing_queue (notebook, status, filename, created_at);
+
+-- Coverage report: lowest-scoring completed chunks
+CREATE INDEX IF NOT EXISTS idx_queue_notebook_status_score
+    ON processing_queue (notebook, status, verification_score);
+
+-- Monotonic change sequence: every insert or content/status update of a chunk
+-- takes MAX + 1, so exporters can ask for 'everything changed since N'
+CREATE INDEX IF NOT EXISTS idx_queue_change_seq ON processing_queue (change_seq);
+CREATE INDEX IF NOT EXISTS idx_queue_notebook_change_seq ON processing_queue (notebook, change_seq);
+
+CREATE TRIGGER IF NOT EXISTS trg_queue_change_seq_insert AFTER INSERT ON processing_queue
+BEGIN
+    UPDATE processing_queue
+    SET change_seq = (SELECT COALESCE(MAX(change_seq), 0) + 1 FROM processing_queue)
+    WHERE chunk_id = NEW.chunk_id;
+END;
+
+-- Only what exports read counts as a change: compressing or archiving source
+-- text (db.maintenance) and rewriting an identical output do not
+CREATE TRIGGER IF NOT EXISTS trg_queue_change_seq_content
+AFTER UPDATE OF notebook, filename, status, output_json ON processing_queue
+WHEN OLD.notebook IS NOT NEW.notebook OR OLD.filename IS NOT NEW.filename OR OLD.status IS NOT NEW.status
+    OR OLD.output_json IS NOT NEW.output_json
+BEGIN
+    UPDATE processing_queue
+    SET change_seq = (SELECT COALESCE(MAX(change_seq), 0) + 1 FROM processing_queue)
+    WHERE chunk_id = NEW.chunk_id;
+END;
+
+-- Status counters and throughput buckets
+CREATE TRIGGER IF NOT EXISTS trg_queue_counters_insert AFTER INSERT ON processing_queue
+BEGIN
+    INSERT INTO queue_counters (notebook, filename, status, count) VALUES (NEW.notebook, NEW.filename, NEW.status, 1)
+    ON CONFLICT(notebook, filename, status) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_queue_counters_delete AFTER DELETE ON processing_queue
+BEGIN
+    UPDATE queue_counters SET count = count - 1
+    WHERE notebook = OLD.notebook AND filename = OLD.filename AND status = OLD.status;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_queue_counters_update
+AFTER UPDATE OF notebook, filename, status ON processing_queue
+WHEN OLD.notebook IS NOT NEW.notebook OR OLD.filename IS NOT NEW.filename OR OLD.status IS NOT NEW.status
+BEGIN
+    UPDATE queue_counters SET count = count - 1
+    WHERE notebook = OLD.notebook AND filename = OLD.filename AND status = OLD.status;
+    INSERT INTO queue_counters (notebook, filename, status, count) VALUES (NEW.notebook, NEW.filename, NEW.status, 1)
+    ON CONFLICT(notebook, filename, status) DO UPDATE SET count = count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_queue_throughput
+AFTER UPDATE OF status ON processing_queue
+WHEN NEW.status IN ('COMPLETED', 'FAILED') AND OLD.status IS NOT NEW.status
+BEGIN
+    INSERT INTO queue_throughput (notebook, minute, completed, failed)
+    VALUES (NEW.notebook, CAST(strftime('%s', 'now') AS INTEGER) / 60,
+            NEW.status = 'COMPLETED', NEW.status = 'FAILED')
+    ON CONFLICT(notebook, minute) DO UPDATE SET
+        completed = completed + excluded.completed,
+        failed = failed + excluded.failed;
+    -- Keep one day of buckets
+    DELETE FROM queue_throughput
+    WHERE notebook = NEW.notebook AND minute < CAST(strftime('%s', 'now') AS INTEGER) / 60 - 1440;
+END;
+"""
+
+# Card rows follow their chunk: rewritten whenever its output or status changes
+CARD_TRIGGERS = f"""
+CREATE INDEX IF NOT EXISTS idx_cards_chunk ON cards (chunk_id);
+CREATE INDEX IF NOT EXISTS idx_cards_notebook_file ON cards (notebook, filename);
+
+CREATE TRIGGER IF NOT EXISTS trg_queue_cards_fill AFTER INSERT ON processing_queue
+BEGIN
+    INSERT INTO cards ({CARD_COLUMNS}) {CARD_ROWS_SQL.format(chunk="NEW")};
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_queue_cards_refresh
+AFTER UPDATE OF notebook, filename, status, output_json ON processing_queue
+WHEN OLD.notebook IS NOT NEW.notebook OR OLD.filename IS NOT NEW.filename OR OLD.status IS NOT NEW.status
+    OR OLD.output_json IS NOT NEW.output_json
+BEGIN
+    DELETE FROM cards WHERE chunk_id = OLD.chunk_id;
+    INSERT INTO cards ({CARD_COLUMNS}) {CARD_ROWS_SQL.format(chunk="NEW")};
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_queue_cards_delete AFTER DELETE ON processing_queue
+BEGIN
+    DELETE FROM cards WHERE chunk_id = OLD.chunk_id;
+END;
+"""
+
+TIMING_TRIGGERS = f"""
+CREATE INDEX IF NOT EXISTS idx_stage_timings_chunk ON stage_timings (chunk_id);
+
+CREATE TRIGGER IF NOT EXISTS trg_stage_histogram AFTER INSERT ON stage_timings
+BEGIN
+    INSERT INTO stage_histogram (stage, bucket, count, sum_s, errors)
+    VALUES (NEW.stage, {_duration_bucket_sql("NEW.duration_s")}, 1, NEW.duration_s, NEW.ok = 0)
+    ON CONFLICT(stage, bucket) DO UPDATE SET
+        count = count + 1,
+        sum_s = sum_s + excluded.sum_s,
+        errors = errors + excluded.errors;
+END;
+"""
+
+GENERATION_TRIGGERS = """
+CREATE INDEX IF NOT EXISTS idx_generation_stats_notebook ON generation_stats (notebook, recorded_at);
+
+CREATE TRIGGER IF NOT EXISTS trg_generation_totals AFTER INSERT ON generation_stats
+BEGIN
+    INSERT INTO generation_totals (notebook, model, kind, calls, prompt_tokens, completion_tokens, wall_s, truncated)
+    VALUES (COALESCE(NEW.notebook, ''), COALESCE(NEW.model, ''), NEW.kind, 1,
+            NEW.prompt_tokens, NEW.completion_tokens, NEW.wall_s, NEW.finish_reason = 'length')
+    ON CONFLICT(notebook, model, kind) DO UPDATE SET
+        calls = calls + 1,
+        prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+        completion_tokens = completion_tokens + excluded.completion_tokens,
+        wall_s = wall_s + excluded.wall_s,
+        truncated = truncated + excluded.truncated;
+END;
+"""
+
+NEAR_DUP_TRIGGERS = """
+CREATE INDEX IF NOT EXISTS idx_chunk_lsh_chunk ON chunk_lsh (chunk_id);
+CREATE INDEX IF NOT EXISTS idx_queue_canonical ON processing_queue (canonical_chunk_id);
+
+-- A canonical chunk that failed or was removed no longer stands in for its
+-- duplicates: they go back to the queue
+CREATE TRIGGER IF NOT EXISTS trg_queue_canonical_failed
+AFTER UPDATE OF status ON processing_queue
+WHEN NEW.status = 'FAILED' AND OLD.status IS NOT 'FAILED'
+BEGIN
+    UPDATE processing_queue SET status = 'PENDING', canonical_chunk_id = NULL, duplicate_similarity = NULL
+    WHERE canonical_chunk_id = NEW.chunk_id AND status = 'DUPLICATE';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_queue_canonical_delete AFTER DELETE ON processing_queue
+BEGIN
+    UPDATE processing_queue SET status = 'PENDING', canonical_chunk_id = NULL, duplicate_similarity = NULL
+    WHERE canonical_chunk_id = OLD.chunk_id AND status = 'DUPLICATE';
+    DELETE FROM chunk_lsh WHERE chunk_id = OLD.chunk_id;
+    DELETE FROM chunk_signatures WHERE chunk_id = OLD.chunk_id;
+END;
+"""
+
+# Full-text index over cards (external content). Optional: skipped when the
+# SQLite build lacks FTS5, in which case search is disabled.
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS cards_fts USING fts5(
+    front, back, source_quote,
+    content='cards', content_rowid='id', tokenize='porter unicode61'
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_cards_fts_insert AFTER INSERT ON cards
+BEGIN
+    INSERT INTO cards_fts (rowid, front, back, source_quote) VALUES (NEW.id, NEW.front, NEW.back, NEW.source_quote);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_cards_fts_delete AFTER DELETE ON cards
+BEGIN
+    INSERT INTO cards_fts (cards_fts, rowid, front, back, source_quote) VALUES ('delete', OLD.id, OLD.front, OLD.back, OLD.source_quote);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_cards_fts_update AFTER UPDATE ON cards
+BEGIN
+    INSERT INTO cards_fts (cards_fts, rowid, front, back, source_quote) VALUES ('delete', OLD.id, OLD.front, OLD.back, OLD.source_quote);
+    INSERT INTO cards_fts (rowid, front, back, source_quote) VALUES (NEW.id, NEW.front, NEW.back, NEW.source_quote);
+END;
+"""
+
+def fts_available(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'cards_fts'").fetchone() is not None
+
+def _drop_function_triggers(conn):
+    """
+    Databases written by a build that compressed output_json have triggers
+    calling the application function unpack(), which fail on any other
+    connection: drop them (recreated below without it) and store the outputs
+    as plain JSON again. Their cards rows are already in place.
+    """
+    names = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND sql LIKE '%unpack(%'")]
+    if not names:
+        return
+    for name in names:
+        conn.execute(f"DROP TRIGGER {name}")
+    rows = conn.execute("SELECT chunk_id, output_json FROM processing_queue WHERE typeof(output_json) = 'blob'").fetchall()
+    conn.executemany("UPDATE processing_queue SET output_json = ? WHERE chunk_id = ?",
+                     [(codec.unpack(value), chunk_id) for chunk_id, value in rows])
+
+def apply_schema(conn):
+    """
+    Creates missing tables, columns, indexes and triggers. Safe to run on every start.
+    """
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    conn.executescript(SCHEMA)
+    for table, column, definition, backfill in COLUMN_MIGRATIONS:
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if column not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            if backfill:
+                conn.execute(backfill)
+    for table, backfill in TABLE_BACKFILLS:
+        if table not in tables:
+            conn.execute(backfill)
+    for trigger in RETIRED_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    _drop_function_triggers(conn)
+    for script in (INDEXES, CARD_TRIGGERS, TIMING_TRIGGERS, GENERATION_TRIGGERS, NEAR_DUP_TRIGGERS):
+        conn.executescript(script)
+    if "cards_fts" not in tables:
+        try:
+            conn.executescript(FTS_SCHEMA)
+            conn.execute("INSERT INTO cards_fts (cards_fts) VALUES ('rebuild')")
+        except sqlite3.OperationalError as e:
+            print(f"Full-text search disabled (FTS5 unavailable): {e}")
+    conn.commit()
+
+def init_db(db_path=None):
+    db_path = db_path or DB_PATH
+    print(f"Initializing database at: {db_path}")
     conn = None
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = sqlite3.connect(db_path)
         # Enable WAL mode for concurrency
         conn.execute("PRAGMA journal_mode=WAL")
-        cursor = conn.cursor()
-        cursor.executescript(SCHEMA)
-        conn.commit()
+        apply_schema(conn)
         print("Database schema initialized successfully.")
     except sqlite3.Error as e:
         print(f"An error occurred: {e}")
@@ -0,0 +1,279 @@
+# src/db/maintenance.py
+"""
+Compaction of data/zeroloss.db. Run while no worker or ingestion is active:
+
+1. Archive: the source text of chunks COMPLETED more than
+   ZERO_SOURCE_RETENTION_DAYS ago moves to data/archive/<notebook>.jsonl.gz
+   (one {"chunk_id", "filename", "source_text"} object per line) and the
+   column is cleared; only the worker reads it, and a completed chunk is not
+   queued again.
+2. Prune (only with --prune-orphans): notebooks with rows in the database but
+   no folder under data/input are deleted (rows and search index), as by the
+   web UI's notebook deletion. Skipped when data/input is missing or has no
+   notebook folders, which points at a misconfigured ZERO_DATA_DIR rather than
+   at every notebook being gone.
+3. Trim: raw stage_timings and generation_stats rows older than
+   ZERO_TIMING_RETENTION_DAYS are deleted. The stage_histogram and
+   generation_totals aggregates behind /metrics are kept.
+4. Recompress: plain values written before compression (db.codec) are
+   compressed in place.
+5. Vacuum: the first run switches the database to incremental auto-vacuum with
+   a full VACUUM; later runs only release free pages (--full forces VACUUM).
+   The WAL is checkpointed and truncated.
+
+Usage:
+    PYTHONPATH=src python3 src/db/maintenance.py [--dry-run] [--retention-days 30] [--timing-retention-days 14] [--prune-orphans] [--full]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+from pathlib import Path
+from config import settings
+from db import codec
+from db.db_manager import DBManager
+from db.init_db import fts_available
+from utils.logger import setup_logger
+
+logger = setup_logger("Maintenance")
+
+# Columns compressed by db.codec
+PACKED_COLUMNS = ["source_text", "metadata"]
+
+# Raw per-call rows whose aggregates are kept by trigger
+TIMING_TABLES = ["stage_timings", "generation_stats"]
+
+def storage_stats(db):
+    """
+    Returns file sizes (database, WAL) in bytes and the free page count.
+    """
+    wal = Path(f"{db.db_path}-wal")
+    conn = db._get_connection()
+    try:
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    finally:
+        conn.close()
+    return {
+        "db_bytes": os.path.getsize(db.db_path),
+        "wal_bytes": wal.stat().st_size if wal.exists() else 0,
+        "free_bytes": free_pages * page_size,
+    }
+
+def archive_sources(db, retention_days, notebook=None, batch_size=500, dry_run=False):
+    """
+    Moves the source text of chunks COMPLETED more than `retention_days` ago
+    to the notebook's archive file. Returns the number of chunks archived.
+    """
+    where = "status = 'COMPLETED' AND source_text IS NOT NULL AND updated_at < datetime('now', ?)"
+    params = [f"-{retention_days} days"]
+    if notebook:
+        where += " AND notebook = ?"
+        params.append(notebook)
+    conn = db._get_connection()
+    try:
+        if dry_run:
+            return conn.execute(f"SELECT COUNT(*) FROM processing_queue WHERE {where}", params).fetchone()[0]
+        archived = 0
+        while True:
+            rows = conn.execute(f"""
+                SELECT chunk_id, notebook, filename, source_text FROM processing_queue
+                WHERE {where} LIMIT ?
+            """, params + [batch_size]).fetchall()
+            if not rows:
+                return archived
+            by_notebook = {}
+            for chunk_id, nb, filename, source_text in rows:
+                by_notebook.setdefault(nb, []).append(
+                    {"chunk_id": chunk_id, "filename": filename, "source_text": codec.unpack(source_text)}
+                )
+            # Written (and flushed) before the column is cleared; gzip members
+            # appended to one file read back as a single stream
+            for nb, records in by_notebook.items():
+                with gzip.open(settings.archive_dir / f"{nb or '_default'}.jsonl.gz", "at", encoding="utf-8") as f:
+                    f.writelines(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+            conn.executemany(
+                "UPDATE processing_queue SET source_text = NULL WHERE chunk_id = ? AND status = 'COMPLETED'",
+                [(row[0],) for row in rows]
+            )
+            conn.commit()
+            archived += len(rows)
+    finally:
+        conn.close()
+
+def orphaned_notebooks(db):
+    """
+    Returns the notebooks with rows in the database but no input folder, or
+    [] when the input directory is missing or holds no notebook folders.
+    """
+    input_dir = settings.input_dir
+    if not input_dir.is_dir() or not any(path.is_dir() for path in input_dir.iterdir()):
+        logger.warning(f"No notebook folders in {input_dir}, not pruning: check ZERO_DATA_DIR.")
+        return []
+    return [nb for nb in db.get_notebooks() if nb and not (input_dir / nb).is_dir()]
+
+def prune_notebooks(db, notebooks):
+    """
+    Deletes the notebooks' rows and search index. Returns the chunks removed.
+    """
+    chunks = 0
+    for nb in notebooks:
+        deleted = db.delete_notebook(nb)
+        shutil.rmtree(settings.index_dir / nb, ignore_errors=True)
+        chunks += deleted.get("processing_queue", 0)
+        logger.info(f"Pruned notebook '{nb}': {deleted.get('processing_queue', 0)} chunks, "
+                    f"{deleted.get('documents', 0)} documents")
+    return chunks
+
+def trim_timings(db, retention_days, batch_size=5000, dry_run=False):
+    """
+    Deletes raw timing rows recorded more than `retention_days` ago.
+    Returns the number of rows deleted.
+    """
+    cutoff = f"-{retention_days} days"
+    conn = db._get_connection()
+    trimmed = 0
+    try:
+        for table in TIMING_TABLES:
+            where = "recorded_at < datetime('now', ?)"
+            if dry_run:
+                trimmed += conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {where}", (cutoff,)).fetchone()[0]
+                continue
+            while True:
+                deleted = conn.execute(f"""
+                    DELETE FROM {table} WHERE id IN (SELECT id FROM {table} WHERE {where} LIMIT ?)
+                """, (cutoff, batch_size)).rowcount
+                conn.commit()
+                trimmed += deleted
+                if deleted < batch_size:
+                    break
+        return trimmed
+    finally:
+        conn.close()
+
+def recompress(db, batch_size=500, dry_run=False):
+    """
+    Compresses plain values of the packed columns that reach the size
+    threshold. Returns (values compressed, bytes saved).
+    """
+    min_bytes = settings.db_compress_min_bytes
+    if not min_bytes:
+        return 0, 0
+    conn = db._get_connection()
+    count = saved = 0
+    try:
+        for column in PACKED_COLUMNS:
+            where = f"typeof({column}) = 'text' AND length(CAST({column} AS BLOB)) >= ?"
+            if dry_run:
+                count += conn.execute(f"SELECT COUNT(*) FROM processing_queue WHERE {where}", (min_bytes,)).fetchone()[0]
+                continue
+            last = ""
+            while True:
+                # Keyset pagination: values that do not shrink stay plain and
+                # would otherwise be selected again
+                rows = conn.execute(f"""
+                    SELECT chunk_id, {column} FROM processing_queue
+                    WHERE chunk_id > ? AND {where} ORDER BY chunk_id LIMIT ?
+                """, (last, min_bytes, batch_size)).fetchall()
+                if not rows:
+                    break
+                last = rows[-1][0]
+                updates = []
+                for chunk_id, value in rows:
+                    packed = codec.pack(value, min_bytes)
+                    if codec.is_packed(packed):
+                        updates.append((packed, chunk_id))
+                        saved += len(value.encode("utf-8")) - len(packed)
+                conn.executemany(f"UPDATE processing_queue SET {column} = ? WHERE chunk_id = ?", updates)
+                conn.commit()
+                count += len(updates)
+        return count, saved
+    finally:
+        conn.close()
+
+def vacuum(db, full=False):
+    """
+    Releases free pages and truncates the WAL. Returns "full" or "incremental".
+    """
+    conn = db._get_connection()
+    try:
+        if fts_available(conn):
+            conn.execute("INSERT INTO cards_fts (cards_fts) VALUES ('optimize')")
+            conn.commit()
+        # auto_vacuum: 0 = none, 1 = full, 2 = incremental; switching takes a VACUUM
+        if full or conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            mode = "full"
+        else:
+            # Frees one page per step and returns no rows: executescript
+            # runs it to completion, execute() would stop after one page
+            conn.executescript("PRAGMA incremental_vacuum;")
+            mode = "incremental"
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return mode
+    finally:
+        conn.close()
+
+def compact(db=None, retention_days=None, timing_retention_days=None, prune=False, full=False, dry_run=False):
+    """
+    Runs the maintenance steps; returns a report with storage stats before and after.
+    """
+    db = db or DBManager()
+    retention_days = settings.source_retention_days if retention_days is None else retention_days
+    timing_retention_days = settings.timing_retention_days if timing_retention_days is None else timing_retention_days
+    report = {"before": storage_stats(db)}
+    report["archived_chunks"] = archive_sources(db, retention_days, dry_run=dry_run) if retention_days > 0 else 0
+    orphans = orphaned_notebooks(db) if prune else []
+    report["orphaned_notebooks"] = orphans
+    report["pruned_chunks"] = prune_notebooks(db, orphans) if orphans and not dry_run else 0
+    report["trimmed_timing_rows"] = trim_timings(db, timing_retention_days, dry_run=dry_run) if timing_retention_days > 0 else 0
+    report["recompressed_values"], report["recompressed_bytes_saved"] = recompress(db, dry_run=dry_run)
+    if not dry_run:
+        report["vacuum"] = vacuum(db, full=full)
+    report["after"] = storage_stats(db)
+    return report
+
+def _mib(n):
+    return f"{n / (1 << 20):.1f} MiB"
+
+def format_report(report, dry_run=False):
+    verb = "would be" if dry_run else "were"
+    before, after = report["before"], report["after"]
+    lines = [
+        f"Archived source text: {report['archived_chunks']} chunks {verb} archived",
+        f"Orphaned notebooks: {', '.join(report['orphaned_notebooks']) or 'none'}"
+        + (f" ({report['pruned_chunks']} chunks pruned)" if report["pruned_chunks"] else ""),
+        f"Trimmed timings: {report['trimmed_timing_rows']} rows {verb} deleted",
+        f"Recompressed: {report['recompressed_values']} values"
+        + (f", {_mib(report['recompressed_bytes_saved'])} saved" if report["recompressed_bytes_saved"] else ""),
+    ]
+    if "vacuum" in report:
+        lines.append(f"Vacuum: {report['vacuum']}")
+    lines.append(f"Database: {_mib(before['db_bytes'])} -> {_mib(after['db_bytes'])} "
+                 f"(WAL {_mib(before['wal_bytes'])} -> {_mib(after['wal_bytes'])}, "
+                 f"free pages {_mib(before['free_bytes'])} -> {_mib(after['free_bytes'])})")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive old source text, prune orphaned notebooks and compact the database.")
+    parser.add_argument("--retention-days", type=int, default=None,
+                        help=f"Archive source text of chunks completed this many days ago (default {settings.source_retention_days}, 0 = keep)")
+    parser.add_argument("--timing-retention-days", type=int, default=None,
+                        help=f"Delete raw stage timings and token stats older than this many days (default {settings.timing_retention_days}, 0 = keep)")
+    parser.add_argument("--prune-orphans", action="store_true", help="Delete notebooks whose data/input folder is gone.")
+    parser.add_argument("--full", action="store_true", help="Always run a full VACUUM.")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be done.")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    args = parser.parse_args()
+
+    try:
+        result = compact(retention_days=args.retention_days, timing_retention_days=args.timing_retention_days,
+                         prune=args.prune_orphans, full=args.full, dry_run=args.dry_run)
+    except sqlite3.OperationalError as e:
+        # VACUUM needs the database to itself
+        raise SystemExit(f"Compaction failed ({e}); stop workers and ingestion first.")
+    print(json.dumps(result, indent=2) if args.json else format_report(result, args.dry_run))
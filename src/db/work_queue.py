@@ -0,0 +1,225 @@
+# src/db/work_queue.py
+"""
+The worker-facing side of the processing queue: claiming chunks, renewing
+claims, storing results. DBManager delegates get_pending_chunk, claim_chunks,
+renew_leases, update_chunk_status, get_pending_count and
+record_generation_stats to one of:
+
+SQLiteQueue   the local database (default)
+HTTPQueue     a coordinator service (src/coordinator/server.py) that owns the
+              database, for workers on other machines
+
+Claims are leases: a claimed chunk is PROCESSING until its holder stores a
+result or the lease (ZERO_QUEUE_LEASE_SECONDS) runs out, after which the next
+claim hands it out again. A result from a worker whose lease was taken over
+is rejected.
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from config import settings
+from db.codec import unpack
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class CoordinatorError(Exception):
+    pass
+
+class WorkQueue:
+    def __init__(self, worker_id=None):
+        self.worker_id = worker_id or default_worker_id()
+
+    def claim(self, notebook, limit=1):
+        """
+        Leases up to `limit` PENDING chunks of the notebook, oldest first.
+        Returns [{"chunk_id", "source_text", "metadata"}].
+        """
+        raise NotImplementedError
+
+    def renew(self, chunk_ids):
+        """
+        Extends the leases of chunks this worker still holds; returns their ids.
+        """
+        raise NotImplementedError
+
+    def update(self, chunk_id, status, output_json=None, error_log=None, verification_score=None, card_count=None):
+        """
+        Stores a chunk's result and ends its lease. Returns False when the
+        chunk is leased to another worker (the result is dropped).
+        """
+        raise NotImplementedError
+
+    def pending_count(self, notebook):
+        raise NotImplementedError
+
+    def record_generation_stats(self, rows):
+        """
+        Stores token accounting rows (see DBManager.record_generation_stats).
+        """
+        raise NotImplementedError
+
+class SQLiteQueue(WorkQueue):
+    def __init__(self, connect, worker_id=None, lease_seconds=None):
+        """
+        connect: Returns a new sqlite3 connection (DBManager._get_connection).
+        The methods take an optional `worker` so the coordinator can act on
+        behalf of its remote workers.
+        """
+        super().__init__(worker_id)
+        self.connect = connect
+        self.lease_seconds = lease_seconds or settings.queue_lease_seconds
+
+    def claim(self, notebook, limit=1, worker=None):
+        now = time.time()
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Expired leases go back to the queue first, as do chunks left
+            # PROCESSING without a lease by workers from before leases existed
+            conn.execute("""
+                UPDATE processing_queue SET status = 'PENDING', leased_by = NULL, lease_expires = NULL
+                WHERE notebook = ? AND status = 'PROCESSING' AND (lease_expires IS NULL OR lease_expires < ?)
+            """, (notebook, now))
+            rows = conn.execute("""
+                UPDATE processing_queue
+                SET status = 'PROCESSING', leased_by = ?, lease_expires = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE chunk_id IN (
+                    SELECT chunk_id FROM processing_queue
+                    WHERE notebook = ? AND status = 'PENDING'
+                    ORDER BY created_at ASC LIMIT ?
+                )
+                RETURNING chunk_id, source_text, metadata, created_at
+            """, (worker or self.worker_id, now + self.lease_seconds, notebook, limit)).fetchall()
+            conn.commit()
+            rows.sort(key=lambda row: row[3])
+            return [{"chunk_id": r[0], "source_text": unpack(r[1]), "metadata": json.loads(unpack(r[2]))} for r in rows]
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return []
+        finally:
+            conn.close()
+
+    def renew(self, chunk_ids, worker=None):
+        if not chunk_ids:
+            return []
+        conn = self.connect()
+        try:
+            placeholders = ", ".join("?" * len(chunk_ids))
+            rows = conn.execute(f"""
+                UPDATE processing_queue SET lease_expires = ?
+                WHERE chunk_id IN ({placeholders}) AND leased_by = ? AND status = 'PROCESSING'
+                RETURNING chunk_id
+            """, [time.time() + self.lease_seconds, *chunk_ids, worker or self.worker_id]).fetchall()
+            conn.commit()
+            return [row[0] for row in rows]
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return []
+        finally:
+            conn.close()
+
+    def update(self, chunk_id, status, output_json=None, error_log=None, verification_score=None, card_count=None, worker=None):
+        conn = self.connect()
+        try:
+            cursor = conn.execute("""
+                UPDATE processing_queue
+                SET status = ?, output_json = ?, error_log = ?, verification_score = ?, card_count = ?,
+                    leased_by = NULL, lease_expires = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE chunk_id = ? AND (leased_by IS NULL OR leased_by = ?)
+            """, (status, output_json, error_log, verification_score, card_count, chunk_id, worker or self.worker_id))
+            conn.commit()
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return False
+        finally:
+            conn.close()
+
+    def pending_count(self, notebook):
+        conn = self.connect()
+        try:
+            return conn.execute(
+                "SELECT COALESCE(SUM(count), 0) FROM queue_counters WHERE notebook = ? AND status = 'PENDING'",
+                (notebook,)
+            ).fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            return 0
+        finally:
+            conn.close()
+
+    def record_generation_stats(self, rows):
+        conn = self.connect()
+        try:
+            conn.executemany("""
+                INSERT INTO generation_stats (chunk_id, notebook, filename, model, kind, prompt_tokens,
+                                              completion_tokens, finish_reason, wall_s)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+        finally:
+            conn.close()
+
+class HTTPQueue(WorkQueue):
+    def __init__(self, url, token=None, worker_id=None, timeout=30, retries=3):
+        """
+        url: Coordinator base URL, e.g. http://10.0.0.5:8090
+        token: Shared secret sent as a bearer token (ZERO_COORDINATOR_TOKEN).
+        Connection errors and 5xx responses are retried `retries` times with
+        exponential backoff before raising CoordinatorError.
+        """
+        super().__init__(worker_id)
+        self.url = url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+        self.retries = retries
+
+    def _request(self, method, path, payload=None, retries=None):
+        retries = self.retries if retries is None else retries
+        data = json.dumps(payload).encode() if payload is not None else None
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        for attempt in range(retries + 1):
+            request = urllib.request.Request(self.url + path, data=data, headers=headers, method=method)
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    return json.loads(response.read())
+            except urllib.error.HTTPError as e:
+                if e.code < 500 or attempt == retries:
+                    raise CoordinatorError(f"{method} {path}: HTTP {e.code} {e.read().decode(errors='replace')}")
+            except (urllib.error.URLError, OSError) as e:
+                if attempt == retries:
+                    raise CoordinatorError(f"{method} {path}: {e}")
+            time.sleep(2 ** attempt)
+
+    def claim(self, notebook, limit=1):
+        return self._request("POST", "/lease", {"worker": self.worker_id, "notebook": notebook, "limit": limit})["chunks"]
+
+    def renew(self, chunk_ids):
+        if not chunk_ids:
+            return []
+        return self._request("POST", "/renew", {"worker": self.worker_id, "chunk_ids": list(chunk_ids)})["chunk_ids"]
+
+    def update(self, chunk_id, status, output_json=None, error_log=None, verification_score=None, card_count=None):
+        return self._request("POST", "/complete", {
+            "worker": self.worker_id, "chunk_id": chunk_id, "status": status, "output_json": output_json,
+            "error_log": error_log, "verification_score": verification_score, "card_count": card_count,
+        })["accepted"]
+
+    def pending_count(self, notebook):
+        return self._request("GET", f"/pending?{urllib.parse.urlencode({'notebook': notebook})}")["pending"]
+
+    def record_generation_stats(self, rows):
+        # Not retried: the rows may have been stored before the response was
+        # lost, and a second POST would count their tokens twice
+        self._request("POST", "/generation_stats", {"rows": [list(row) for row in rows]}, retries=0)
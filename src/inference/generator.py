@@ -1,21 +1,58 @@
 # src/inference/generator.py
 
 import json
+import time
 import logging
 from vllm import LLM, SamplingParams
-from inference.prompts import SYSTEM_PROMPT, EXTRACTION_PROMPT_TEMPLATE
+from inference.prompts import SYSTEM_PROMPT, EXTRACTION_PROMPT_TEMPLATE, REPAIR_PROMPT_TEMPLATE, FLASHCARD_SCHEMA
+from inference.json_parser import recover_cards
 from utils.logger import setup_logger
+from utils.metrics import span
 
 logger = setup_logger("FlashcardGenerator")
 
+def request_usage(output, kind, wall_s):
+    """
+    Token accounting for one vLLM RequestOutput: prompt/completion token counts,
+    finish reason ('length' = truncated at max_tokens) and wall time.
+    """
+    completion = output.outputs[0]
+    return {
+        "kind": kind,
+        "prompt_tokens": len(output.prompt_token_ids or []),
+        "completion_tokens": len(completion.token_ids or []),
+        "finish_reason": completion.finish_reason,
+        "wall_s": wall_s,
+    }
+
+def build_structured_output_kwargs(schema):
+    """
+    Returns the SamplingParams keyword that constrains decoding to `schema`,
+    or None when the installed vLLM has no structured-output support.
+    """
+    try:
+        # vLLM >= 0.10
+        from vllm.sampling_params import StructuredOutputsParams
+        return {"structured_outputs": StructuredOutputsParams(json=schema)}
+    except ImportError:
+        pass
+    try:
+        # vLLM 0.6 - 0.9
+        from vllm.sampling_params import GuidedDecodingParams
+        return {"guided_decoding": GuidedDecodingParams(json=schema)}
+    except ImportError:
+        return None
+
 class FlashcardGenerator:
-    def __init__(self, model_name="Qwen/Qwen2.5-0.5B-Instruct", gpu_memory_utilization=0.7, max_model_len=4096):
+    def __init__(self, model_name="Qwen/Qwen2.5-0.5B-Instruct", gpu_memory_utilization=0.7, max_model_len=4096, structured_output=True):
         # Previous high-quality model: casperhansen/llama-3-8b-instruct-awq
         """
         Initializes the vLLM engine.
         model_name: Path or HuggingFace ID of the model.
         gpu_memory_utilization: Fraction of GPU memory to reserve for vLLM. 
                                 0.7 leaves room for embedding models.
+        structured_output: Constrain decoding to the flashcard JSON schema
+                           when the installed vLLM supports it.
         """
         logger.info(f"Loading vLLM model: {model_name} (max_len: {max_model_len})")
         # Note: This requires the model to be downloaded.
@@ -27,25 +64,54 @@ class FlashcardGenerator:
             enforce_eager=True,
             max_model_len=max_model_len
         )
+        structured_kwargs = None
+        if structured_output:
+            structured_kwargs = build_structured_output_kwargs(FLASHCARD_SCHEMA)
+            if structured_kwargs is None:
+                logger.warning("Installed vLLM has no structured output support, falling back to free-form JSON.")
+        self.structured_output = structured_kwargs is not None
+
         self.sampling_params = SamplingParams(
             temperature=0.1, # Low temperature for factual extraction
             top_p=0.95,
             max_tokens=2048,
-            repetition_penalty=1.05
+            repetition_penalty=1.05,
+            **(structured_kwargs or {})
         )
 
     def generate_cards(self, text):
         """
         Generates flashcards for a given text chunk.
+        The result carries the call's token accounting under "usage".
         """
         prompt = self.build_prompt(text)
-        
+        generated_text, usage = self._generate(prompt, "generate")
+        if usage["finish_reason"] == "length":
+            logger.warning(f"Generation truncated at max_tokens ({usage['completion_tokens']} tokens).")
+
+        with span("worker.parse"):
+            result = self.parse_json_output(generated_text)
+        result["usage"] = usage
+        return result
+
+    def generate_repair_cards(self, uncovered_sentences):
+        """
+        Generates flashcards for source sentences missed by the first pass.
+        """
+        repair_prompt = REPAIR_PROMPT_TEMPLATE.format(uncovered_text="\n".join(uncovered_sentences))
+        generated_text, usage = self._generate(repair_prompt, "repair")
+        if usage["finish_reason"] == "length":
+            logger.warning(f"Repair generation truncated at max_tokens ({usage['completion_tokens']} tokens).")
+        result = self.parse_json_output(generated_text)
+        result["usage"] = usage
+        return result
+
+    def _generate(self, prompt, kind):
         # vLLM supports batching, but for a single chunk we pass a list of one
+        start = time.perf_counter()
         outputs = self.llm.generate([prompt], self.sampling_params)
-        
-        generated_text = outputs[0].outputs[0].text
-        
-        return self.parse_json_output(generated_text)
+        wall_s = time.perf_counter() - start
+        return outputs[0].outputs[0].text, request_usage(outputs[0], kind, wall_s)
 
     def build_prompt(self, text):
         # Generic Chat Format (works reasonably well for Qwen, Mistral, Llama)
@@ -57,6 +123,8 @@ class FlashcardGenerator:
     def parse_json_output(self, text):
         """
         Extracts JSON from the model's response, handling markdown blocks and chatter.
+        Falls back to recovering every complete card object when the output is
+        malformed or truncated at max_tokens.
         """
         # 1. Clean up markdown code blocks if present
         clean_text = text.strip()
@@ -78,17 +146,14 @@ class FlashcardGenerator:
             return json.loads(json_str)
             
         except Exception as e:
+            # 4. Recover every complete card object (chatty or truncated output)
+            cards = recover_cards(text)
+            if cards:
+                logger.warning(f"Malformed JSON ({e}), recovered {len(cards)} complete cards.")
+                return {"flashcards": cards, "recovered": True}
             logger.error(f"Failed to parse JSON: {e}")
-            # 4. Final attempt: basic cleanup of common escape issues
-            try:
-                # Replace unescaped newlines within strings
-                # This is a bit of a hack but common with Llama-3
-                lines = json_str.splitlines()
-                rejoined = " ".join([l.strip() for l in lines])
-                return json.loads(rejoined)
-            except:
-                logger.debug(f"Failed raw output: {text}")
-                return {"flashcards": [], "error": str(e)}
+            logger.debug(f"Failed raw output: {text}")
+            return {"flashcards": [], "error": str(e)}
 
 if __name__ == "__main__":
     # Test script (requires model weights)
@@ -0,0 +1,86 @@
+# src/inference/json_parser.py
+
+import re
+import json
+
+# Backslashes that do not start a valid JSON escape (e.g. LaTeX '\(' or '\sum')
+INVALID_ESCAPE = re.compile(r'\\(?![\\"/bfnrtu])')
+
+def is_card(obj):
+    return isinstance(obj, dict) and \
+        ('front' in obj or 'question' in obj) and \
+        ('back' in obj or 'answer' in obj)
+
+def loads_lenient(text):
+    """
+    json.loads that tolerates raw control characters inside strings and
+    unescaped backslashes, the two most common defects in LLM-written JSON.
+    """
+    try:
+        return json.loads(text, strict=False)
+    except json.JSONDecodeError:
+        return json.loads(INVALID_ESCAPE.sub(r'\\\\', text), strict=False)
+
+class CardStreamParser:
+    def __init__(self):
+        """
+        Incremental parser that emits every complete flashcard object found in
+        model output, regardless of surrounding chatter, code fences or a
+        truncated tail. Feed it text as it arrives (or all at once).
+        """
+        self.cards = []
+        self._text = ""
+        self._pos = 0
+        self._starts = []
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text):
+        """
+        Consumes more output and returns the cards completed by it.
+        """
+        self._text += text
+        new_cards = []
+        text = self._text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                # Quotes only matter inside JSON; chatter like 'Here's "the" output' is skipped
+                self._in_string = bool(self._starts)
+            elif ch == '{':
+                self._starts.append(i)
+            elif ch == '}' and self._starts:
+                start = self._starts.pop()
+                try:
+                    obj = loads_lenient(text[start:i + 1])
+                except ValueError:
+                    obj = None
+                if is_card(obj):
+                    new_cards.append(obj)
+
+        if self._starts:
+            # Keep the open objects, drop everything before the outermost one
+            offset = self._starts[0]
+            self._starts = [s - offset for s in self._starts]
+            self._text = text[offset:]
+        else:
+            self._text = ""
+        self._pos = len(self._text)
+
+        self.cards.extend(new_cards)
+        return new_cards
+
+def recover_cards(text):
+    """
+    Returns every complete flashcard object in `text`.
+    """
+    parser = CardStreamParser()
+    parser.feed(text)
+    return parser.cards
@@ -51,4 +51,25 @@ Output as JSON:
 {{
   "flashcards": [ ... ]
 }}
-"""
\ No newline at end of file
+"""
+
+# JSON schema used to constrain decoding when the backend supports structured output
+FLASHCARD_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "flashcards": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "front": {"type": "string"},
+                    "back": {"type": "string"},
+                    "type": {"type": "string", "enum": ["concept", "definition", "formula", "list"]},
+                    "source_quote": {"type": "string"}
+                },
+                "required": ["front", "back", "type", "source_quote"]
+            }
+        }
+    },
+    "required": ["flashcards"]
+}
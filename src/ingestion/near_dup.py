@@ -0,0 +1,154 @@
+# src/ingestion/near_dup.py
+
+import re
+import zlib
+import hashlib
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TOKEN = re.compile(r"\w+")
+# Header context line the chunker prepends; ignored so a slide repeated under
+# another heading still matches
+CONTEXT_PREFIX = re.compile(r"\AContext: [^\n]*\n\n")
+# Largest prime below 2**32; with a, b < 2**31 and 32-bit x, a * x + b fits in uint64
+PRIME = (1 << 32) - 5
+
+def lsh_bands(num_perm, threshold, recall=0.9):
+    """
+    Picks (bands, rows) with bands * rows == num_perm: the most rows per band
+    (fewest false candidates) that still makes a pair at `threshold` a
+    candidate with probability >= recall, i.e. 1 - (1 - t^rows)^bands.
+    """
+    pairs = sorted(((num_perm // r, r) for r in range(1, num_perm + 1) if num_perm % r == 0), key=lambda p: -p[1])
+    for bands, rows in pairs:
+        if 1 - (1 - threshold ** rows) ** bands >= recall:
+            return bands, rows
+    return num_perm, 1
+
+class MinHasher:
+    def __init__(self, num_perm=128, shingle_size=5, seed=1):
+        """
+        MinHash signatures over word shingles.
+        num_perm: Signature length; estimated Jaccard error is ~1/sqrt(num_perm).
+        shingle_size: Words per shingle.
+        """
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 1 << 31, size=(num_perm, 1), dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 31, size=(num_perm, 1), dtype=np.uint64)
+
+    def shingles(self, text):
+        """
+        Returns the distinct 32-bit hashes of the text's word shingles.
+        """
+        tokens = TOKEN.findall(CONTEXT_PREFIX.sub("", text).lower())
+        k = self.shingle_size
+        if len(tokens) < k:
+            return np.empty(0, dtype=np.uint64)
+        return np.unique(np.fromiter(
+            (zlib.crc32(" ".join(tokens[i:i + k]).encode()) for i in range(len(tokens) - k + 1)),
+            dtype=np.uint64
+        ))
+
+    def signature(self, text):
+        """
+        Returns (signature uint32[num_perm], shingle count); None when the text
+        has no complete shingle.
+        """
+        shingles = self.shingles(text)
+        if not len(shingles):
+            return None, 0
+        hashed = (self.a * shingles[None, :] + self.b) % PRIME
+        return hashed.min(axis=1).astype(np.uint32), len(shingles)
+
+class NearDuplicateDetector:
+    def __init__(self, db, notebook, threshold=0.8, num_perm=128, min_shingles=20):
+        """
+        Ingest-time near-duplicate detection of chunks within a notebook
+        (MinHash + LSH banding). A chunk whose estimated Jaccard similarity to
+        an earlier canonical chunk reaches `threshold` is linked to it instead
+        of being queued for generation.
+        min_shingles: Chunks with fewer word shingles (headings, captions) are
+                      never linked; small texts match too easily.
+        """
+        self.db = db
+        self.notebook = notebook
+        self.threshold = threshold
+        self.min_shingles = min_shingles
+        self.hasher = MinHasher(num_perm=num_perm)
+        self.bands, self.rows = lsh_bands(num_perm, threshold)
+        self._pending = {}
+
+    def band_keys(self, signature):
+        """
+        Returns one (band, bucket) key per LSH band; the bucket is a signed
+        64-bit hash of the band's rows.
+        """
+        return [
+            (band, int.from_bytes(hashlib.blake2b(
+                signature[band * self.rows:(band + 1) * self.rows].tobytes(), digest_size=8
+            ).digest(), "big", signed=True))
+            for band in range(self.bands)
+        ]
+
+    def link(self, chunks, filename=None):
+        """
+        Finds the canonical chunk of every near-duplicate among `chunks` (one
+        document, in order), matching against the notebook's indexed chunks
+        and earlier chunks of the same document. Chunks stored for `filename`
+        by an earlier ingest of the document are not matched.
+        Returns [(canonical chunk id or None, similarity or None)], aligned with chunks.
+        Call `index` with the ids of the chunks that were queued once they are stored.
+        """
+        self._pending = {}
+        signatures, keys = [], set()
+        for chunk in chunks:
+            signature, count = self.hasher.signature(chunk["content"])
+            if signature is None or count < self.min_shingles:
+                signature = None
+            signatures.append(signature)
+            if signature is not None:
+                keys.update(self.band_keys(signature))
+
+        stored = self.db.get_near_duplicate_candidates(self.notebook, sorted(keys), exclude_filename=filename) \
+            if keys else {}
+        candidate_ids = list(stored)
+        candidates = np.array([np.frombuffer(stored[c], dtype=np.uint32) for c in candidate_ids]) \
+            if candidate_ids else np.empty((0, self.hasher.num_perm), dtype=np.uint32)
+
+        links = []
+        for chunk, signature in zip(chunks, signatures):
+            if signature is None:
+                links.append((None, None))
+                continue
+            # Estimated Jaccard similarity = share of agreeing signature rows
+            scores = (candidates == signature).mean(axis=1) if len(candidate_ids) else np.empty(0)
+            best = int(scores.argmax()) if len(scores) else -1
+            if best >= 0 and scores[best] >= self.threshold:
+                links.append((candidate_ids[best], round(float(scores[best]), 4)))
+                continue
+            links.append((None, None))
+            # Canonical: later chunks of this document may match it
+            self._pending[chunk["chunk_id"]] = signature
+            candidate_ids.append(chunk["chunk_id"])
+            candidates = np.vstack([candidates, signature[None, :]])
+
+        skipped = sum(1 for canonical, _ in links if canonical)
+        if skipped:
+            logger.info(f"{skipped} of {len(chunks)} chunks are near-duplicates of earlier chunks")
+        return links
+
+    def index(self, chunk_ids):
+        """
+        Adds the canonical chunks of the last `link` call to the notebook's LSH index.
+        """
+        rows = [
+            (chunk_id, self._pending[chunk_id].tobytes(), self.band_keys(self._pending[chunk_id]))
+            for chunk_id in chunk_ids if chunk_id in self._pending
+        ]
+        if rows:
+            self.db.add_chunk_signatures(self.notebook, rows)
+        self._pending = {}
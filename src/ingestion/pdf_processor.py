@@ -3,6 +3,7 @@ import subprocess
 import logging
 from pathlib import Path
 from utils.logger import setup_logger
+from utils.metrics import span
 from inference.vision import ImageDescriber
 from docling.document_converter import DocumentConverter
 from config import settings
@@ -88,8 +89,9 @@ class PDFProcessor:
         
         try:
             # Convert the document
-            result = self.converter.convert(str(pdf_path))
-            markdown_content = result.document.export_to_markdown()
+            with span("ingest.docling", filename=pdf_path.name):
+                result = self.converter.convert(str(pdf_path))
+                markdown_content = result.document.export_to_markdown()
             
             # Save to file
             with open(md_file, "w", encoding="utf-8") as f:
@@ -99,7 +101,8 @@ class PDFProcessor:
 
             # NEW: Visual Extraction Sub-system (Plan 3.2)
             # Docling might extract images too, but for now we'll keep the existing structure
-            self.enrich_with_visuals(md_file, self.output_dir / pdf_path.stem / "assets")
+            with span("ingest.visuals", filename=pdf_path.name):
+                self.enrich_with_visuals(md_file, self.output_dir / pdf_path.stem / "assets")
             
             return md_file
 
@@ -1,12 +1,16 @@
 import sys
 import os
+import hashlib
 import subprocess
 from pathlib import Path
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TaskProgressColumn
 from ingestion.pdf_processor import PDFProcessor
 from ingestion.chunker import SemanticChunker
+from ingestion.near_dup import NearDuplicateDetector
 from db.db_manager import DBManager
-from utils.logger import setup_logger, console
+from utils.logger import setup_logger, console, exit_on_sigterm
+from utils import metrics
+from utils.profiling import Profiler
 from config import settings
 
 logger = setup_logger("StudyEngine", log_file=settings.logs_dir / "ingestion.log")
@@ -20,6 +24,13 @@ else:
     INPUT_DIR = settings.input_dir
     logger.info("Targeting root input directory")
 
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
 def check_environment():
     """Performs a pre-flight check of critical dependencies."""
     logger.info("Performing environment pre-flight check...")
@@ -52,10 +63,20 @@ def main():
     processor = PDFProcessor()
     chunker = SemanticChunker()
     db = DBManager()
+    near_dup = NearDuplicateDetector(db, target_notebook, threshold=settings.chunk_dedup_threshold) \
+        if settings.chunk_dedup_enabled else None
 
     # 1. Scan and Register new PDFs
+    # Documents already ingested with identical content are not chunked again.
+    # The hash is recorded only once a document's chunks are stored.
     raw_pdfs = list(INPUT_DIR.glob("*.pdf"))
+    digests = {}
     for pdf in raw_pdfs:
+        digest = digests[pdf.name] = file_sha256(pdf)
+        if db.get_document_status(pdf.name, target_notebook) == 'COMPLETED' and \
+                db.get_document_hash(pdf.name, target_notebook) == digest:
+            logger.info(f"Skipping unchanged document [bold cyan]{pdf.name}[/]")
+            continue
         db.add_document_to_library(pdf.name, target_notebook)
         db.update_document_status(pdf.name, 'PROCESSING', target_notebook)
 
@@ -81,46 +102,70 @@ def main():
     ) as progress:
         
         pdf_task = progress.add_task("[cyan]Processing PDFs...", total=len(pdfs))
+        profiler = Profiler("ingestor", unit="documents")
         
-        for pdf in pdfs:
-            logger.info(f"Step 1: Ingesting [bold cyan]{pdf.name}[/]...")
-            try:
-                # Note: This calls Marker CLI. Ensure it's installed.
-                md_file_path = processor.process_pdf(pdf)
-                
-                # Read the generated markdown
-                with open(md_file_path, "r", encoding="utf-8") as f:
-                    markdown_content = f.read()
-
-                # 2. Chunking
-                logger.info(f"Step 2: Chunking {pdf.name}...")
-                metadata = {"source_file": pdf.name, "path": str(pdf)}
-                chunks = chunker.chunk_text(markdown_content, metadata=metadata)
-                
-                # 3. Populate Database
-                logger.info(f"Step 3: Populating database with [bold green]{len(chunks)}[/] chunks...")
-                
-                chunk_task = progress.add_task(f"Inserting chunks for {pdf.name}", total=len(chunks))
-                for chunk in chunks:
-                    db.insert_chunk(
-                        chunk_id=chunk["chunk_id"],
-                        source_text=chunk["content"],
-                        metadata=chunk["metadata"],
-                        notebook=target_notebook,
-                        filename=pdf.name
-                    )
-                    progress.advance(chunk_task)
-                
-                progress.remove_task(chunk_task)
-                
-                db.update_document_status(pdf.name, 'COMPLETED', target_notebook)
-                
-                logger.info(f"Finished processing [bold green]{pdf.name}[/]")
-
-            except Exception as e:
-                logger.error(f"Error processing {pdf}: {e}")
+        # The profile is written however the loop ends (cancel, Ctrl-C, error)
+        try:
+            for pdf in pdfs:
+                logger.info(f"Step 1: Ingesting [bold cyan]{pdf.name}[/]...")
+                try:
+                    with profiler.window(), metrics.span("ingest.document", notebook=target_notebook, filename=pdf.name):
+                        # Note: This calls Marker CLI. Ensure it's installed.
+                        md_file_path = processor.process_pdf(pdf)
+
+                        # Read the generated markdown
+                        with open(md_file_path, "r", encoding="utf-8") as f:
+                            markdown_content = f.read()
+
+                        # 2. Chunking
+                        logger.info(f"Step 2: Chunking {pdf.name}...")
+                        metadata = {"source_file": pdf.name, "path": str(pdf)}
+                        with metrics.span("ingest.chunking", notebook=target_notebook, filename=pdf.name):
+                            chunks = chunker.chunk_text(markdown_content, metadata=metadata)
+
+                        # Near-duplicates of earlier chunks are linked to them and reuse their cards
+                        links = [(None, None)] * len(chunks)
+                        if near_dup:
+                            with metrics.span("ingest.near_dup", notebook=target_notebook, filename=pdf.name):
+                                links = near_dup.link(chunks, filename=pdf.name)
+                        duplicates = sum(1 for canonical, _ in links if canonical)
+
+                        # 3. Populate Database
+                        logger.info(f"Step 3: Populating database with [bold green]{len(chunks)}[/] chunks"
+                                    f" ([bold yellow]{duplicates}[/] near-duplicates skipped)...")
+
+                        chunk_task = progress.add_task(f"Inserting chunks for {pdf.name}", total=len(chunks))
+                        with metrics.span("ingest.db_insert", notebook=target_notebook, filename=pdf.name):
+                            for chunk, (canonical, similarity) in zip(chunks, links):
+                                db.insert_chunk(
+                                    chunk_id=chunk["chunk_id"],
+                                    source_text=chunk["content"],
+                                    metadata=chunk["metadata"],
+                                    notebook=target_notebook,
+                                    filename=pdf.name,
+                                    canonical_chunk_id=canonical,
+                                    similarity=similarity
+                                )
+                                progress.advance(chunk_task)
+                            if near_dup:
+                                near_dup.index([chunk["chunk_id"] for chunk in chunks])
+
+                        progress.remove_task(chunk_task)
+
+                        db.set_document_hash(pdf.name, digests.get(pdf.name) or file_sha256(pdf), target_notebook)
+                        db.update_document_status(pdf.name, 'COMPLETED', target_notebook)
+
+                    logger.info(f"Finished processing [bold green]{pdf.name}[/]")
+
+                except Exception as e:
+                    logger.error(f"Error processing {pdf}: {e}")
+                finally:
+                    metrics.flush()
             
-            progress.advance(pdf_task)
+                progress.advance(pdf_task)
+        finally:
+            profiler.finish()
     
 if __name__ == "__main__":
+    exit_on_sigterm()
     main()
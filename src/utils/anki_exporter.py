@@ -0,0 +1,241 @@
+# src/utils/anki_exporter.py
+
+import os
+import json
+import time
+import html
+import sqlite3
+import hashlib
+import zipfile
+import argparse
+from pathlib import Path
+from db.db_manager import DBManager
+from utils.logger import setup_logger
+from config import settings
+
+logger = setup_logger("AnkiExporter")
+
+MODEL_NAME = "Zero-Loss Basic"
+
+# Anki 2.1 legacy collection schema (version 11), understood by every Anki importer
+ANKI_SCHEMA = """
+CREATE TABLE col (
+    id integer primary key, crt integer not null, mod integer not null, scm integer not null,
+    ver integer not null, dty integer not null, usn integer not null, ls integer not null,
+    conf text not null, models text not null, decks text not null, dconf text not null, tags text not null
+);
+CREATE TABLE notes (
+    id integer primary key, guid text not null, mid integer not null, mod integer not null,
+    usn integer not null, tags text not null, flds text not null, sfld integer not null,
+    csum integer not null, flags integer not null, data text not null
+);
+CREATE TABLE cards (
+    id integer primary key, nid integer not null, did integer not null, ord integer not null,
+    mod integer not null, usn integer not null, type integer not null, queue integer not null,
+    due integer not null, ivl integer not null, factor integer not null, reps integer not null,
+    lapses integer not null, left integer not null, odue integer not null, odid integer not null,
+    flags integer not null, data text not null
+);
+CREATE TABLE revlog (
+    id integer primary key, cid integer not null, usn integer not null, ease integer not null,
+    ivl integer not null, lastIvl integer not null, factor integer not null, time integer not null,
+    type integer not null
+);
+CREATE TABLE graves (usn integer not null, oid integer not null, type integer not null);
+"""
+
+ANKI_INDEXES = """
+CREATE INDEX ix_notes_usn ON notes (usn);
+CREATE INDEX ix_cards_usn ON cards (usn);
+CREATE INDEX ix_revlog_usn ON revlog (usn);
+CREATE INDEX ix_cards_nid ON cards (nid);
+CREATE INDEX ix_cards_sched ON cards (did, queue, due);
+CREATE INDEX ix_revlog_cid ON revlog (cid);
+CREATE INDEX ix_notes_csum ON notes (csum);
+"""
+
+CARD_CSS = """.card {
+ font-family: arial;
+ font-size: 20px;
+ text-align: center;
+ color: black;
+ background-color: white;
+}
+.source {
+ font-size: 12px;
+ color: grey;
+}
+"""
+
+DEFAULT_DECK_CONF = {
+    "1": {
+        "id": 1, "name": "Default", "mod": 0, "usn": 0, "maxTaken": 60, "autoplay": True, "timer": 0, "replayq": True,
+        "new": {"bury": True, "delays": [1, 10], "initialFactor": 2500, "ints": [1, 4, 7], "order": 1, "perDay": 20, "separate": True},
+        "rev": {"bury": True, "ease4": 1.3, "fuzz": 0.05, "ivlFct": 1, "maxIvl": 36500, "minSpace": 1, "perDay": 100},
+        "lapse": {"delays": [10], "leechAction": 0, "leechFails": 8, "minInt": 1, "mult": 0}
+    }
+}
+
+def stable_id(text, bits=40):
+    """
+    Deterministic positive integer id derived from `text`, so model and deck ids
+    stay the same across exports and Anki merges into the existing note type/deck.
+    """
+    return int(hashlib.sha1(text.encode("utf-8")).hexdigest(), 16) % (1 << bits) + (1 << bits)
+
+def note_guid(deck_name, source_file, front, occurrence):
+    """
+    Note GUID derived from card content. Re-importing a deck with the same GUIDs
+    makes Anki update the existing notes instead of adding duplicates.
+    """
+    key = f"{deck_name}\x1f{source_file}\x1f{front}\x1f{occurrence}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:20]
+
+def to_html(text):
+    return html.escape(text or "").replace("\n", "<br>")
+
+def field_checksum(text):
+    return int(hashlib.sha1(text.encode("utf-8")).hexdigest()[:8], 16)
+
+def deck_json(deck_id, name, mod):
+    return {
+        "id": deck_id, "name": name, "mod": mod, "usn": -1, "desc": "", "dyn": 0, "conf": 1, "collapsed": False,
+        "extendNew": 10, "extendRev": 50,
+        "newToday": [0, 0], "revToday": [0, 0], "lrnToday": [0, 0], "timeToday": [0, 0]
+    }
+
+def model_json(model_id, deck_id, mod):
+    field_names = ["Front", "Back", "Source"]
+    return {
+        "id": model_id, "name": MODEL_NAME, "type": 0, "mod": mod, "usn": -1, "sortf": 0, "did": deck_id,
+        "flds": [{"name": name, "ord": i, "sticky": False, "rtl": False, "font": "Arial", "size": 20, "media": []}
+                 for i, name in enumerate(field_names)],
+        "tmpls": [{
+            "name": "Card 1", "ord": 0, "did": None, "bqfmt": "", "bafmt": "",
+            "qfmt": "{{Front}}",
+            "afmt": "{{FrontSide}}<hr id=answer>{{Back}}<div class=source>{{Source}}</div>"
+        }],
+        "css": CARD_CSS,
+        "latexPre": "\\documentclass[12pt]{article}\n\\special{papersize=3in,5in}\n\\usepackage[utf8]{inputenc}\n"
+                    "\\usepackage{amssymb,amsmath}\n\\pagestyle{empty}\n\\setlength{\\parindent}{0in}\n\\begin{document}\n",
+        "latexPost": "\\end{document}",
+        "req": [[0, "all", [0]]], "tags": [], "vers": []
+    }
+
+class AnkiExporter:
+    def __init__(self, db_path=None, output_dir=None):
+        self.db = DBManager(db_path if db_path else settings.db_path)
+
+        base_out = Path(output_dir) if output_dir else settings.output_dir
+        self.target_notebook = os.environ.get("TARGET_NOTEBOOK")
+        self.output_dir = base_out / self.target_notebook if self.target_notebook else base_out
+        self.output_dir.mkdir(exist_ok=True, parents=True)
+        self.deck_name = self.target_notebook or "Zero-Loss"
+
+    def export_all(self, output_file=None):
+        """
+        Writes every completed card into a single .apkg (one subdeck per source)
+        using bulk inserts into a fresh collection database.
+        """
+        output_file = Path(output_file) if output_file else self.output_dir / f"{self.deck_name}.apkg"
+        collection_path = output_file.with_suffix(".anki2.tmp")
+        if collection_path.exists():
+            collection_path.unlink()
+
+        now = int(time.time())
+        model_id = stable_id(f"model:{MODEL_NAME}")
+        root_deck_id = stable_id(f"deck:{self.deck_name}")
+        decks = {"1": deck_json(1, "Default", now), str(root_deck_id): deck_json(root_deck_id, self.deck_name, now)}
+
+        conn = sqlite3.connect(collection_path)
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.executescript(ANKI_SCHEMA)
+
+        # Notes and cards are produced lazily and bulk-inserted
+        num_notes = 0
+        collapsed = 0
+        note_rows = []
+        card_rows = []
+        base_id = now * 1000
+
+        def flush():
+            conn.executemany("INSERT INTO notes VALUES (?,?,?,?,?,?,?,?,?,?,?)", note_rows)
+            conn.executemany("INSERT INTO cards VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)", card_rows)
+            note_rows.clear()
+            card_rows.clear()
+
+        current_source = None
+        occurrences = {}
+        deck_id = root_deck_id
+        for source_file, output_json in self.db.iter_completed_outputs(self.target_notebook):
+            if source_file != current_source:
+                current_source = source_file
+                occurrences = {}
+                subdeck = f"{self.deck_name}::{Path(source_file).stem}"
+                deck_id = stable_id(f"deck:{subdeck}")
+                decks[str(deck_id)] = deck_json(deck_id, subdeck, now)
+                source_tag = "source::" + Path(source_file).stem.replace(" ", "_")
+
+            for card in json.loads(output_json).get("flashcards", []):
+                if card.get('duplicate_of'):
+                    collapsed += 1
+                    continue
+                front = card.get('front') or card.get('question') or ''
+                back = card.get('back') or card.get('answer') or ''
+                occurrence = occurrences.get(front, 0)
+                occurrences[front] = occurrence + 1
+
+                note_id = base_id + num_notes
+                front_html = to_html(front)
+                tags = f" {source_tag} type::{(card.get('type') or 'concept').replace(' ', '_')} "
+                note_rows.append((
+                    note_id, note_guid(self.deck_name, source_file, front, occurrence), model_id, now, -1, tags,
+                    "\x1f".join([front_html, to_html(back), html.escape(source_file)]),
+                    front, field_checksum(front), 0, ""
+                ))
+                # New card: type/queue 0, due = position in the new queue
+                card_rows.append((note_id, note_id, deck_id, 0, now, -1, 0, 0, num_notes + 1,
+                                  0, 0, 0, 0, 0, 0, 0, 0, ""))
+                num_notes += 1
+            if len(note_rows) >= 10000:
+                flush()
+        flush()
+
+        if num_notes == 0:
+            conn.close()
+            collection_path.unlink()
+            logger.warning("[bold red]No completed cards found to export.[/]")
+            return None
+
+        conf = {
+            "activeDecks": [1], "curDeck": 1, "curModel": str(model_id), "newSpread": 0, "collapseTime": 1200,
+            "timeLim": 0, "estTimes": True, "dueCounts": True, "nextPos": num_notes + 1,
+            "sortType": "noteFld", "sortBackwards": False, "addToCur": True
+        }
+        conn.execute(
+            "INSERT INTO col VALUES (1, ?, ?, ?, 11, 0, 0, 0, ?, ?, ?, ?, '{}')",
+            (now, now * 1000, now * 1000, json.dumps(conf),
+             json.dumps({str(model_id): model_json(model_id, root_deck_id, now)}),
+             json.dumps(decks), json.dumps(DEFAULT_DECK_CONF))
+        )
+        conn.executescript(ANKI_INDEXES)
+        conn.commit()
+        conn.close()
+
+        with zipfile.ZipFile(output_file, "w", compression=zipfile.ZIP_DEFLATED) as package:
+            package.write(collection_path, "collection.anki2")
+            package.writestr("media", "{}")
+        collection_path.unlink()
+
+        if collapsed:
+            logger.info(f"Collapsed [bold yellow]{collapsed}[/] near-duplicate cards.")
+        logger.info(f"Anki export complete: [bold green]{num_notes}[/] notes in [bold cyan]{output_file}[/]")
+        return output_file
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export completed flashcards as an Anki .apkg package.")
+    parser.add_argument("--output", help="Target .apkg path (default: <output>/<notebook>.apkg)")
+    args = parser.parse_args()
+
+    AnkiExporter().export_all(output_file=args.output)
@@ -1,18 +1,28 @@
 # src/utils/exporter.py
 
 import json
-import sqlite3
 import csv
+import io
 import os
+import itertools
+import shutil
+import argparse
 from pathlib import Path
-from utils.logger import setup_logger, console
+from db.db_manager import DBManager
+from utils.report import CoverageReport
+from utils.logger import setup_logger, console, exit_on_sigterm
+from utils import metrics
+from utils.profiling import Profiler
 from config import settings
 
 logger = setup_logger("CSVExporter")
 
+CSV_HEADER = ["Question", "Answer", "Source", "Type"]
+
 class CSVExporter:
     def __init__(self, db_path=None, output_dir=None):
         self.db_path = str(db_path) if db_path else str(settings.db_path)
+        self.db = DBManager(self.db_path)
         
         base_out = Path(output_dir) if output_dir else settings.output_dir
 
@@ -27,85 +37,164 @@ class CSVExporter:
             
         self.output_dir.mkdir(exist_ok=True, parents=True)
 
-    def export_all(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        if self.target_notebook:
-            cursor.execute("SELECT output_json, metadata FROM processing_queue WHERE notebook = ? AND status = 'COMPLETED'", (self.target_notebook,))
+    @staticmethod
+    def card_row(card, source_file):
+        front = card.get('front') or card.get('question') or ''
+        back = card.get('back') or card.get('answer') or ''
+        return [front, back, source_file, card.get('type', 'concept')]
+
+    def source_csv(self, source_file):
+        return self.output_dir / f"{Path(source_file).stem}_cards.csv"
+
+    def export_all(self, full=False):
+        """
+        Exports the notebook's cards. After the first export only sources with
+        chunks changed since the stored watermark (change_seq) are rewritten,
+        and the master CSV is reassembled from the per-source files.
+        full: Ignore the watermark and rewrite everything.
+        """
+        master_file = self.output_dir / "master_study_cards.csv"
+        watermark = None if full else self.db.get_export_watermark(self.target_notebook)
+        # Read before exporting: anything committed meanwhile is picked up next time
+        new_watermark = self.db.get_latest_change(self.target_notebook)
+
+        if watermark is None or not master_file.exists():
+            with metrics.span("export.full", notebook=self.target_notebook):
+                exported = self.export_full(master_file)
         else:
-            cursor.execute("SELECT output_json, metadata FROM processing_queue WHERE status = 'COMPLETED'")
-        
-        rows = cursor.fetchall()
-        if not rows:
+            with metrics.span("export.incremental", notebook=self.target_notebook):
+                exported = self.export_incremental(master_file, watermark)
+
+        if exported:
+            self.db.set_export_watermark(new_watermark, self.target_notebook)
+        metrics.flush()
+
+    def export_full(self, master_file):
+        """
+        Streams completed chunks in source order and writes the per-source CSVs
+        and the master CSV in a single pass. Only one chunk's cards are held in
+        memory at a time.
+        """
+        rows = self.db.iter_completed_outputs(self.target_notebook)
+        first_row = next(rows, None)
+        if first_row is None:
             logger.warning("[bold red]No completed cards found to export.[/]")
-            conn.close()
-            return
-
-        # Group cards by source file
-        source_groups = {}
-        for row in rows:
-            cards_data = json.loads(row[0])
-            metadata = json.loads(row[1])
-            source_file = metadata.get('source_file', 'Unknown_Source')
-            if source_file not in source_groups:
-                source_groups[source_file] = []
-            source_groups[source_file].extend(cards_data.get("flashcards", []))
+            return False
+
+        with open(master_file, mode='w', encoding='utf-8', newline='') as master_handle:
+            master_writer = csv.writer(master_handle)
+            master_writer.writerow(CSV_HEADER)
+            sources, total_cards = self.write_sources(itertools.chain([first_row], rows), master_writer)
+
+        logger.info(f"Master export complete: [bold cyan]{master_file}[/] ([bold green]{total_cards}[/] cards)")
+        self.generate_report()
+        return True
+
+    def export_incremental(self, master_file, watermark):
+        """
+        Rewrites only the per-source CSVs whose chunks changed since `watermark`.
+        """
+        changed = self.db.get_changed_sources(watermark, self.target_notebook)
+        if not changed:
+            logger.info(f"Export is up to date (watermark {watermark}).")
+            return True
 
+        sources = self.db.get_completed_sources(self.target_notebook)
+        changed_set = set(changed)
+        if any(s not in changed_set and not self.source_csv(s).exists() for s in sources):
+            logger.info("Per-source files are missing, falling back to a full export.")
+            return self.export_full(master_file)
+
+        logger.info(f"Incremental export of [bold cyan]{len(changed)}[/] changed sources since {watermark}.")
+        written, _ = self.write_sources(self.db.iter_completed_outputs(self.target_notebook, filenames=changed))
+
+        # Sources that no longer have completed chunks (e.g. re-queued) must not linger
+        for source_file in changed_set - set(written):
+            stale = self.source_csv(source_file)
+            if stale.exists():
+                stale.unlink()
+                logger.info(f"Removed stale export [bold cyan]{stale}[/]")
+
+        with metrics.span("export.assemble", notebook=self.target_notebook):
+            self.assemble_master(master_file, sources)
+        self.generate_report()
+        return True
+
+    def write_sources(self, rows, master_writer=None):
+        """
+        Writes one CSV per source from (source_file, output_json) rows ordered by
+        source, mirroring every row to `master_writer` when given.
+        Returns (sources written, cards written).
+        """
+        sources = []
         total_cards = 0
-        
-        # 1. Export individual CSVs
-        for source_file, cards in source_groups.items():
-            stem = Path(source_file).stem
-            output_file = self.output_dir / f"{stem}_cards.csv"
-            
-            with open(output_file, mode='w', encoding='utf-8', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(["Question", "Answer", "Source", "Type"])
-                for card in cards:
-                    front = card.get('front') or card.get('question') or ''
-                    back = card.get('back') or card.get('answer') or ''
-                    writer.writerow([
-                        front,
-                        back,
-                        source_file,
-                        card.get('type', 'concept')
-                    ])
+        collapsed = 0
+        source_handle = None
+        source_writer = None
+        source_cards = 0
+        try:
+            for source_file, output_json in rows:
+                if not sources or source_file != sources[-1]:
+                    if source_handle:
+                        source_handle.close()
+                        logger.info(f"Exported [bold green]{source_cards}[/] cards to [bold cyan]{source_handle.name}[/]")
+                    sources.append(source_file)
+                    source_cards = 0
+                    source_handle = open(self.source_csv(source_file), mode='w', encoding='utf-8', newline='')
+                    source_writer = csv.writer(source_handle)
+                    source_writer.writerow(CSV_HEADER)
+
+                for card in json.loads(output_json).get("flashcards", []):
+                    # Near-duplicates flagged by the worker's index are collapsed into the earlier card
+                    if card.get('duplicate_of'):
+                        collapsed += 1
+                        continue
+                    row = self.card_row(card, source_file)
+                    source_writer.writerow(row)
+                    if master_writer:
+                        master_writer.writerow(row)
+                    source_cards += 1
                     total_cards += 1
-            logger.info(f"Exported [bold green]{len(cards)}[/] cards to [bold cyan]{output_file}[/]")
+        finally:
+            if source_handle:
+                source_handle.close()
 
-        # 2. Export Master CSV
-        master_file = self.output_dir / "master_study_cards.csv"
-        with open(master_file, mode='w', encoding='utf-8', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(["Question", "Answer", "Source", "Type"])
-            for source_file, cards in source_groups.items():
-                for card in cards:
-                    front = card.get('front') or card.get('question') or ''
-                    back = card.get('back') or card.get('answer') or ''
-                    writer.writerow([
-                        front,
-                        back,
-                        source_file,
-                        card.get('type', 'concept')
-                    ])
-        
-        conn.close()
-        logger.info(f"Master export complete: [bold cyan]{master_file}[/]")
-        self.generate_report([{"source_file": s} for s in source_groups.keys()])
-
-    def generate_report(self, metadata_list):
-        report_path = self.output_dir / "Coverage_Report.md"
-        with open(report_path, "w") as f:
-            f.write("# Study Engine Coverage Report\n\n")
-            f.write(f"Total Sources Processed: {len(metadata_list)}\n\n")
-            f.write("## Processed Files\n")
-            # Deduplicate filenames
-            unique_files = sorted(list(set(meta.get('source_file', 'Unknown') for meta in metadata_list)))
-            for filename in unique_files:
-                f.write(f"- {filename}\n")
-        logger.info(f"Report generated at [bold cyan]{report_path}[/]")
+        if source_handle:
+            logger.info(f"Exported [bold green]{source_cards}[/] cards to [bold cyan]{source_handle.name}[/]")
+        if collapsed:
+            logger.info(f"Collapsed [bold yellow]{collapsed}[/] near-duplicate cards.")
+        return sources, total_cards
+
+    def assemble_master(self, master_file, sources):
+        """
+        Rebuilds the master CSV by concatenating the per-source CSVs (byte copy,
+        no JSON decoding) and atomically replacing the old file.
+        """
+        tmp_file = master_file.with_suffix(".csv.tmp")
+        header = io.StringIO()
+        csv.writer(header).writerow(CSV_HEADER)
+        with open(tmp_file, "wb") as out:
+            out.write(header.getvalue().encode("utf-8"))
+            for source_file in sources:
+                with open(self.source_csv(source_file), "rb") as part:
+                    part.readline()  # per-source header
+                    shutil.copyfileobj(part, out, 1024 * 1024)
+        os.replace(tmp_file, master_file)
+        logger.info(f"Master export assembled: [bold cyan]{master_file}[/]")
+
+    def generate_report(self):
+        """
+        Writes Coverage_Report.md and coverage_report.json for the exported scope.
+        """
+        with metrics.span("export.report", notebook=self.target_notebook):
+            CoverageReport(self.db_path, notebook=self.target_notebook).write(self.output_dir)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export completed flashcards to CSV.")
+    parser.add_argument("--full", action="store_true", help="Ignore the export watermark and rewrite every file.")
+    args = parser.parse_args()
+
+    exit_on_sigterm()
     exporter = CSVExporter()
-    exporter.export_all()
+    with Profiler("exporter").stage("export"):
+        exporter.export_all(full=args.full)
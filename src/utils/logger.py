@@ -1,11 +1,22 @@
+import atexit
+import fcntl
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import re
+import signal
 import sys
 import threading
-import time
+from datetime import datetime
+from functools import lru_cache
 from rich.logging import RichHandler
 from rich.console import Console
+from rich.errors import StyleSyntaxError
+from rich.style import Style
 from rich.theme import Theme
+from config import settings
 
 # Define a custom theme for our application
 custom_theme = Theme({
@@ -16,50 +27,231 @@ custom_theme = Theme({
     "timestamp": "dim white"
 })
 
-# Force terminal output and write to stderr
-console = Console(theme=custom_theme, force_terminal=True, stderr=True)
+# Write to stderr; Rich detects whether it is a terminal (job logs, pipes and
+# the web UI get plain text, no ANSI escapes or live progress redraws)
+console = Console(theme=custom_theme, stderr=True)
+
+LOG_FORMATS = ("text", "json")
+TEXT_FORMAT = '[%(asctime)s] %(levelname)-8s %(name)-12s | %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Rich markup tags; group 1 holds escaping backslashes
+MARKUP_TAG = re.compile(r"(\\*)\[([a-z#/@][^[]*?)]")
+
+@lru_cache(maxsize=256)
+def _is_style(name):
+    if name in custom_theme.styles:
+        return True
+    try:
+        Style.parse(name)
+        return True
+    except StyleSyntaxError:
+        return False
+
+def _strip_tag(match):
+    backslashes, tag = match.groups()
+    name = tag[1:] if tag.startswith("/") else tag
+    if len(backslashes) % 2 == 0 and (not name or _is_style(name)):
+        return backslashes
+    return match.group(0)
+
+def plain(message):
+    """
+    Strips Rich style markup ([bold cyan]...[/]) from a log message. Bracketed
+    text that is not a style, like a "[chunk_id]" prefix, is kept.
+    """
+    return MARKUP_TAG.sub(_strip_tag, message)
+
+class PlainFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__(TEXT_FORMAT, datefmt=DATE_FORMAT)
+
+    def formatMessage(self, record):
+        record.message = plain(record.message)
+        return super().formatMessage(record)
+
+class JSONFormatter(logging.Formatter):
+    """
+    One JSON object per line: ts, level, logger, pid, message (+ exc).
+    """
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "pid": record.process,
+            "message": plain(record.getMessage()),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Like QueueHandler.prepare, but keeps exc_info for Rich tracebacks and
+        # leaves all formatting to the listener thread (same process, no pickling)
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+class _Router(logging.Handler):
+    """
+    Runs on the listener thread: every record goes to the console and to the
+    log files registered for its logger.
+    """
+    def __init__(self):
+        super().__init__()
+        self.console_handler = None
+        self.file_handlers = {}
+        self.routes = {}
+
+    def emit(self, record):
+        if self.console_handler and record.levelno >= self.console_handler.level:
+            self.console_handler.handle(record)
+        for handler in self.routes.get(record.name, ()):
+            handler.handle(record)
+
+_lock = threading.Lock()
+_queue = queue.SimpleQueue()
+_router = _Router()
+_listener = None
+
+def _console_handler():
+    if console.is_terminal:
+        return RichHandler(
+            console=console,
+            rich_tracebacks=True,
+            show_time=True,
+            show_path=False,
+            enable_link_path=False,
+            markup=True
+        )
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(PlainFormatter())
+    return handler
+
+class _SharedRotatingFileHandler(logging.handlers.WatchedFileHandler):
+    """
+    Size-based rotation that several processes can share (local workers all
+    write worker.log). Each record is written under an exclusive flock on
+    <file>.lock: the holder rotates a full file, and every other process
+    reopens the new file before its next record instead of writing to the
+    renamed backup.
+    """
+    def __init__(self, filename, max_bytes=0, backup_count=0, encoding=None):
+        super().__init__(filename, encoding=encoding)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._lock_file = open(f"{self.baseFilename}.lock", "a")
+
+    def emit(self, record):
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                self.reopenIfNeeded()
+                if self._should_rotate(record):
+                    self._rotate()
+                logging.FileHandler.emit(self, record)
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        except Exception:
+            self.handleError(record)
+
+    def _should_rotate(self, record):
+        if not self.max_bytes or self.backup_count <= 0 or self.stream is None:
+            return False
+        # The size on disk includes what the other processes wrote
+        size = os.fstat(self.stream.fileno()).st_size
+        return size > 0 and size + len(self.format(record)) + 1 > self.max_bytes
+
+    def _rotate(self):
+        self.stream.close()
+        self.stream = None
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.baseFilename}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.baseFilename}.{i + 1}")
+        os.replace(self.baseFilename, f"{self.baseFilename}.1")
+        self.stream = self._open()
+        self._statstream()
+
+    def close(self):
+        super().close()
+        self._lock_file.close()
+
+def _file_handler(log_file):
+    # Ensure directory exists (though config usually handles this)
+    os.makedirs(os.path.dirname(log_file), exist_ok=True)
+    handler = _SharedRotatingFileHandler(
+        log_file,
+        max_bytes=settings.log_max_bytes,
+        backup_count=settings.log_backup_count,
+        encoding="utf-8"
+    )
+    # Clean, predictable format for Web UI readability (or JSON lines)
+    handler.setFormatter(JSONFormatter() if settings.log_format == "json" else PlainFormatter())
+    return handler
+
+def _start_listener():
+    global _listener
+    if _listener is None:
+        _router.console_handler = _console_handler()
+        _listener = logging.handlers.QueueListener(_queue, _router)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+def shutdown_logging():
+    """
+    Drains the log queue and closes the files. Registered with atexit.
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+        for handler in _router.file_handlers.values():
+            handler.close()
+
+def _exit_on_signal(signum, frame):
+    raise SystemExit(128 + signum)
+
+def exit_on_sigterm():
+    """
+    Turns SIGTERM (a job cancelled from the web UI) into SystemExit so finally
+    blocks and atexit handlers (log queue drain, metrics flush) still run.
+    Call from the main thread of an entry point.
+    """
+    signal.signal(signal.SIGTERM, _exit_on_signal)
 
 def setup_logger(name: str = "StudyEngine", level: int = logging.INFO, log_file: str = None):
     """
     Configures a 'best practice' logger for 2026.
-    Uses RichHandler for console and FileHandler for persistent logs.
+    The logger only enqueues records; a background listener renders them to the
+    console (Rich on a TTY, plain text otherwise) and to a size-rotated log file
+    (ZERO_LOG_MAX_BYTES / ZERO_LOG_BACKUP_COUNT, text or ZERO_LOG_FORMAT=json).
     """
-    
+
     logger = logging.getLogger(name)
     logger.setLevel(level)
-    
-    # Avoid duplicate handlers
-    if logger.handlers:
-        logger.handlers.clear()
-            
-    # 1. Console Handler (Rich)
-    rich_handler = RichHandler(
-        console=console,
-        rich_tracebacks=True,
-        show_time=True,
-        show_path=False,
-        enable_link_path=False,
-        markup=True
-    )
-    logger.addHandler(rich_handler)
-    
-    # 2. File Handler (Plain Text - No Rich formatting)
-    if log_file:
-        # Ensure directory exists (though config usually handles this)
-        os.makedirs(os.path.dirname(log_file), exist_ok=True)
-        
-        file_handler = logging.FileHandler(log_file)
-        # Clean, predictable format for Web UI readability
-        file_formatter = logging.Formatter(
-            '[%(asctime)s] %(levelname)-8s %(name)-12s | %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
-        file_handler.setFormatter(file_formatter)
-        logger.addHandler(file_handler)
-    
+
+    with _lock:
+        _start_listener()
+        # Avoid duplicate handlers
+        if logger.handlers:
+            logger.handlers.clear()
+        logger.addHandler(_QueueHandler(_queue))
+
+        routes = []
+        if log_file:
+            key = os.path.abspath(log_file)
+            if key not in _router.file_handlers:
+                _router.file_handlers[key] = _file_handler(key)
+            routes.append(_router.file_handlers[key])
+        _router.routes[name] = tuple(routes)
+
     # Silence overly verbose libraries
     logging.getLogger("httpx").setLevel(logging.WARNING)
     logging.getLogger("urllib3").setLevel(logging.WARNING)
-    
-    return logger
 
+    return logger
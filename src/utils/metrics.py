@@ -0,0 +1,143 @@
+# src/utils/metrics.py
+
+import time
+import atexit
+import threading
+from contextlib import nullcontext
+from config import settings
+from db.init_db import DURATION_BUCKETS
+
+# Returned by span() when instrumentation is off: entering and leaving it is
+# the whole cost
+_NOOP = nullcontext()
+
+class _Span:
+    __slots__ = ("recorder", "row", "start")
+
+    def __init__(self, recorder, row):
+        self.recorder = recorder
+        self.row = row
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        self.recorder.record(*self.row, duration, exc_type is None)
+        return False
+
+class SpanRecorder:
+    def __init__(self, db_path=None, enabled=None, flush_every=256):
+        """
+        Buffers stage timings in memory and writes them to the stage_timings
+        table in batches (on flush(), every `flush_every` spans and at exit).
+        enabled: Defaults to settings.metrics_enabled.
+        """
+        self.db_path = db_path
+        self.enabled = settings.metrics_enabled if enabled is None else enabled
+        self.flush_every = flush_every
+        self._rows = []
+        self._lock = threading.Lock()
+        self._db = None
+
+    def span(self, stage, chunk_id=None, notebook=None, filename=None):
+        """
+        Context manager timing one stage. Failed stages (exceptions) are recorded with ok=0.
+        """
+        if not self.enabled:
+            return _NOOP
+        return _Span(self, (stage, notebook, filename, chunk_id))
+
+    def record(self, stage, notebook, filename, chunk_id, duration, ok):
+        with self._lock:
+            self._rows.append((stage, notebook, filename, chunk_id, duration, int(ok)))
+            full = len(self._rows) >= self.flush_every
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            rows, self._rows = self._rows, []
+        if not rows:
+            return
+        if self._db is None:
+            # Imported here: the DB layer itself is instrumented by callers
+            from db.db_manager import DBManager
+            self._db = DBManager(self.db_path)
+        self._db.record_stage_timings(rows)
+
+recorder = SpanRecorder()
+atexit.register(recorder.flush)
+
+def span(stage, chunk_id=None, notebook=None, filename=None):
+    return recorder.span(stage, chunk_id=chunk_id, notebook=notebook, filename=filename)
+
+def flush():
+    recorder.flush()
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def render_prometheus(histograms, queue_gauges, job_counts=None, generation_totals=None):
+    """
+    Renders the Prometheus text exposition format (version 0.0.4).
+    histograms: {stage: {bucket label: (count, sum_s, errors)}} (DBManager.get_stage_histograms)
+    queue_gauges: [(notebook, status, chunks)] (DBManager.get_queue_gauges)
+    job_counts: {job status: count} of the web server's job manager.
+    generation_totals: [{notebook, model, kind, calls, ...}] (DBManager.get_generation_totals)
+    """
+    lines = [
+        "# HELP zeroloss_stage_duration_seconds Duration of pipeline stages.",
+        "# TYPE zeroloss_stage_duration_seconds histogram",
+    ]
+    errors = []
+    for stage, buckets in histograms.items():
+        stage_label = _label(stage)
+        cumulative = 0
+        for bound in [f"{b:g}" for b in DURATION_BUCKETS] + ["+Inf"]:
+            cumulative += buckets.get(bound, (0, 0.0, 0))[0]
+            lines.append(f'zeroloss_stage_duration_seconds_bucket{{stage="{stage_label}",le="{bound}"}} {cumulative}')
+        total_sum = sum(v[1] for v in buckets.values())
+        lines.append(f'zeroloss_stage_duration_seconds_sum{{stage="{stage_label}"}} {total_sum:.6f}')
+        lines.append(f'zeroloss_stage_duration_seconds_count{{stage="{stage_label}"}} {cumulative}')
+        errors.append((stage_label, sum(v[2] for v in buckets.values())))
+
+    lines += [
+        "# HELP zeroloss_stage_errors_total Pipeline stages that raised.",
+        "# TYPE zeroloss_stage_errors_total counter",
+    ]
+    lines += [f'zeroloss_stage_errors_total{{stage="{stage}"}} {count}' for stage, count in errors]
+
+    lines += [
+        "# HELP zeroloss_queue_chunks Chunks in the processing queue by status.",
+        "# TYPE zeroloss_queue_chunks gauge",
+    ]
+    lines += [
+        f'zeroloss_queue_chunks{{notebook="{_label(notebook or "")}",status="{_label(status)}"}} {count}'
+        for notebook, status, count in queue_gauges
+    ]
+
+    if generation_totals:
+        counters = [
+            ("calls", "zeroloss_llm_calls_total", "LLM generation calls."),
+            ("prompt_tokens", "zeroloss_llm_prompt_tokens_total", "Prompt tokens sent to the LLM."),
+            ("completion_tokens", "zeroloss_llm_completion_tokens_total", "Tokens generated by the LLM."),
+            ("wall_s", "zeroloss_llm_seconds_total", "Wall time spent in LLM generation."),
+            ("truncated", "zeroloss_llm_truncated_total", "LLM calls cut off at max_tokens."),
+        ]
+        for key, name, help_text in counters:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for row in generation_totals:
+                labels = f'notebook="{_label(row["notebook"])}",model="{_label(row["model"])}",kind="{_label(row["kind"])}"'
+                value = f"{row[key]:.6f}" if key == "wall_s" else row[key]
+                lines.append(f"{name}{{{labels}}} {value}")
+
+    if job_counts is not None:
+        lines += [
+            "# HELP zeroloss_jobs Pipeline jobs known to the web server by status.",
+            "# TYPE zeroloss_jobs gauge",
+        ]
+        lines += [f'zeroloss_jobs{{status="{_label(status)}"}} {count}' for status, count in sorted(job_counts.items())]
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,140 @@
+# src/utils/profiling.py
+
+import io
+import os
+import pstats
+import cProfile
+import logging
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ("off", "cpu", "memory", "all")
+
+# Lines kept in the human-readable summaries written next to the raw dumps
+SUMMARY_LINES = 40
+
+class Profiler:
+    def __init__(self, entry, mode=None, every=None, output_dir=None, unit="units"):
+        """
+        Opt-in cProfile / tracemalloc capture for one entry point (ingestor,
+        worker, exporter). Output goes to the top level of logs/ so the log API
+        lists and serves it:
+          profile-<entry>-<label>-<time>-<pid>.prof          (pstats; snakeviz, pstats.Stats)
+          profile-<entry>-<label>-<time>-<pid>.prof.txt      (top functions by cumulative time)
+          profile-<entry>-<label>-<time>-<pid>.tracemalloc   (tracemalloc.Snapshot.load)
+          profile-<entry>-<label>-<time>-<pid>.tracemalloc.txt (top allocation sites)
+        where label is the stage name or the window's unit range (e.g. chunks-00000-00049).
+        mode: 'off', 'cpu', 'memory' or 'all' (default: settings.profile).
+        every: Units (chunks, documents) per window() dump (default: settings.profile_every;
+               0 = one dump for the whole run).
+        """
+        self.entry = entry
+        self.mode = (mode or settings.profile or "off").lower()
+        if self.mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {self.mode} (expected one of {PROFILE_MODES})")
+        self.every = settings.profile_every if every is None else every
+        self.output_dir = output_dir or settings.logs_dir
+        self.unit = unit
+        self.cpu = self.mode in ("cpu", "all")
+        self.memory = self.mode in ("memory", "all")
+        self._profile = None
+        self._window_count = 0
+        self._window_start = 0
+
+    @property
+    def enabled(self):
+        return self.mode != "off"
+
+    def _start(self):
+        if self.cpu:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+
+    def _pause(self):
+        if self._profile:
+            self._profile.disable()
+
+    def _resume(self):
+        if self._profile:
+            self._profile.enable()
+
+    def _dump(self, label):
+        stem = self.output_dir / f"profile-{self.entry}-{label}-{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}"
+        if self._profile:
+            self._profile.disable()
+            self._profile.dump_stats(f"{stem}.prof")
+            summary = io.StringIO()
+            pstats.Stats(self._profile, stream=summary).sort_stats("cumulative").print_stats(SUMMARY_LINES)
+            with open(f"{stem}.prof.txt", "w", encoding="utf-8") as f:
+                f.write(summary.getvalue())
+            self._profile = None
+        if self.memory and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            snapshot.dump(f"{stem}.tracemalloc")
+            current, peak = tracemalloc.get_traced_memory()
+            with open(f"{stem}.tracemalloc.txt", "w", encoding="utf-8") as f:
+                f.write(f"Traced memory: current {current / 2**20:.1f} MiB, peak {peak / 2**20:.1f} MiB\n\n")
+                for stat in snapshot.statistics("lineno")[:SUMMARY_LINES]:
+                    f.write(f"{stat}\n")
+            tracemalloc.reset_peak()
+        logger.info(f"Profile written: {stem.name}")
+
+    def stage(self, label):
+        """
+        Profiles the enclosed block as one dump named after `label`.
+        """
+        if not self.enabled:
+            return nullcontext()
+        return self._stage(label)
+
+    @contextmanager
+    def _stage(self, label):
+        self._start()
+        try:
+            yield
+        finally:
+            self._dump(label)
+
+    def window(self):
+        """
+        Profiles one unit of work (a chunk, a document). Consecutive units
+        accumulate into one dump every `every` units; with every=0 everything
+        accumulates until finish().
+        """
+        if not self.enabled:
+            return nullcontext()
+        return self._window()
+
+    @contextmanager
+    def _window(self):
+        if self._window_count == 0:
+            self._start()
+        else:
+            self._resume()
+        try:
+            yield
+        finally:
+            self._pause()
+            self._window_count += 1
+            if self.every and self._window_count >= self.every:
+                self._flush_window()
+
+    def _flush_window(self):
+        start = self._window_start
+        end = start + self._window_count - 1
+        self._dump(f"{self.unit}-{start:05d}-{end:05d}")
+        self._window_start = end + 1
+        self._window_count = 0
+
+    def finish(self):
+        """
+        Writes the pending partial window, if any.
+        """
+        if self.enabled and self._window_count:
+            self._flush_window()
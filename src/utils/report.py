@@ -0,0 +1,246 @@
+# src/utils/report.py
+
+import os
+import json
+import argparse
+from pathlib import Path
+from datetime import datetime
+from db.db_manager import DBManager
+from utils.logger import setup_logger
+from config import settings
+
+logger = setup_logger("CoverageReport")
+
+STATUSES = ["PENDING", "PROCESSING", "COMPLETED", "FAILED", "DUPLICATE"]
+
+# Upper bounds of the coverage score histogram buckets
+SCORE_BUCKETS = [0.5, 0.7, 0.8, 0.9, 0.95]
+
+FAILURE_REASON_SQL = "COALESCE(SUBSTR(error_log, 1, 200), '(no error recorded)')"
+
+def _bucket_sql():
+    cases = " ".join(f"WHEN verification_score < {b} THEN '<{b:.2f}'" for b in SCORE_BUCKETS)
+    return f"CASE {cases} ELSE '>={SCORE_BUCKETS[-1]:.2f}' END"
+
+def _bucket_labels():
+    return [f"<{b:.2f}" for b in SCORE_BUCKETS] + [f">={SCORE_BUCKETS[-1]:.2f}"]
+
+class CoverageReport:
+    def __init__(self, db_path=None, notebook=None, low_coverage_limit=10, failure_limit=10, duplicate_limit=50):
+        """
+        Coverage metrics computed with aggregate SQL over processing_queue.
+        notebook: Restrict the report to one notebook (None = all notebooks).
+        """
+        self.db = DBManager(db_path if db_path else settings.db_path)
+        self.notebook = notebook
+        self.low_coverage_limit = low_coverage_limit
+        self.failure_limit = failure_limit
+        self.duplicate_limit = duplicate_limit
+
+    def _query(self, conn, sql, params=()):
+        where = "WHERE notebook = ?" if self.notebook else "WHERE 1 = 1"
+        scope = (self.notebook,) if self.notebook else ()
+        return conn.execute(sql.format(where=where), scope + tuple(params)).fetchall()
+
+    def collect(self):
+        conn = self.db._get_connection()
+        try:
+            by_document = self._query(conn, """
+                SELECT notebook, filename, status, COUNT(*), SUM(card_count),
+                       SUM(verification_score), COUNT(verification_score),
+                       MIN(verification_score), MAX(verification_score)
+                FROM processing_queue {where}
+                GROUP BY notebook, filename, status
+            """)
+            distribution = self._query(conn, f"""
+                SELECT notebook, {_bucket_sql()} AS bucket, COUNT(*)
+                FROM processing_queue {{where}} AND status = 'COMPLETED' AND verification_score IS NOT NULL
+                GROUP BY notebook, bucket
+            """)
+            # The most frequent reasons per notebook and per document, not overall
+            failures = self._query(conn, f"""
+                SELECT notebook, reason, chunks FROM (
+                    SELECT notebook, {FAILURE_REASON_SQL} AS reason, COUNT(*) AS chunks,
+                           ROW_NUMBER() OVER (PARTITION BY notebook ORDER BY COUNT(*) DESC) AS rank
+                    FROM processing_queue {{where}} AND status = 'FAILED'
+                    GROUP BY notebook, reason
+                ) WHERE rank <= ? ORDER BY notebook, rank
+            """, (self.failure_limit,))
+            document_failures = self._query(conn, f"""
+                SELECT notebook, filename, reason, chunks FROM (
+                    SELECT notebook, filename, {FAILURE_REASON_SQL} AS reason, COUNT(*) AS chunks,
+                           ROW_NUMBER() OVER (PARTITION BY notebook, filename ORDER BY COUNT(*) DESC) AS rank
+                    FROM processing_queue {{where}} AND status = 'FAILED'
+                    GROUP BY notebook, filename, reason
+                ) WHERE rank <= ? ORDER BY notebook, filename, rank
+            """, (self.failure_limit,))
+            lowest = self._query(conn, """
+                SELECT notebook, filename, chunk_id, verification_score, card_count
+                FROM processing_queue {where} AND status = 'COMPLETED' AND verification_score IS NOT NULL
+                ORDER BY verification_score ASC LIMIT ?
+            """, (self.low_coverage_limit,))
+            # Chunks skipped at ingest as near-duplicates, with the canonical chunk whose cards they reuse
+            reused = self._query(conn, """
+                SELECT d.notebook, d.filename, COALESCE(SUM(c.card_count), 0)
+                FROM (SELECT * FROM processing_queue {where} AND status = 'DUPLICATE') AS d
+                LEFT JOIN processing_queue AS c ON c.chunk_id = d.canonical_chunk_id
+                GROUP BY d.notebook, d.filename
+            """)
+            duplicates = self._query(conn, """
+                SELECT d.notebook, d.filename, d.chunk_id, d.duplicate_similarity,
+                       c.filename, c.chunk_id, c.status, c.card_count
+                FROM (SELECT * FROM processing_queue {where} AND status = 'DUPLICATE') AS d
+                LEFT JOIN processing_queue AS c ON c.chunk_id = d.canonical_chunk_id
+                ORDER BY d.notebook, d.filename, d.created_at LIMIT ?
+            """, (self.duplicate_limit,))
+        finally:
+            conn.close()
+
+        notebooks = {}
+        for notebook, filename, status, chunks, cards, score_sum, score_n, score_min, score_max in by_document:
+            nb = notebooks.setdefault(notebook, self._empty_summary())
+            nb.setdefault("documents", {})
+            doc = nb["documents"].setdefault(filename, self._empty_summary())
+            for summary in (nb, doc):
+                self._accumulate(summary, status, chunks, cards, score_sum, score_n, score_min, score_max)
+
+        for notebook, filename, cards in reused:
+            notebooks[notebook]["reused_cards"] += cards
+            notebooks[notebook]["documents"][filename]["reused_cards"] += cards
+        for notebook, bucket, count in distribution:
+            notebooks[notebook]["score_distribution"][bucket] = count
+        for notebook, reason, count in failures:
+            notebooks[notebook]["failure_reasons"].append({"reason": reason, "chunks": count})
+        for notebook, filename, reason, count in document_failures:
+            notebooks[notebook]["documents"][filename]["failure_reasons"].append({"reason": reason, "chunks": count})
+
+        for nb in notebooks.values():
+            self._finalize(nb)
+            for doc in nb["documents"].values():
+                self._finalize(doc)
+                del doc["score_distribution"]
+
+        return {
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+            "notebook": self.notebook,
+            "notebooks": notebooks,
+            "lowest_coverage_chunks": [
+                {"notebook": nb, "filename": fn, "chunk_id": cid, "coverage": score, "cards": cards}
+                for nb, fn, cid, score, cards in lowest
+            ],
+            "near_duplicate_chunks": [
+                {"notebook": nb, "filename": fn, "chunk_id": cid, "similarity": similarity,
+                 "canonical_filename": canonical_fn, "canonical_chunk_id": canonical_id,
+                 "canonical_status": canonical_status, "reused_cards": cards}
+                for nb, fn, cid, similarity, canonical_fn, canonical_id, canonical_status, cards in duplicates
+            ],
+        }
+
+    @staticmethod
+    def _empty_summary():
+        return {
+            "chunks": 0, "status": {s: 0 for s in STATUSES}, "cards": 0, "reused_cards": 0,
+            "_score_sum": 0.0, "_score_n": 0, "coverage_min": None, "coverage_max": None,
+            "score_distribution": {label: 0 for label in _bucket_labels()},
+            "failure_reasons": [],
+        }
+
+    @staticmethod
+    def _accumulate(summary, status, chunks, cards, score_sum, score_n, score_min, score_max):
+        summary["chunks"] += chunks
+        summary["status"][status] = summary["status"].get(status, 0) + chunks
+        if status == "COMPLETED":
+            summary["cards"] += cards or 0
+            summary["_score_sum"] += score_sum or 0.0
+            summary["_score_n"] += score_n
+            if score_min is not None:
+                summary["coverage_min"] = score_min if summary["coverage_min"] is None else min(summary["coverage_min"], score_min)
+                summary["coverage_max"] = score_max if summary["coverage_max"] is None else max(summary["coverage_max"], score_max)
+
+    @staticmethod
+    def _finalize(summary):
+        completed = summary["status"].get("COMPLETED", 0)
+        summary["coverage_mean"] = summary["_score_sum"] / summary["_score_n"] if summary["_score_n"] else None
+        summary["cards_per_chunk"] = summary["cards"] / completed if completed else None
+        del summary["_score_sum"], summary["_score_n"]
+
+    def to_markdown(self, data):
+        def fmt(value, digits=3):
+            return "-" if value is None else f"{value:.{digits}f}"
+
+        statuses = sorted({s for nb in data["notebooks"].values() for s in nb["status"]},
+                          key=lambda s: (STATUSES.index(s) if s in STATUSES else len(STATUSES), s))
+        lines = ["# Study Engine Coverage Report", "", f"Generated: {data['generated_at']}", ""]
+
+        for notebook, nb in sorted(data["notebooks"].items()):
+            lines += [f"## Notebook: {notebook}", ""]
+            lines += [
+                f"- Documents: {len(nb['documents'])}",
+                f"- Chunks: {nb['chunks']} (" + ", ".join(f"{s.lower()}: {nb['status'].get(s, 0)}" for s in statuses) + ")",
+                f"- Cards: {nb['cards']} ({fmt(nb['cards_per_chunk'], 1)} per completed chunk)",
+                f"- Near-duplicate chunks skipped: {nb['status'].get('DUPLICATE', 0)} (reusing {nb['reused_cards']} cards)",
+                f"- Coverage: mean {fmt(nb['coverage_mean'])}, min {fmt(nb['coverage_min'])}, max {fmt(nb['coverage_max'])}",
+                "",
+                "### Documents",
+                "",
+                "| Document | Chunks | " + " | ".join(s.title() for s in statuses) + " | Cards | Cards/Chunk | Mean Coverage | Min Coverage |",
+                "| :--- | ---: | " + " | ".join("---:" for _ in statuses) + " | ---: | ---: | ---: | ---: |",
+            ]
+            for filename, doc in sorted(nb["documents"].items()):
+                lines.append(
+                    f"| {filename} | {doc['chunks']} | " + " | ".join(str(doc['status'].get(s, 0)) for s in statuses) +
+                    f" | {doc['cards']} | {fmt(doc['cards_per_chunk'], 1)} | {fmt(doc['coverage_mean'])} | {fmt(doc['coverage_min'])} |"
+                )
+            lines += ["", "### Coverage Score Distribution", "", "| Score | Chunks |", "| :--- | ---: |"]
+            lines += [f"| {bucket} | {count} |" for bucket, count in nb["score_distribution"].items()]
+            if nb["failure_reasons"]:
+                lines += ["", "### Failure Reasons", "", "| Reason | Chunks |", "| :--- | ---: |"]
+                lines += [f"| {f['reason'].replace('|', '/').replace(chr(10), ' ')} | {f['chunks']} |" for f in nb["failure_reasons"]]
+                lines += ["", "| Document | Reason | Chunks |", "| :--- | :--- | ---: |"]
+                lines += [f"| {filename} | {f['reason'].replace('|', '/').replace(chr(10), ' ')} | {f['chunks']} |"
+                          for filename, doc in sorted(nb["documents"].items()) for f in doc["failure_reasons"]]
+            lines.append("")
+
+        if data["lowest_coverage_chunks"]:
+            lines += ["## Lowest Coverage Chunks", "", "| Notebook | Document | Chunk | Coverage | Cards |", "| :--- | :--- | :--- | ---: | ---: |"]
+            lines += [
+                f"| {c['notebook']} | {c['filename']} | `{c['chunk_id']}` | {fmt(c['coverage'])} | {c['cards'] if c['cards'] is not None else '-'} |"
+                for c in data["lowest_coverage_chunks"]
+            ]
+            lines.append("")
+        if data["near_duplicate_chunks"]:
+            lines += ["## Skipped Near-Duplicate Chunks", "",
+                      "| Notebook | Document | Chunk | Similarity | Canonical Document | Canonical Chunk | Canonical Status | Cards |",
+                      "| :--- | :--- | :--- | ---: | :--- | :--- | :--- | ---: |"]
+            lines += [
+                f"| {c['notebook']} | {c['filename']} | `{c['chunk_id']}` | {fmt(c['similarity'], 2)} | "
+                f"{c['canonical_filename'] or '-'} | `{c['canonical_chunk_id']}` | {(c['canonical_status'] or 'missing').lower()} | "
+                f"{c['reused_cards'] if c['reused_cards'] is not None else '-'} |"
+                for c in data["near_duplicate_chunks"]
+            ]
+            lines.append("")
+        return "\n".join(lines)
+
+    def write(self, output_dir):
+        """
+        Writes Coverage_Report.md and coverage_report.json into `output_dir`.
+        """
+        output_dir = Path(output_dir)
+        data = self.collect()
+        md_path = output_dir / "Coverage_Report.md"
+        json_path = output_dir / "coverage_report.json"
+        with open(md_path, "w", encoding="utf-8") as f:
+            f.write(self.to_markdown(data))
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        logger.info(f"Report generated at [bold cyan]{md_path}[/]")
+        return md_path, json_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print the coverage report for the queue.")
+    parser.add_argument("--json", action="store_true", help="Print JSON instead of Markdown.")
+    args = parser.parse_args()
+
+    report = CoverageReport(notebook=os.environ.get("TARGET_NOTEBOOK"))
+    data = report.collect()
+    print(json.dumps(data, indent=2) if args.json else report.to_markdown(data))
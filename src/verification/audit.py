@@ -2,19 +2,29 @@
 
 import numpy as np
 import logging
-from sentence_transformers import SentenceTransformer, util
+from sentence_transformers import util
 import re
+from verification.cpu_backend import load_embedder, load_cross_encoder
 
 logger = logging.getLogger(__name__)
 
 class CoverageAuditor:
-    def __init__(self, model_name="all-MiniLM-L6-v2"):
+    def __init__(self, model_name="all-MiniLM-L6-v2", backend="default", num_threads=None, model=None):
         """
         Initializes the embedding model for coverage audit.
         'all-MiniLM-L6-v2' is fast and efficient for local use.
+        backend: 'default' (sentence-transformers device selection) or
+                 'cpu-int8' (int8 dynamic quantization on host cores).
+        num_threads: CPU thread count for the 'cpu-int8' backend.
+        model: An already loaded encoder with the SentenceTransformer API (skips loading).
         """
-        logger.info(f"Loading embedding model: {model_name}")
-        self.model = SentenceTransformer(model_name)
+        if model is None:
+            logger.info(f"Loading embedding model: {model_name} (backend: {backend})")
+            model = load_embedder(model_name, backend=backend, num_threads=num_threads)
+        self.model = model
+        # Normalized answer embeddings of the last audit_coverage call (rows align
+        # with its flashcards), kept so the worker can persist them without re-encoding
+        self.last_card_embeddings = None
 
     def split_sentences(self, text):
         """
@@ -29,6 +39,7 @@ class CoverageAuditor:
         Implements the 'Reverse RAG' algorithm from Section 6.1.
         Returns a list of sentences that are NOT covered.
         """
+        self.last_card_embeddings = None
         source_sentences = self.split_sentences(source_text)
         if not source_sentences:
             return [], 1.0
@@ -41,7 +52,8 @@ class CoverageAuditor:
         if not card_answers:
             return source_sentences, 0.0
             
-        card_embeddings = self.model.encode(card_answers, convert_to_tensor=True)
+        card_embeddings = self.model.encode(card_answers, convert_to_tensor=True, normalize_embeddings=True)
+        self.last_card_embeddings = card_embeddings.float().cpu().numpy()
 
         # Compute cosine similarity matrix
         # (num_source_sentences, num_cards)
@@ -61,14 +73,28 @@ class CoverageAuditor:
         coverage_score = np.mean(scores)
         return uncovered, coverage_score
 
+    def embed_answers(self, flashcards):
+        """
+        Returns normalized float32 embeddings of the card answers, shape (len(flashcards), dim).
+        """
+        return self.model.encode(
+            [card.get('back', '') for card in flashcards],
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        ).astype(np.float32)
+
 class FactChecker:
-    def __init__(self, model_name="cross-encoder/ms-marco-MiniLM-L-6-v2"):
+    def __init__(self, model_name="cross-encoder/ms-marco-MiniLM-L-6-v2", batch_size=32, backend="default", num_threads=None, model=None):
         """
         Initializes the Cross-Encoder for factual consistency checking.
+        batch_size: Number of (quote, card) pairs scored per forward pass.
+        backend / num_threads / model: See CoverageAuditor.
         """
-        from sentence_transformers import CrossEncoder
-        logger.info(f"Loading Cross-Encoder: {model_name}")
-        self.model = CrossEncoder(model_name)
+        if model is None:
+            logger.info(f"Loading Cross-Encoder: {model_name} (backend: {backend})")
+            model = load_cross_encoder(model_name, backend=backend, num_threads=num_threads)
+        self.model = model
+        self.batch_size = batch_size
 
     def verify_consistency(self, flashcard):
         """
@@ -84,3 +110,40 @@ class FactChecker:
         # Cross-encoders take pairs: (Context/Quote, Hypothesis/Answer)
         score = self.model.predict([quote, f"{question} {answer}"])
         return score
+
+    def verify_batch(self, flashcards):
+        """
+        Scores every flashcard against its source_quote in one vectorized call.
+        Returns a list of scores aligned with `flashcards`; cards without a
+        quote get the same 0.5 'unknown' score as verify_consistency.
+        """
+        scores = [0.5] * len(flashcards)
+        pairs = []
+        indices = []
+        for i, card in enumerate(flashcards):
+            quote = card.get('source_quote', '')
+            if not quote:
+                continue
+            pairs.append([quote, f"{card.get('front', '')} {card.get('back', '')}"])
+            indices.append(i)
+
+        if pairs:
+            predictions = self.model.predict(pairs, batch_size=self.batch_size)
+            for i, score in zip(indices, predictions):
+                scores[i] = float(score)
+        return scores
+
+    def verify_chunks(self, card_lists):
+        """
+        Scores the cards of several chunks in a single batch.
+        Returns one list of scores per input list of cards.
+        """
+        flat = [card for cards in card_lists for card in cards]
+        flat_scores = self.verify_batch(flat)
+
+        results = []
+        offset = 0
+        for cards in card_lists:
+            results.append(flat_scores[offset:offset + len(cards)])
+            offset += len(cards)
+        return results
@@ -0,0 +1,103 @@
+# src/verification/cpu_backend.py
+
+import logging
+import torch
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("default", "cpu-int8")
+
+def configure_cpu_threads(num_threads=None):
+    """
+    Caps the intra-op thread pool used by torch on CPU.
+    Leaves the torch default in place when num_threads is None or 0.
+    """
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    logger.info(f"CPU verification running on {torch.get_num_threads()} threads")
+
+def quantize_int8(module):
+    """
+    Applies int8 dynamic quantization to every nn.Linear in place.
+    Weights are stored as int8 and activations are quantized on the fly, which
+    roughly halves latency of MiniLM-sized transformers on CPU.
+    """
+    return torch.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+def load_embedder(model_name, backend="default", num_threads=None):
+    from sentence_transformers import SentenceTransformer
+    if backend == "cpu-int8":
+        configure_cpu_threads(num_threads)
+        model = SentenceTransformer(model_name, device="cpu")
+        quantize_int8(model)
+        return model
+    if backend != "default":
+        raise ValueError(f"Unknown verification backend: {backend} (expected one of {BACKENDS})")
+    return SentenceTransformer(model_name)
+
+def load_cross_encoder(model_name, backend="default", num_threads=None):
+    from sentence_transformers import CrossEncoder
+    if backend == "cpu-int8":
+        configure_cpu_threads(num_threads)
+        model = CrossEncoder(model_name, device="cpu")
+        quantize_int8(model.model)
+        return model
+    if backend != "default":
+        raise ValueError(f"Unknown verification backend: {backend} (expected one of {BACKENDS})")
+    return CrossEncoder(model_name)
+
+if __name__ == "__main__":
+    # Accuracy parity check of the int8 CPU backend against the default backend.
+    # Exits 1 when the backends disagree at the worker's thresholds, 0 when
+    # they agree or the model weights are not available.
+    import sys
+    import numpy as np
+    from verification.audit import CoverageAuditor, FactChecker
+
+    # Decision thresholds of src/worker.py: repair below this coverage score
+    # (when sentences are uncovered), keep cards whose fact score is above this
+    REPAIR_BELOW = 0.90
+    FACT_KEEP_ABOVE = 0.4
+    # Largest accepted difference of the coverage score
+    COVERAGE_TOLERANCE = 0.02
+
+    source = (
+        "The mitochondria is the powerhouse of the cell. "
+        "It produces ATP through oxidative phosphorylation. "
+        "Ribosomes synthesize proteins from messenger RNA. "
+        "The Krebs cycle takes place in the mitochondrial matrix."
+    )
+    cards = [
+        {"front": "What is the powerhouse of the cell?", "back": "The mitochondria is the powerhouse of the cell.",
+         "source_quote": "The mitochondria is the powerhouse of the cell."},
+        {"front": "How is ATP produced?", "back": "Through oxidative phosphorylation.",
+         "source_quote": "It produces ATP through oxidative phosphorylation."},
+        {"front": "What do ribosomes do?", "back": "They digest lipids.",
+         "source_quote": "Ribosomes synthesize proteins from messenger RNA."},
+    ]
+
+    results = {}
+    for backend in BACKENDS:
+        try:
+            auditor = CoverageAuditor(backend=backend)
+            checker = FactChecker(backend=backend)
+        except OSError as e:
+            print(f"Skipped: model weights unavailable ({e})")
+            sys.exit(0)
+        uncovered, coverage = auditor.audit_coverage(source, cards)
+        results[backend] = (set(uncovered), float(coverage), np.array(checker.verify_batch(cards)))
+
+    ref, quant = results["default"], results["cpu-int8"]
+    checks = {
+        f"coverage score within {COVERAGE_TOLERANCE} ({ref[1]:.4f} vs {quant[1]:.4f})":
+            abs(ref[1] - quant[1]) <= COVERAGE_TOLERANCE,
+        "uncovered sentences identical": ref[0] == quant[0],
+        f"repair decision identical (score < {REPAIR_BELOW})":
+            bool(ref[0] and ref[1] < REPAIR_BELOW) == bool(quant[0] and quant[1] < REPAIR_BELOW),
+        f"fact-check keep/drop identical (score > {FACT_KEEP_ABOVE}, max abs diff {np.abs(ref[2] - quant[2]).max():.4f})":
+            np.array_equal(ref[2] > FACT_KEEP_ABOVE, quant[2] > FACT_KEEP_ABOVE),
+    }
+    for name, ok in checks.items():
+        print(f"{'PASS' if ok else 'FAIL'}: {name}")
+    if not all(checks.values()):
+        sys.exit(1)
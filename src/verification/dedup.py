@@ -0,0 +1,119 @@
+# src/verification/dedup.py
+
+import logging
+import numpy as np
+from verification.embedding_store import EmbeddingStore
+
+logger = logging.getLogger(__name__)
+
+class DuplicateIndex:
+    def __init__(self, notebook, model, threshold=0.95, index_dir=None):
+        """
+        Incremental near-duplicate index over the committed flashcards of a notebook.
+        model: A loaded SentenceTransformer (shared with the CoverageAuditor).
+        threshold: Cosine similarity at or above which a card counts as a duplicate.
+        """
+        self.model = model
+        self.threshold = threshold
+        self.store = EmbeddingStore(
+            notebook, "cards",
+            dim=model.get_sentence_embedding_dimension(),
+            index_dir=index_dir
+        )
+        # A reprocessed chunk appends new rows under the same ids; each id maps to its latest row
+        self.positions = {}
+        self._mapped = 0
+        self._refresh()
+        logger.info(f"Duplicate index for '{notebook}' holds {len(self.positions)} cards")
+
+    @staticmethod
+    def card_text(card):
+        return f"{card.get('front', '')}\n{card.get('back', '')}"
+
+    def flag_duplicates(self, chunk_id, flashcards):
+        """
+        Marks near-duplicate cards in place with `duplicate_of` (the id of the
+        earlier card) and returns the (ids, vectors) of the unique cards, to be
+        passed to `add` once the chunk is committed.
+        Card ids are '<chunk_id>:<position in flashcards>'.
+        """
+        if not flashcards:
+            return [], np.empty((0, self.store.dim), dtype=np.float32)
+
+        vectors = self.model.encode(
+            [self.card_text(card) for card in flashcards],
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        ).astype(np.float32)
+        ids = [f"{chunk_id}:{i}" for i in range(len(flashcards))]
+
+        # Against everything committed earlier
+        nearest = self._nearest(vectors, chunk_id)
+        # Against earlier cards of the same chunk
+        local = vectors @ vectors.T
+
+        keep = []
+        for i, card in enumerate(flashcards):
+            card.pop('duplicate_of', None)
+            if nearest[i]:
+                card['duplicate_of'] = nearest[i]
+                continue
+            earlier = [j for j in keep if local[i, j] >= self.threshold]
+            if earlier:
+                card['duplicate_of'] = ids[earlier[0]]
+                continue
+            keep.append(i)
+
+        flagged = len(flashcards) - len(keep)
+        if flagged:
+            logger.info(f"[{chunk_id}] Flagged {flagged} near-duplicate cards.")
+        return [ids[i] for i in keep], vectors[keep]
+
+    def _refresh(self):
+        """
+        Maps the rows appended since the last call, by this or another worker
+        sharing the notebook's index.
+        """
+        n = len(self.store)
+        if n < self._mapped:
+            self.positions, self._mapped = {}, 0
+        store_ids = self.store.ids()
+        for i in range(self._mapped, n):
+            self.positions[store_ids[i]] = i
+        self._mapped = n
+
+    def _nearest(self, vectors, chunk_id):
+        """
+        Returns, per vector, the id of a committed card at or above the
+        threshold, or None. Superseded rows and the chunk's own earlier cards
+        (it is being reprocessed) are skipped.
+        """
+        self._refresh()
+        n = self._mapped
+        store_ids = self.store.ids()
+        own = f"{chunk_id}:"
+        nearest = [None] * len(vectors)
+        pending = list(range(len(vectors)))
+        fetch = 4
+        while pending and n:
+            scores, indices = self.store.search(vectors[pending], k=fetch)
+            unresolved = []
+            for q, row_scores, row_indices in zip(pending, scores, indices):
+                for score, j in zip(row_scores, row_indices):
+                    if score < self.threshold:
+                        break
+                    row_id = store_ids[j] if j < n else None
+                    if row_id and self.positions.get(row_id) == j and not row_id.startswith(own):
+                        nearest[q] = row_id
+                        break
+                else:
+                    unresolved.append(q)
+            if fetch >= n:
+                break
+            pending = unresolved
+            fetch *= 4
+        return nearest
+
+    def add(self, ids, vectors):
+        self.store.append(ids, vectors)
+        self._refresh()
@@ -0,0 +1,149 @@
+# src/verification/embedding_store.py
+
+import os
+import json
+import fcntl
+import logging
+import numpy as np
+from pathlib import Path
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingStore:
+    def __init__(self, notebook, name, dim=None, index_dir=None, read_only=False):
+        """
+        Append-only matrix of L2-normalized vectors persisted per notebook.
+        Vectors are stored as raw float16 rows in <name>.f16 (memory-mapped on read),
+        row ids one per line in <name>.ids and the dimension in <name>.json.
+        Several processes may append to one store: appends are serialized with
+        an exclusive flock on <name>.lock, vectors are written before their ids,
+        and a row counts only once its id line is complete, so row i always
+        belongs to id line i. Readers take no lock.
+        dim: Vector dimension. Required when the store does not exist yet.
+        read_only: Never create anything on disk; a missing store reads as empty.
+        """
+        base = Path(index_dir) if index_dir else settings.index_dir
+        self.dir = base / (notebook or "_default")
+        self.read_only = read_only
+        if not read_only:
+            self.dir.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = self.dir / f"{name}.f16"
+        self.ids_path = self.dir / f"{name}.ids"
+        self.meta_path = self.dir / f"{name}.json"
+        self.lock_path = self.dir / f"{name}.lock"
+
+        if self.meta_path.exists():
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                self.dim = json.load(f)["dim"]
+            if dim and dim != self.dim:
+                raise ValueError(f"Embedding dimension mismatch for {self.meta_path}: {dim} != {self.dim}")
+        elif dim and not read_only:
+            self.dim = int(dim)
+            with open(self.meta_path, "w", encoding="utf-8") as f:
+                json.dump({"dim": self.dim, "dtype": "float16"}, f)
+        else:
+            self.dim = None
+
+        self._ids = []
+        # Bytes of the ids file read into _ids (complete lines only)
+        self._ids_size = 0
+
+    def __len__(self):
+        if not self.dim or not self.vectors_path.exists():
+            return 0
+        rows = self.vectors_path.stat().st_size // (self.dim * 2)
+        return min(rows, len(self.ids()))
+
+    def ids(self):
+        """
+        Returns the row ids, reading only what other writers appended since
+        the last call. A partly written last line is left for the next call.
+        """
+        size = self.ids_path.stat().st_size if self.ids_path.exists() else 0
+        if size < self._ids_size:
+            # Store removed or rebuilt
+            self._ids, self._ids_size = [], 0
+        if size > self._ids_size:
+            with open(self.ids_path, "rb") as f:
+                f.seek(self._ids_size)
+                tail = f.read(size - self._ids_size)
+            complete = tail.rfind(b"\n") + 1
+            if complete:
+                self._ids.extend(tail[:complete].decode("utf-8").splitlines())
+                self._ids_size += complete
+        return self._ids
+
+    def vectors(self):
+        """
+        Returns a read-only memory map of shape (len(self), dim).
+        """
+        n = len(self)
+        if n == 0:
+            return np.empty((0, self.dim or 0), dtype=np.float16)
+        return np.memmap(self.vectors_path, dtype=np.float16, mode="r", shape=(n, self.dim))
+
+    def append(self, ids, vectors):
+        """
+        Appends rows. Vectors must already be L2-normalized.
+        Returns the index of the first appended row.
+        """
+        if self.read_only:
+            raise ValueError(f"Embedding store {self.dir} is open read-only")
+        if len(ids) == 0:
+            return len(self)
+        vectors = np.asarray(vectors, dtype=np.float16).reshape(len(ids), self.dim)
+        row_bytes = self.dim * 2
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                # Drop what an interrupted append left behind (vectors without
+                # ids, ids without vectors, a partial id line) so rows and id
+                # lines stay aligned
+                start = len(self.ids())
+                rows = self.vectors_path.stat().st_size // row_bytes if self.vectors_path.exists() else 0
+                if rows < start:
+                    self._ids_size = sum(len(row_id.encode("utf-8")) + 1 for row_id in self._ids[:rows])
+                    del self._ids[rows:]
+                    start = rows
+                if self.ids_path.exists() and self.ids_path.stat().st_size > self._ids_size:
+                    os.truncate(self.ids_path, self._ids_size)
+                if rows > start:
+                    os.truncate(self.vectors_path, start * row_bytes)
+                with open(self.vectors_path, "ab") as f:
+                    f.write(vectors.tobytes())
+                with open(self.ids_path, "ab") as f:
+                    f.write("".join(f"{row_id}\n" for row_id in ids).encode("utf-8"))
+                self.ids()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        return start
+
+    def search(self, queries, k=1, block_size=65536):
+        """
+        Exact cosine top-k over the stored rows, scanning the matrix in blocks so
+        memory stays bounded regardless of store size.
+        Returns (scores, indices), both of shape (num_queries, k'), best first,
+        where k' = min(k, len(self)).
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        matrix = self.vectors()
+        n = matrix.shape[0]
+        k = min(k, n)
+        if k == 0:
+            return np.empty((len(queries), 0), dtype=np.float32), np.empty((len(queries), 0), dtype=np.int64)
+
+        block_size = max(block_size, k)
+        best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        best_idx = np.zeros((len(queries), k), dtype=np.int64)
+        for start in range(0, n, block_size):
+            block = np.asarray(matrix[start:start + block_size], dtype=np.float32)
+            sims = queries @ block.T
+            cand_scores = np.concatenate([best_scores, sims], axis=1)
+            cand_idx = np.concatenate([best_idx, np.broadcast_to(np.arange(start, start + len(block)), sims.shape)], axis=1)
+            top = np.argpartition(-cand_scores, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(cand_scores, top, axis=1)
+            best_idx = np.take_along_axis(cand_idx, top, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        return np.take_along_axis(best_scores, order, axis=1), np.take_along_axis(best_idx, order, axis=1)
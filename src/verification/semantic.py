@@ -0,0 +1,114 @@
+# src/verification/semantic.py
+
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+from verification.embedding_store import EmbeddingStore
+
+logger = logging.getLogger(__name__)
+
+STORE_NAME = "answers"
+
+def answer_ids(chunk_id, count):
+    """
+    Row ids of a chunk's cards: '<chunk_id>:<position in flashcards>', matching
+    cards.card_index in the database.
+    """
+    return [f"{chunk_id}:{i}" for i in range(count)]
+
+class AnswerIndex:
+    def __init__(self, notebook, dim, index_dir=None):
+        """
+        Writer side: persists the answer embeddings computed by the coverage audit.
+        """
+        self.store = EmbeddingStore(notebook, STORE_NAME, dim=dim, index_dir=index_dir)
+
+    def add(self, chunk_id, vectors):
+        self.store.append(answer_ids(chunk_id, len(vectors)), vectors)
+
+class SemanticSearch:
+    def __init__(self, model_name="all-MiniLM-L6-v2", backend="cpu-int8", num_threads=None, index_dir=None,
+                 max_indexes=16):
+        """
+        Reader side: top-k cosine search over the persisted answer embeddings.
+        The encoder is loaded on first use and only encodes the query text;
+        stored vectors are memory-mapped, never re-encoded.
+        max_indexes: Notebooks whose id maps stay cached (least recently used evicted).
+        """
+        self.model_name = model_name
+        self.backend = backend
+        self.num_threads = num_threads
+        self.index_dir = index_dir
+        self._model = None
+        self._model_lock = threading.Lock()
+        self.max_indexes = max_indexes
+        # notebook -> (ids file size, store, {id: latest row}), in LRU order
+        self._indexes = OrderedDict()
+        self._indexes_lock = threading.Lock()
+
+    def model(self):
+        with self._model_lock:
+            if self._model is None:
+                # Deferred: the web server only needs torch once a query is encoded
+                from verification.cpu_backend import load_embedder
+                self._model = load_embedder(self.model_name, backend=self.backend, num_threads=self.num_threads)
+            return self._model
+
+    def _index(self, notebook):
+        """
+        Returns (store, positions), reloading the ids only when the worker has
+        appended since the last call. A reprocessed chunk appends new rows under
+        the same ids; positions maps each id to its latest row.
+        """
+        store = EmbeddingStore(notebook, STORE_NAME, index_dir=self.index_dir, read_only=True)
+        size = store.ids_path.stat().st_size if store.ids_path.exists() else 0
+        with self._indexes_lock:
+            cached = self._indexes.get(notebook)
+            if cached and cached[0] == size:
+                self._indexes.move_to_end(notebook)
+                return cached[1], cached[2]
+        positions = {row_id: i for i, row_id in enumerate(store.ids()[:len(store)])}
+        if size:
+            with self._indexes_lock:
+                self._indexes[notebook] = (size, store, positions)
+                self._indexes.move_to_end(notebook)
+                while len(self._indexes) > self.max_indexes:
+                    self._indexes.popitem(last=False)
+        return store, positions
+
+    def _search(self, store, positions, vector, k, exclude=None):
+        ids = store.ids()
+        fetch = k + 1
+        while True:
+            scores, indices = store.search(vector, k=fetch)
+            results = []
+            for score, i in zip(scores[0], indices[0]):
+                row_id = ids[i]
+                if positions.get(row_id) != i or row_id == exclude:
+                    continue
+                results.append((row_id, float(score)))
+                if len(results) == k:
+                    return results
+            if fetch >= len(store):
+                return results
+            fetch *= 4
+
+    def query(self, notebook, text, k=10):
+        """
+        Returns [(card id, score)] of the answers closest to a free-text question.
+        """
+        store, positions = self._index(notebook)
+        if not len(store):
+            return []
+        vector = self.model().encode([text], convert_to_numpy=True, normalize_embeddings=True).astype(np.float32)
+        return self._search(store, positions, vector, k)
+
+    def related(self, notebook, card_id, k=10):
+        """
+        Returns [(card id, score)] of the cards closest to an indexed card.
+        Raises KeyError when the card has no stored embedding.
+        """
+        store, positions = self._index(notebook)
+        vector = np.asarray(store.vectors()[positions[card_id]], dtype=np.float32)
+        return self._search(store, positions, vector, k, exclude=card_id)
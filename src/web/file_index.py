@@ -0,0 +1,131 @@
+# src/web/file_index.py
+
+import os
+import json
+import time
+import base64
+import threading
+
+SORT_FIELDS = ("modified", "name", "size")
+
+class DirectoryIndex:
+    def __init__(self, max_age=30.0):
+        """
+        Caches directory listings. A directory is re-scanned only when its mtime
+        changes (an entry was added, removed or renamed) or its cached listing is
+        older than `max_age` seconds, which bounds staleness of files rewritten
+        in place. Each request then costs one stat() per directory instead of
+        two or three per file.
+        """
+        self.max_age = max_age
+        self._dirs = {}    # path -> (mtime_ns, scanned_at, files, subdirs, scan_id)
+        self._sorted = {}  # (root, recursive, sort, reverse) -> (signature, entries)
+        self._lock = threading.Lock()
+        self._scans = 0
+
+    def _scan(self, path, mtime_ns):
+        files, subdirs = [], []
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append((entry.name, entry.stat().st_mtime))
+                    elif entry.is_file():
+                        st = entry.stat()
+                        files.append((entry.name, st.st_size, st.st_mtime))
+                except FileNotFoundError:
+                    continue
+        self._scans += 1
+        record = (mtime_ns, time.monotonic(), files, subdirs, self._scans)
+        self._dirs[path] = record
+        return record
+
+    def _get(self, path):
+        """
+        Returns the (possibly cached) record of one directory and whether it was re-scanned.
+        """
+        st = os.stat(path)
+        cached = self._dirs.get(path)
+        if cached and cached[0] == st.st_mtime_ns and time.monotonic() - cached[1] < self.max_age:
+            return cached, False
+        return self._scan(path, st.st_mtime_ns), True
+
+    def list_dirs(self, root):
+        """
+        Returns [{"name", "modified"}] of the direct subdirectories of `root`.
+        """
+        with self._lock:
+            record, _ = self._get(str(root))
+        return [{"name": name, "modified": mtime} for name, mtime in record[3]]
+
+    def list_files(self, root, recursive=False, sort="modified", reverse=True):
+        """
+        Returns [{"name", "size", "modified"}] for the files under `root`, names
+        relative to it, sorted by `sort` (ties broken by name).
+        """
+        root = str(root)
+        with self._lock:
+            records = []
+            stack = [("", root)]
+            while stack:
+                rel, path = stack.pop()
+                try:
+                    record, _ = self._get(path)
+                except FileNotFoundError:
+                    continue
+                records.append((rel, path, record))
+                if recursive:
+                    stack.extend((os.path.join(rel, name), os.path.join(path, name)) for name, _ in record[3])
+
+            # Scan ids of every directory used: unchanged => reuse the sorted listing
+            signature = tuple(record[4] for _, _, record in records)
+            key = (root, recursive, sort, reverse)
+            cached = self._sorted.get(key)
+            if cached and cached[0] == signature:
+                return cached[1]
+
+            entries = [
+                {"name": os.path.join(rel, name) if rel else name, "size": size, "modified": mtime}
+                for rel, _, record in records
+                for name, size, mtime in record[2]
+            ]
+            entries.sort(key=lambda e: (e[sort], e["name"]), reverse=reverse)
+            self._sorted[key] = (signature, entries)
+            return entries
+
+def encode_cursor(entry, sort):
+    raw = json.dumps([entry[sort], entry["name"]]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def decode_cursor(cursor):
+    value, name = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    return value, name
+
+def paginate(entries, sort, reverse, limit, cursor=None):
+    """
+    Keyset pagination over an already sorted listing: the page starts right
+    after the (sort value, name) encoded in `cursor`, so pages stay stable
+    while files are added or removed.
+    """
+    start = 0
+    if cursor:
+        after = tuple(decode_cursor(cursor))
+        lo, hi = 0, len(entries)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            key = (entries[mid][sort], entries[mid]["name"])
+            if (key < after) if reverse else (key > after):
+                hi = mid
+            else:
+                lo = mid + 1
+        start = lo
+
+    page = entries[start:start + limit]
+    has_more = start + limit < len(entries)
+    return {
+        "items": page,
+        "total": len(entries),
+        "next_cursor": encode_cursor(page[-1], sort) if page and has_more else None
+    }
@@ -0,0 +1,221 @@
+# src/web/jobs.py
+
+import os
+import uuid
+import signal
+import asyncio
+import logging
+from datetime import datetime
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# (stage name, script, resource class). Stages of one job run in order; a 'gpu'
+# stage only runs while holding the manager's GPU lock.
+PIPELINE_STAGES = [
+    ("ingest", "src/ingestor.py", "cpu"),
+    ("worker", "src/worker.py", "gpu"),
+    ("export", "src/utils/exporter.py", "cpu"),
+]
+
+ACTIVE_STATES = ("queued", "running", "waiting_gpu")
+
+class JobConflict(Exception):
+    pass
+
+class Job:
+    def __init__(self, model_name, notebook=None, retry_of=None, profile=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.model_name = model_name
+        self.notebook = notebook
+        self.profile = profile
+        self.retry_of = retry_of
+        self.status = "queued"
+        self.stage = None
+        self.created_at = datetime.now().isoformat(timespec="seconds")
+        self.started_at = None
+        self.finished_at = None
+        self.returncode = None
+        self.error = None
+        self.log_file = None
+        self.cancel_requested = False
+
+    @property
+    def active(self):
+        return self.status in ACTIVE_STATES
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "model_name": self.model_name,
+            "notebook": self.notebook,
+            "profile": self.profile,
+            "status": self.status,
+            "stage": self.stage,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "returncode": self.returncode,
+            "error": self.error,
+            "log_file": self.log_file.name if self.log_file else None,
+            "retry_of": self.retry_of,
+        }
+
+class JobManager:
+    def __init__(self, base_dir, logs_dir, history=100):
+        """
+        Runs pipeline jobs as background tasks with one log file per job.
+        Admission control: at most one active job per notebook, and a single
+        GPU lock so two GPU-heavy stages never run at once, while CPU stages
+        (ingestion, export) of other notebooks proceed concurrently.
+        """
+        self.base_dir = Path(base_dir)
+        self.logs_dir = Path(logs_dir)
+        self.history = history
+        self.jobs = {}
+        self.gpu_lock = asyncio.Lock()
+        self._processes = {}
+        self._tasks = {}
+
+    def list(self):
+        return list(reversed(self.jobs.values()))
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def latest(self):
+        jobs = self.list()
+        active = [j for j in jobs if j.active]
+        return active[0] if active else (jobs[0] if jobs else None)
+
+    def pids(self):
+        """
+        Process (group) ids of the stages currently running.
+        """
+        return [p.pid for p in self._processes.values() if p.returncode is None]
+
+    def submit(self, model_name, notebook=None, retry_of=None, profile=None):
+        for job in self.jobs.values():
+            if job.active and job.notebook == notebook:
+                raise JobConflict(f"Job {job.id} is already {job.status} for notebook '{notebook or '(root)'}'")
+
+        job = Job(model_name, notebook, retry_of=retry_of, profile=profile)
+        job.log_file = self.logs_dir / f"pipeline_{job.id}.log"
+        self.jobs[job.id] = job
+        self._prune()
+        self._tasks[job.id] = asyncio.create_task(self._run(job))
+        return job
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        if not job.active:
+            return job
+        job.cancel_requested = True
+        process = self._processes.get(job_id)
+        if process and process.returncode is None:
+            # Stages run in their own session: terminate the whole process group
+            try:
+                os.killpg(process.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        else:
+            # Queued or waiting for the GPU lock
+            task = self._tasks.get(job_id)
+            if task:
+                task.cancel()
+        return job
+
+    def retry(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        if job.active:
+            raise JobConflict(f"Job {job.id} is still {job.status}")
+        return self.submit(job.model_name, job.notebook, retry_of=job.id, profile=job.profile)
+
+    def _prune(self):
+        finished = [j for j in self.list() if not j.active]
+        for job in finished[self.history:]:
+            self.jobs.pop(job.id, None)
+
+    def _link_latest_log(self, job):
+        """
+        Points pipeline.log at the newest job's log so existing viewers keep working.
+        """
+        link = self.logs_dir / "pipeline.log"
+        tmp = self.logs_dir / f".pipeline.log.{job.id}"
+        try:
+            os.symlink(job.log_file.name, tmp)
+            os.replace(tmp, link)
+        except OSError as e:
+            logger.warning(f"Could not link pipeline.log to {job.log_file.name}: {e}")
+
+    async def _run(self, job):
+        env = os.environ.copy()
+        env["PYTHONPATH"] = f"{env.get('PYTHONPATH', '')}:{self.base_dir}/src"
+        env["MODEL_NAME"] = job.model_name
+        if job.notebook:
+            env["TARGET_NOTEBOOK"] = job.notebook
+        if job.profile:
+            # Every stage's entry point profiles itself (utils.profiling)
+            env["ZERO_PROFILE"] = job.profile
+
+        job.status = "running"
+        job.started_at = datetime.now().isoformat(timespec="seconds")
+        self._link_latest_log(job)
+        try:
+            with open(job.log_file, "w") as log:
+                for stage, script, resource in PIPELINE_STAGES:
+                    if job.cancel_requested:
+                        break
+                    job.stage = stage
+                    if resource == "gpu":
+                        if self.gpu_lock.locked():
+                            job.status = "waiting_gpu"
+                            log.write(f"[job {job.id}] Waiting for the GPU...\n")
+                            log.flush()
+                        async with self.gpu_lock:
+                            job.status = "running"
+                            returncode = await self._run_stage(job, stage, script, env, log)
+                    else:
+                        returncode = await self._run_stage(job, stage, script, env, log)
+
+                    job.returncode = returncode
+                    if returncode != 0 and not job.cancel_requested:
+                        job.status = "failed"
+                        job.error = f"Stage '{stage}' exited with code {returncode}"
+                        break
+
+            if job.cancel_requested:
+                job.status = "cancelled"
+            elif job.status != "failed":
+                job.status = "completed"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.now().isoformat(timespec="seconds")
+            self._processes.pop(job.id, None)
+            self._tasks.pop(job.id, None)
+            logger.info(f"Job {job.id} finished: {job.status}")
+
+    async def _run_stage(self, job, stage, script, env, log):
+        log.write(f"[job {job.id}] === Stage: {stage} ===\n")
+        log.flush()
+        process = await asyncio.create_subprocess_exec(
+            "python3", script,
+            stdout=log,
+            stderr=asyncio.subprocess.STDOUT,
+            env=env,
+            cwd=str(self.base_dir),
+            start_new_session=True
+        )
+        self._processes[job.id] = process
+        try:
+            return await process.wait()
+        finally:
+            self._processes.pop(job.id, None)
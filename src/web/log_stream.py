@@ -0,0 +1,204 @@
+# src/web/log_stream.py
+
+import os
+import json
+import asyncio
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Bytes a watcher reads per poll; a partial trailing line is held back until
+# its newline arrives (or the line exceeds this size)
+READ_CHUNK = 64 * 1024
+
+def utf8_boundary(data):
+    """
+    Returns the length of the longest prefix of `data` that does not end in
+    the middle of a UTF-8 sequence.
+    """
+    i = len(data) - 1
+    # Step back over continuation bytes (at most 3) to the lead byte
+    while i > 0 and len(data) - i < 4 and data[i] & 0xC0 == 0x80:
+        i -= 1
+    lead = data[i] if data else 0
+    size = 4 if lead >= 0xF0 else 3 if lead >= 0xE0 else 2 if lead >= 0xC0 else 1
+    return i if lead >= 0xC0 and i + size > len(data) else len(data)
+
+class TooManySubscribers(Exception):
+    pass
+
+class LogFollower:
+    def __init__(self, path, poll_interval=0.5, queue_size=256):
+        """
+        Watches one log file and fans every appended line out to all subscribers,
+        so N open browser tabs cost one stat() per poll instead of N reads.
+        """
+        self.path = Path(path)
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.inode = None
+        self.offset = 0
+        self.task = None
+        try:
+            st = self.path.stat()
+            self.inode, self.offset = st.st_ino, st.st_size
+        except FileNotFoundError:
+            pass
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.add(queue)
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def _publish(self, event):
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Slow client: drop it, it reconnects and catches up from its last offset
+                self.subscribers.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+    def _poll(self):
+        """
+        Returns the events produced since the last poll (runs in a thread).
+        """
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return []
+
+        # Events are (kind, start offset, end offset, text); offsets are file
+        # bytes, independent of how the text decodes
+        events = []
+        if st.st_ino != self.inode or st.st_size < self.offset:
+            # Rotated or truncated: restart from the beginning of the new file
+            if self.inode is not None:
+                events.append(("rotate", 0, 0, ""))
+            self.inode, self.offset = st.st_ino, 0
+
+        while st.st_size > self.offset:
+            with open(self.path, "rb") as f:
+                f.seek(self.offset)
+                data = f.read(min(READ_CHUNK, st.st_size - self.offset))
+            cut = data.rfind(b"\n") + 1
+            if cut == 0:
+                if len(data) < READ_CHUNK:
+                    break
+                # Over-long line: emit it in pieces, never splitting a character
+                cut = utf8_boundary(data) or len(data)
+            events.append(("append", self.offset, self.offset + cut, data[:cut].decode("utf-8", errors="replace")))
+            self.offset += cut
+        return events
+
+    async def _run(self):
+        try:
+            while self.subscribers:
+                for event in await asyncio.to_thread(self._poll):
+                    self._publish(event)
+                await asyncio.sleep(self.poll_interval)
+        except Exception as e:
+            logger.error(f"Log follower for {self.path} failed: {e}")
+            self._publish(None)
+        finally:
+            self.task = None
+
+class LogBroadcaster:
+    def __init__(self, max_subscribers=32, poll_interval=0.5):
+        self.max_subscribers = max_subscribers
+        self.poll_interval = poll_interval
+        self.followers = {}
+
+    def subscriber_count(self):
+        return sum(len(f.subscribers) for f in self.followers.values())
+
+    def subscribe(self, path):
+        """
+        Returns (follower, queue, offset) where `offset` is the watcher's
+        position at subscription time: every queued event starts at or after it.
+        """
+        if self.subscriber_count() >= self.max_subscribers:
+            raise TooManySubscribers(f"Log stream limit of {self.max_subscribers} subscribers reached")
+        key = str(Path(path).resolve())
+        follower = self.followers.get(key)
+        if follower is None:
+            follower = self.followers[key] = LogFollower(path, poll_interval=self.poll_interval)
+        return follower, follower.subscribe(), follower.offset
+
+    def unsubscribe(self, follower, queue):
+        follower.unsubscribe(queue)
+        if not follower.subscribers and follower.task is None:
+            self.followers.pop(str(follower.path.resolve()), None)
+
+def format_event(kind, offset, end, data):
+    """
+    SSE frame whose id is the byte offset just past the event (Last-Event-ID
+    on reconnect). `end` comes from the file, not from re-encoding `data`:
+    invalid UTF-8 decodes to replacement characters of a different length.
+    """
+    return f"event: {kind}\nid: {end}\ndata: {json.dumps({'offset': offset, 'data': data})}\n\n"
+
+def read_range(path, start, end):
+    """
+    Reads [start, end) of a file for a client's catch-up, aligned to whole lines.
+    Returns (aligned start, end of the bytes read, text).
+    """
+    begin = max(0, start - 1)
+    with open(path, "rb") as f:
+        f.seek(begin)
+        data = f.read(max(0, end - begin))
+    if start > 0:
+        # data[0] is the byte before `start`: drop the partial first line unless
+        # the client resumes exactly on a line boundary
+        if data[:1] == b"\n":
+            data = data[1:]
+        else:
+            newline = data.find(b"\n")
+            if newline == -1:
+                return end, end, ""
+            start += newline
+            data = data[newline + 1:]
+    return start, start + len(data), data.decode("utf-8", errors="replace")
+
+async def stream_events(broadcaster, path, offset=None, tail_bytes=50 * 1024, heartbeat=15.0):
+    """
+    Async generator of SSE frames for one client: a catch-up of [offset, watcher
+    position) read once from disk, then the shared live events.
+    offset: Client byte offset (from ?offset= or Last-Event-ID). None = last
+            `tail_bytes` of the file.
+    """
+    follower, queue, live_offset = broadcaster.subscribe(path)
+    try:
+        # Reconnect delay hint for EventSource; also flushes the response headers
+        yield "retry: 2000\n\n"
+        if offset is None:
+            offset = max(0, live_offset - tail_bytes)
+        elif offset > live_offset:
+            # The file was rotated since the client's offset
+            offset = max(0, live_offset - tail_bytes)
+            yield format_event("rotate", 0, 0, "")
+        if offset < live_offset and os.path.exists(path):
+            start, end, data = await asyncio.to_thread(read_range, path, offset, live_offset)
+            if data:
+                yield format_event("append", start, end, data)
+
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if event is None:
+                break
+            yield format_event(*event)
+    finally:
+        broadcaster.unsubscribe(follower, queue)
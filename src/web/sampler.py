@@ -0,0 +1,199 @@
+# src/web/sampler.py
+
+import os
+import time
+import shutil
+import asyncio
+import logging
+from collections import deque
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+NVIDIA_SMI_QUERY = "--query-gpu=memory.used,memory.total,utilization.gpu,name"
+
+def read_cpu_times():
+    """
+    Returns (busy, total) jiffies from /proc/stat, or None off Linux.
+    """
+    try:
+        with open("/proc/stat") as f:
+            fields = [int(v) for v in f.readline().split()[1:]]
+    except (OSError, ValueError):
+        return None
+    idle = fields[3] + (fields[4] if len(fields) > 4 else 0)
+    total = sum(fields[:8])
+    return total - idle, total
+
+def read_memory():
+    """
+    Returns (used_mb, total_mb) from /proc/meminfo, or (None, None) off Linux.
+    """
+    info = {}
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                key, value = line.split(":", 1)
+                info[key] = int(value.split()[0])
+    except (OSError, ValueError):
+        return None, None
+    total = info.get("MemTotal", 0)
+    available = info.get("MemAvailable", info.get("MemFree", 0))
+    return round((total - available) / 1024, 1), round(total / 1024, 1)
+
+def process_group_rss_mb(pgids):
+    """
+    Total resident memory of every process in the given process groups
+    (pipeline stages run in their own session, so this includes their children).
+    """
+    if not pgids:
+        return 0.0
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    rss = 0
+    for entry in os.scandir("/proc"):
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry.name}/stat") as f:
+                # The command name may contain spaces; fields resume after ')'
+                fields = f.read().rsplit(")", 1)[1].split()
+            if int(fields[2]) in pgids:
+                rss += int(fields[21]) * page_size
+        except (OSError, ValueError, IndexError):
+            continue
+    return round(rss / (1024 * 1024), 1)
+
+class ResourceSampler:
+    def __init__(self, db, interval=2.0, history=1800, pids=None):
+        """
+        Samples GPU, CPU, RAM, pipeline RSS, WAL size and queue depth every
+        `interval` seconds into a ring buffer of `history` samples. Handlers only
+        read the buffer, so request latency never depends on sampling.
+        pids: Callable returning the process group ids of running pipeline stages.
+        """
+        self.db = db
+        self.interval = interval
+        self.samples = deque(maxlen=history)
+        self.pids = pids or (lambda: [])
+        self.nvidia_smi = shutil.which("nvidia-smi")
+        self.wal_path = Path(f"{db.db_path}-wal")
+        self.task = None
+        self._last_cpu = read_cpu_times()
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def latest(self):
+        return self.samples[-1] if self.samples else None
+
+    def history(self, seconds=300, max_points=None):
+        since = time.time() - seconds
+        window = [s for s in self.samples if s["timestamp"] >= since]
+        if max_points and len(window) > max_points:
+            step = -(-len(window) // max_points)
+            window = window[::step]
+        return window
+
+    async def _run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                self.samples.append(await self.sample())
+            except Exception as e:
+                logger.warning(f"Resource sampling failed: {e}")
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    async def sample(self):
+        gpus = await self._sample_gpus()
+        host = await asyncio.to_thread(self._sample_host)
+        first = gpus[0] if gpus else None
+        return {
+            "timestamp": round(time.time(), 3),
+            # Fields of the original single-snapshot /api/system_stats
+            "vram_used_mb": first["memory_used_mb"] if first else 0,
+            "vram_total_mb": first["memory_total_mb"] if first else 0,
+            "gpu_name": first["name"] if first else "N/A",
+            "gpu_util_percent": first["utilization_percent"] if first else None,
+            "gpus": gpus,
+            **host,
+        }
+
+    async def _sample_gpus(self):
+        if not self.nvidia_smi:
+            return []
+        try:
+            process = await asyncio.create_subprocess_exec(
+                self.nvidia_smi, NVIDIA_SMI_QUERY, "--format=csv,noheader,nounits",
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+            try:
+                stdout, _ = await asyncio.wait_for(process.communicate(), timeout=self.interval * 2)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                return []
+        except OSError as e:
+            logger.warning(f"Error checking GPU stats: {e}")
+            return []
+        if process.returncode != 0:
+            return []
+
+        gpus = []
+        for line in stdout.decode().strip().splitlines():
+            parts = [p.strip() for p in line.split(",")]
+            if len(parts) < 4:
+                continue
+            try:
+                gpus.append({
+                    "memory_used_mb": float(parts[0]),
+                    "memory_total_mb": float(parts[1]),
+                    "utilization_percent": float(parts[2]),
+                    "name": parts[3],
+                })
+            except ValueError:
+                continue
+        return gpus
+
+    def _sample_host(self):
+        cpu_percent = None
+        cpu = read_cpu_times()
+        if cpu and self._last_cpu and cpu[1] > self._last_cpu[1]:
+            cpu_percent = round(100.0 * (cpu[0] - self._last_cpu[0]) / (cpu[1] - self._last_cpu[1]), 1)
+        self._last_cpu = cpu
+
+        ram_used, ram_total = read_memory()
+        try:
+            wal_mb = round(self.wal_path.stat().st_size / (1024 * 1024), 2)
+        except OSError:
+            wal_mb = 0.0
+
+        queue = {"pending": 0, "processing": 0}
+        for counts in self.db.get_status_counts().values():
+            queue["pending"] += counts.get("PENDING", 0)
+            queue["processing"] += counts.get("PROCESSING", 0)
+
+        try:
+            pipeline_rss = process_group_rss_mb(set(self.pids()))
+        except OSError:
+            pipeline_rss = None
+
+        return {
+            "cpu_percent": cpu_percent,
+            "ram_used_mb": ram_used,
+            "ram_total_mb": ram_total,
+            "pipeline_rss_mb": pipeline_rss,
+            "wal_size_mb": wal_mb,
+            "queue_pending": queue["pending"],
+            "queue_processing": queue["processing"],
+        }
@@ -1,17 +1,34 @@
 import os
 import shutil
 import aiofiles
-import subprocess
+import sqlite3
 import asyncio
+from contextlib import asynccontextmanager
 from pathlib import Path
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Form
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Request, Query
+from fastapi.responses import HTMLResponse, FileResponse, StreamingResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from typing import List, Optional
 from pydantic import BaseModel
 from config import settings
+from db.db_manager import DBManager
+from web.log_stream import LogBroadcaster, TooManySubscribers, stream_events
+from web.uploads import safe_name, is_archive, save_upload, finalize_upload, extract_archive
+from web.file_index import DirectoryIndex, SORT_FIELDS, paginate
+from web.jobs import JobManager, JobConflict
+from web.sampler import ResourceSampler
+from web.zip_stream import collect_files, iter_zip
+from verification.semantic import SemanticSearch
+from utils.metrics import render_prometheus
+from utils.profiling import PROFILE_MODES
 
-app = FastAPI(title="Zero-Loss File Manager")
+@asynccontextmanager
+async def lifespan(app):
+    resource_sampler.start()
+    yield
+    await resource_sampler.stop()
+
+app = FastAPI(title="Zero-Loss File Manager", lifespan=lifespan)
 
 # Configuration
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
@@ -19,8 +36,19 @@ INPUT_DIR = settings.input_dir
 OUTPUT_DIR = settings.output_dir
 LOGS_DIR = settings.logs_dir
 
-# Pipeline status tracking
-pipeline_status = {"status": "idle", "started_at": None}
+db = DBManager()
+search_available = db.search_available()
+semantic_search = SemanticSearch(backend=settings.semantic_search_backend, num_threads=settings.verification_threads)
+file_index = DirectoryIndex()
+
+# Pipeline jobs (one log per job, GPU admission control)
+job_manager = JobManager(BASE_DIR, LOGS_DIR)
+
+# Background resource sampling into an in-memory history
+resource_sampler = ResourceSampler(db, settings.stats_interval, settings.stats_history, pids=job_manager.pids)
+
+# One file watcher per log, shared by all streaming clients
+log_broadcaster = LogBroadcaster(max_subscribers=settings.log_stream_max_subscribers)
 
 # Directories are created by settings properties, but let's double check/ensure
 # settings.input_dir.mkdir(...) happens when accessed? 
@@ -29,63 +57,216 @@ pipeline_status = {"status": "idle", "started_at": None}
 class PipelineRequest(BaseModel):
     model_name: str
     notebook: Optional[str] = None
+    # Profiling mode for this run's stages (overrides ZERO_PROFILE): off | cpu | memory | all
+    profile: Optional[str] = None
 
 class NotebookRequest(BaseModel):
     name: str
 
-async def run_pipeline_task(model_name: str, notebook: Optional[str] = None):
+@app.post("/api/run")
+async def run_pipeline(request: PipelineRequest):
+    if request.profile and request.profile not in PROFILE_MODES:
+        raise HTTPException(status_code=400, detail=f"profile must be one of {PROFILE_MODES}")
+    try:
+        job = job_manager.submit(request.model_name, request.notebook, profile=request.profile)
+    except JobConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "started", "job_id": job.id, "model": request.model_name, "notebook": request.notebook}
+
+@app.get("/api/pipeline/status")
+async def get_pipeline_status():
     """
-    Runs the pipeline steps sequentially in the background.
+    Returns the status of the most relevant job (any active one, else the latest).
     """
-    global pipeline_status
-    pipeline_status = {"status": "running", "started_at": "now"}
-    
-    env = os.environ.copy()
-    env["PYTHONPATH"] = f"{env.get('PYTHONPATH', '')}:{BASE_DIR}/src"
-    env["MODEL_NAME"] = model_name
-    if notebook:
-        env["TARGET_NOTEBOOK"] = notebook
-    
-    cmd = (
-        f"python3 src/ingestor.py && "
-        f"python3 src/worker.py && "
-        f"python3 src/utils/exporter.py"
-    )
-    
+    job = job_manager.latest()
+    if job is None:
+        return {"status": "idle", "started_at": None}
+    status = "running" if job.active else job.status
+    return {"status": status, "started_at": job.started_at, "job": job.to_dict()}
+
+@app.get("/api/progress")
+async def get_progress(notebook: Optional[str] = None):
+    """
+    Queue counts, throughput and ETA from the trigger-maintained counter tables.
+    """
+    documents = await asyncio.to_thread(db.get_status_counts, notebook)
+    completed_window, failed_window = await asyncio.to_thread(db.get_throughput, settings.progress_window_minutes, notebook)
+
+    totals = {"pending": 0, "processing": 0, "completed": 0, "failed": 0}
+    for counts in documents.values():
+        for status, count in counts.items():
+            key = status.lower()
+            totals[key] = totals.get(key, 0) + count
+    totals["total"] = sum(totals.values())
+
+    per_minute = (completed_window + failed_window) / settings.progress_window_minutes
+    remaining = totals["pending"] + totals["processing"]
+    eta_seconds = round(remaining / per_minute * 60) if per_minute and remaining else None
+
+    return {
+        "notebook": notebook,
+        **totals,
+        "chunks_per_minute": round(per_minute, 2),
+        "window_minutes": settings.progress_window_minutes,
+        "eta_seconds": eta_seconds,
+        "documents": {
+            filename: {status.lower(): count for status, count in counts.items()}
+            for filename, counts in sorted(documents.items())
+        },
+    }
+
+def fts_query(text):
+    """
+    Turns free text into an FTS5 query: every term quoted and implicitly ANDed,
+    the last one as a prefix so results appear while typing.
+    """
+    terms = ['"' + term.replace('"', '""') + '"' for term in text.split()]
+    if terms:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+@app.get("/api/search")
+async def search_cards(
+    q: str,
+    notebook: Optional[str] = None,
+    filename: Optional[str] = None,
+    include_duplicates: bool = False,
+    raw: bool = False,
+    limit: int = 20,
+    offset: int = 0
+):
+    """
+    Full-text search over generated cards.
+    raw: Pass `q` to FTS5 unchanged (phrases, OR/NOT, column filters such as front:term).
+    """
+    if not search_available:
+        raise HTTPException(status_code=503, detail="Search unavailable: SQLite was built without FTS5")
+    if not 1 <= limit <= 100 or offset < 0:
+        raise HTTPException(status_code=400, detail="limit must be 1-100 and offset >= 0")
+    match = q if raw else fts_query(q)
+    if not match.strip():
+        raise HTTPException(status_code=400, detail="Empty query")
+
     try:
-        log_file_path = LOGS_DIR / "pipeline.log"
-        with open(log_file_path, "w") as f:
-            process = await asyncio.create_subprocess_shell(
-                cmd,
-                stdout=f,
-                stderr=f,
-                env=env,
-                cwd=str(BASE_DIR)
-            )
-            await process.communicate()
-        
-        if process.returncode != 0:
-            print(f"Pipeline failed. Check {log_file_path}")
-            pipeline_status = {"status": "idle", "started_at": None}
-        else:
-            print("Pipeline completed successfully.")
-            pipeline_status = {"status": "completed", "started_at": None}
-            
-    except Exception as e:
-        print(f"Error running pipeline: {e}")
-        pipeline_status = {"status": "idle", "started_at": None}
+        total, results = await asyncio.to_thread(
+            db.search_cards, match, notebook, filename, include_duplicates, limit, offset
+        )
+    except sqlite3.OperationalError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid search query: {e}")
 
-@app.post("/api/run")
-async def run_pipeline(request: PipelineRequest, background_tasks: BackgroundTasks):
-    background_tasks.add_task(run_pipeline_task, request.model_name, request.notebook)
-    return {"status": "started", "model": request.model_name, "notebook": request.notebook}
+    next_offset = offset + limit if offset + limit < total else None
+    return {"total": total, "results": results, "next_offset": next_offset}
 
-@app.get("/api/pipeline/status")
-async def get_pipeline_status():
+def semantic_results(matches, include_duplicates, k):
+    cards = db.get_cards([card_id for card_id, _ in matches])
+    results = []
+    for card_id, score in matches:
+        card = cards.get(card_id)
+        # Rows of chunks that were deleted or reprocessed into fewer cards
+        if card is None or (card["duplicate_of"] and not include_duplicates):
+            continue
+        results.append({**card, "score": round(score, 4)})
+    return results[:k]
+
+def check_notebook_name(notebook):
+    """
+    Rejects notebook names that are not a single path component (they would
+    resolve outside the notebook's index directory).
+    """
+    try:
+        if notebook and safe_name(notebook) != notebook:
+            raise ValueError(notebook)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Notebook not found")
+
+@app.get("/api/semantic_search")
+async def semantic_search_cards(q: str, notebook: Optional[str] = None, k: int = 10, include_duplicates: bool = False):
     """
-    Returns the current status of the pipeline.
+    Cards whose answers are closest to a free-text question (cosine over the
+    persisted answer embeddings; only the question is encoded).
     """
-    return pipeline_status
+    check_notebook_name(notebook)
+    if not 1 <= k <= 100 or not q.strip():
+        raise HTTPException(status_code=400, detail="q must be non-empty and k 1-100")
+    # Over-fetch: some matches may be flagged duplicates or stale rows
+    matches = await asyncio.to_thread(semantic_search.query, notebook, q, k * 2)
+    return {"results": await asyncio.to_thread(semantic_results, matches, include_duplicates, k)}
+
+@app.get("/api/cards/related")
+async def related_cards(card_id: str, notebook: Optional[str] = None, k: int = 10, include_duplicates: bool = False):
+    """
+    Cards closest to an existing card (id '<chunk_id>:<n>'), without encoding anything.
+    """
+    check_notebook_name(notebook)
+    if not 1 <= k <= 100:
+        raise HTTPException(status_code=400, detail="k must be 1-100")
+    try:
+        matches = await asyncio.to_thread(semantic_search.related, notebook, card_id, k * 2)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="No embedding stored for this card")
+    return {"card_id": card_id, "results": await asyncio.to_thread(semantic_results, matches, include_duplicates, k)}
+
+@app.get("/api/generation_stats")
+async def get_generation_stats(notebook: Optional[str] = None, window_minutes: Optional[int] = None):
+    """
+    LLM token accounting per notebook, model and call kind (generate/repair):
+    completion tokens per second of end-to-end call time and the share of calls
+    truncated at max_tokens. All-time totals unless window_minutes is given.
+    wall_s spans queueing, prefill and decode, so the rate is not a decode
+    speed; compare it only between runs on the same setup.
+    """
+    rows = await asyncio.to_thread(db.get_generation_totals, notebook, window_minutes)
+    for row in rows:
+        calls, wall_s = row["calls"], row["wall_s"]
+        row["wall_s"] = round(wall_s, 3)
+        row["completion_tokens_per_wall_second"] = round(row["completion_tokens"] / wall_s, 2) if wall_s else None
+        row["avg_completion_tokens"] = round(row["completion_tokens"] / calls, 1) if calls else None
+        row["truncation_rate"] = round(row["truncated"] / calls, 4) if calls else None
+    return {"notebook": notebook, "window_minutes": window_minutes, "models": rows}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Prometheus scrape endpoint: stage duration histograms, LLM token counters,
+    queue and job gauges.
+    """
+    histograms = await asyncio.to_thread(db.get_stage_histograms)
+    queue_gauges = await asyncio.to_thread(db.get_queue_gauges)
+    generation_totals = await asyncio.to_thread(db.get_generation_totals)
+    job_counts = {}
+    for job in job_manager.list():
+        job_counts[job.status] = job_counts.get(job.status, 0) + 1
+    return PlainTextResponse(
+        render_prometheus(histograms, queue_gauges, job_counts, generation_totals),
+        media_type="text/plain; version=0.0.4"
+    )
+
+@app.get("/api/jobs")
+async def list_jobs():
+    return [job.to_dict() for job in job_manager.list()]
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.post("/api/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    try:
+        return job_manager.cancel(job_id).to_dict()
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+@app.post("/api/jobs/{job_id}/retry")
+async def retry_job(job_id: str):
+    try:
+        return job_manager.retry(job_id).to_dict()
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Job not found")
+    except JobConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
 @app.get("/api/logs/content/{filename}")
 async def get_log_content(filename: str):
@@ -116,39 +297,61 @@ async def get_log_content(filename: str):
     except Exception as e:
         return {"content": f"Error reading log: {str(e)}"}
 
-@app.get("/api/system_stats")
-async def get_system_stats():
+@app.get("/api/logs/stream/{filename}")
+async def stream_log(filename: str, request: Request, offset: Optional[int] = None):
     """
-    Returns GPU memory usage if available.
+    Streams a log file as Server-Sent Events. Only bytes after `offset` (or the
+    Last-Event-ID sent by a reconnecting EventSource) are transferred; without
+    an offset the stream starts with the last 50KB.
     """
-    vram_used = 0
-    vram_total = 0
-    gpu_name = "N/A"
+    log_path = LOGS_DIR / filename
     
+    # Security check
     try:
-        # Check if nvidia-smi exists
-        if shutil.which("nvidia-smi"):
-            result = subprocess.run(
-                ["nvidia-smi", "--query-gpu=memory.used,memory.total,name", "--format=csv,noheader,nounits"],
-                capture_output=True, text=True
-            )
-            if result.returncode == 0:
-                output = result.stdout.strip()
-                if output:
-                    # Parse first GPU
-                    parts = output.split(',')
-                    if len(parts) >= 3:
-                        vram_used = float(parts[0].strip())
-                        vram_total = float(parts[1].strip())
-                        gpu_name = parts[2].strip()
-    except Exception as e:
-        print(f"Error checking GPU stats: {e}")
-        
-    return {
-        "vram_used_mb": vram_used,
-        "vram_total_mb": vram_total,
-        "gpu_name": gpu_name
-    }
+        log_path.resolve().relative_to(LOGS_DIR.resolve())
+    except ValueError:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    last_event_id = request.headers.get("last-event-id")
+    if offset is None and last_event_id and last_event_id.isdigit():
+        offset = int(last_event_id)
+
+    try:
+        events = stream_events(log_broadcaster, log_path, offset=offset)
+        # Subscribe now so the limit is enforced before the response starts
+        first_frame = await events.__anext__()
+    except TooManySubscribers as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    async def frames():
+        yield first_frame
+        async for frame in events:
+            yield frame
+
+    return StreamingResponse(
+        frames(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/system_stats")
+async def get_system_stats():
+    """
+    Returns the latest resource sample (GPU memory, CPU, RAM, WAL size, queue depth).
+    """
+    sample = resource_sampler.latest()
+    if sample is None:
+        return {"vram_used_mb": 0, "vram_total_mb": 0, "gpu_name": "N/A"}
+    return sample
+
+@app.get("/api/system_stats/history")
+async def get_system_stats_history(seconds: int = 300, max_points: Optional[int] = None):
+    """
+    Returns the samples of the last `seconds` seconds, optionally thinned to max_points.
+    """
+    if seconds <= 0 or (max_points is not None and max_points <= 0):
+        raise HTTPException(status_code=400, detail="seconds and max_points must be positive")
+    return {"interval": resource_sampler.interval, "samples": resource_sampler.history(seconds, max_points)}
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root():
@@ -171,7 +374,7 @@ async def create_notebook(request: NotebookRequest):
 
 @app.delete("/api/notebooks/{name}")
 async def delete_notebook(name: str):
-    """Deletes a notebook (subfolder) and its contents."""
+    """Deletes a notebook (subfolder), its contents, its database rows and its search index."""
     notebook_path = INPUT_DIR / name
     
     # Security check
@@ -185,22 +388,30 @@ async def delete_notebook(name: str):
         
     try:
         shutil.rmtree(notebook_path)
-        return {"status": "deleted", "name": name}
+        deleted = await asyncio.to_thread(db.delete_notebook, name)
+        shutil.rmtree(settings.index_dir / name, ignore_errors=True)
+        return {"status": "deleted", "name": name, "rows": deleted}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/files/{location}")
-async def list_files(location: str, notebook: Optional[str] = None):
-    """List files in input, output, logs, or list notebooks."""
+async def list_files(
+    location: str,
+    notebook: Optional[str] = None,
+    sort: str = "modified",
+    order: str = "desc",
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
+):
+    """
+    List files in input, output, logs, or list notebooks.
+    Listings come from a directory cache and are built off the event loop.
+    With `limit`, returns one page {"items", "total", "next_cursor"}; pass
+    `next_cursor` back as `cursor` for the following page.
+    """
     if location == "notebooks":
         # List subdirectories in input
-        dirs = []
-        for path in INPUT_DIR.iterdir():
-            if path.is_dir() and not path.name.startswith("."):
-                dirs.append({
-                    "name": path.name,
-                    "modified": path.stat().st_mtime
-                })
+        dirs = await asyncio.to_thread(file_index.list_dirs, INPUT_DIR)
         dirs.sort(key=lambda x: x['name']) # Sort alphabetically
         return dirs
 
@@ -216,58 +427,94 @@ async def list_files(location: str, notebook: Optional[str] = None):
         target_dir = LOGS_DIR
     else:
         raise HTTPException(status_code=400, detail="Invalid location")
+
+    if sort not in SORT_FIELDS or order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail=f"sort must be one of {SORT_FIELDS}, order 'asc' or 'desc'")
+    if limit is not None and limit <= 0:
+        raise HTTPException(status_code=400, detail="limit must be positive")
     
     # If notebook dir doesn't exist yet, return empty
     if not target_dir.exists():
-        return []
-        
-    files = []
-    
-    # For output, we might still want recursive search if there are subfolders like 'chunks'
-    # But usually CSVs are at the top of the notebook output folder.
-    if location == "output":
-         for path in target_dir.rglob("*"):
-             if path.is_file() and not path.name.startswith("."):
-                 try:
-                    rel_path = path.relative_to(target_dir)
-                    files.append({
-                        "name": str(rel_path),
-                        "size": path.stat().st_size,
-                        "modified": path.stat().st_mtime
-                    })
-                 except ValueError:
-                     continue
-    else:
-        # For input/logs, list direct files
-        for path in target_dir.iterdir():
-            if path.is_file() and not path.name.startswith("."):
-                files.append({
-                    "name": path.name,
-                    "size": path.stat().st_size,
-                    "modified": path.stat().st_mtime
-                })
-    
-    # Sort by modified time descending
-    files.sort(key=lambda x: x['modified'], reverse=True)
-    return files
+        return [] if limit is None else {"items": [], "total": 0, "next_cursor": None}
 
-@app.post("/api/upload")
-async def upload_file(file: UploadFile = File(...), notebook: Optional[str] = Form(None)):
+    # Output is searched recursively (per-document folders with markdown and assets);
+    # input and logs list direct files only.
+    files = await asyncio.to_thread(
+        file_index.list_files, target_dir,
+        recursive=(location == "output"), sort=sort, reverse=(order == "desc")
+    )
+    if limit is None:
+        return files
+
+    try:
+        return paginate(files, sort, order == "desc", limit, cursor)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def upload_destination(notebook: Optional[str]) -> Path:
     if notebook:
         destination_dir = INPUT_DIR / notebook
+        try:
+            destination_dir.resolve().relative_to(INPUT_DIR.resolve())
+        except ValueError:
+            raise HTTPException(status_code=403, detail="Access denied")
         destination_dir.mkdir(exist_ok=True)
-        destination = destination_dir / file.filename
-    else:
-        destination = INPUT_DIR / file.filename
-        
+        return destination_dir
+    return INPUT_DIR
+
+async def store_upload(file: UploadFile, destination_dir: Path, notebook: Optional[str]) -> List[dict]:
+    """
+    Streams one uploaded file (or every PDF inside an uploaded archive) to disk,
+    hashing on the fly and skipping content the notebook already has.
+    """
+    try:
+        filename = safe_name(file.filename or "")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if is_archive(filename):
+        # The multipart parser has already spooled the archive to a temporary
+        # file; members are extracted from it one at a time off the event loop.
+        return await asyncio.to_thread(extract_archive, file.file, filename, destination_dir, notebook, db)
+
+    part, digest, size = await save_upload(file, destination_dir, filename)
+    return [await asyncio.to_thread(finalize_upload, part, digest, size, destination_dir, filename, notebook, db)]
+
+@app.post("/api/upload")
+async def upload_file(file: UploadFile = File(...), notebook: Optional[str] = Form(None)):
+    destination_dir = upload_destination(notebook)
     try:
-        async with aiofiles.open(destination, 'wb') as out_file:
-            content = await file.read()
-            await out_file.write(content)
-        return {"filename": file.filename, "status": "uploaded"}
+        results = await store_upload(file, destination_dir, notebook)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    if is_archive(file.filename or ""):
+        return {"filename": file.filename, "status": "extracted", "files": results}
+    return results[0]
+
+@app.post("/api/upload/batch")
+async def upload_files(files: List[UploadFile] = File(...), notebook: Optional[str] = Form(None)):
+    """
+    Uploads many files (and/or zip/tar archives of PDFs) in one request.
+    """
+    destination_dir = upload_destination(notebook)
+    results = []
+    for file in files:
+        try:
+            results.extend(await store_upload(file, destination_dir, notebook))
+        except HTTPException as e:
+            results.append({"filename": file.filename, "status": "error", "detail": e.detail})
+        except Exception as e:
+            results.append({"filename": file.filename, "status": "error", "detail": str(e)})
+    return {
+        "uploaded": sum(1 for r in results if r["status"] == "uploaded"),
+        "skipped": sum(1 for r in results if r["status"] == "skipped"),
+        "errors": sum(1 for r in results if r["status"] == "error"),
+        "files": results
+    }
+
 @app.get("/api/download/{location}/{filepath:path}")
 async def download_file(location: str, filepath: str, notebook: Optional[str] = None):
     if location == "input":
@@ -285,6 +532,40 @@ async def download_file(location: str, filepath: str, notebook: Optional[str] =
         
     return FileResponse(file_path, filename=file_path.name)
 
+@app.get("/api/download_zip/{location}")
+async def download_zip(location: str, notebook: Optional[str] = None, include: Optional[List[str]] = Query(None)):
+    """
+    Streams a zip of a notebook's directory as it is built.
+    include: Glob patterns on the relative path (e.g. '*.csv'); repeatable.
+    """
+    if location == "input":
+        base = INPUT_DIR / notebook if notebook else INPUT_DIR
+    elif location == "output":
+        base = OUTPUT_DIR / notebook if notebook else OUTPUT_DIR
+    elif location == "logs":
+        base = LOGS_DIR
+    else:
+        raise HTTPException(status_code=400, detail="Invalid location")
+
+    try:
+        if notebook and safe_name(notebook) != notebook:
+            raise ValueError(notebook)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid notebook name")
+    if not base.is_dir():
+        raise HTTPException(status_code=404, detail="Directory not found")
+
+    files = await asyncio.to_thread(collect_files, base, include)
+    if not files:
+        raise HTTPException(status_code=404, detail="No matching files")
+
+    archive_name = f"{notebook or location}.zip"
+    return StreamingResponse(
+        iter_zip(files),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{archive_name}"'}
+    )
+
 @app.delete("/api/delete/{location}/{filepath:path}")
 async def delete_file(location: str, filepath: str, notebook: Optional[str] = None):
     if location == "input":
@@ -0,0 +1,128 @@
+# src/web/uploads.py
+
+import os
+import uuid
+import hashlib
+import tarfile
+import zipfile
+import aiofiles
+from pathlib import Path
+
+# Bytes read from the request / archive member per write
+UPLOAD_CHUNK = 1024 * 1024
+
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+# Archive entries that are extracted (everything else is ignored)
+INGESTIBLE_SUFFIXES = (".pdf",)
+
+def is_archive(filename):
+    return filename.lower().endswith(ARCHIVE_SUFFIXES)
+
+def safe_name(filename):
+    """
+    Strips any directory component so uploads and archive entries cannot
+    escape the notebook folder.
+    """
+    name = Path(filename.replace("\\", "/")).name
+    if not name or name.startswith("."):
+        raise ValueError(f"Invalid file name: {filename!r}")
+    return name
+
+def _part_path(destination_dir, filename):
+    return destination_dir / f".{filename}.{uuid.uuid4().hex}.part"
+
+async def save_upload(upload, destination_dir, filename):
+    """
+    Streams an UploadFile to a temporary file in fixed-size chunks while hashing it.
+    Returns (temporary path, sha256 hex digest, size in bytes).
+    """
+    part = _part_path(destination_dir, filename)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(part, "wb") as out:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+                await out.write(chunk)
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
+    return part, digest.hexdigest(), size
+
+def save_stream(source, destination_dir, filename):
+    """
+    Synchronous counterpart of save_upload for file-like objects (archive members).
+    """
+    part = _part_path(destination_dir, filename)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(part, "wb") as out:
+            while True:
+                chunk = source.read(UPLOAD_CHUNK)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+                out.write(chunk)
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
+    return part, digest.hexdigest(), size
+
+def finalize_upload(part, digest, size, destination_dir, filename, notebook, db):
+    """
+    Moves a hashed upload into place, or drops it when the notebook already
+    holds a file with identical content. Returns the per-file result.
+    Only the ingestor records content hashes (once a document is chunked), so
+    changed content uploaded under an existing name is ingested again.
+    """
+    if notebook:
+        existing = db.find_document_by_hash(digest, notebook)
+        if existing and (destination_dir / existing).exists():
+            part.unlink()
+            return {"filename": filename, "status": "skipped", "duplicate_of": existing, "sha256": digest, "size": size}
+
+    os.replace(part, destination_dir / filename)
+    return {"filename": filename, "status": "uploaded", "sha256": digest, "size": size}
+
+def extract_archive(fileobj, archive_name, destination_dir, notebook, db):
+    """
+    Extracts the ingestible entries of a zip or tar archive one member at a time
+    (tar is read as a forward-only stream). Directory structure is flattened.
+    """
+    results = []
+
+    def store(member_name, source):
+        try:
+            filename = safe_name(member_name)
+        except ValueError:
+            return
+        if not filename.lower().endswith(INGESTIBLE_SUFFIXES):
+            return
+        part, digest, size = save_stream(source, destination_dir, filename)
+        result = finalize_upload(part, digest, size, destination_dir, filename, notebook, db)
+        result["archive"] = archive_name
+        results.append(result)
+
+    if archive_name.lower().endswith(".zip"):
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                with archive.open(info) as source:
+                    store(info.filename, source)
+    else:
+        with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+            for member in archive:
+                if not member.isfile():
+                    continue
+                source = archive.extractfile(member)
+                if source is not None:
+                    store(member.name, source)
+    return results
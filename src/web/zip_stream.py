@@ -0,0 +1,83 @@
+# src/web/zip_stream.py
+
+import os
+import zipfile
+from fnmatch import fnmatch
+
+READ_CHUNK = 64 * 1024
+
+# Already-compressed formats are stored as-is; deflating them only burns CPU
+STORED_SUFFIXES = {".apkg", ".zip", ".gz", ".png", ".jpg", ".jpeg", ".pdf"}
+
+# Partial files of in-flight uploads and exports
+SKIPPED_SUFFIXES = {".part", ".tmp"}
+
+class _ChunkSink:
+    """
+    Write-only, non-seekable file object that buffers what ZipFile writes until
+    the generator drains it. ZipFile falls back to data descriptors on it.
+    """
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+def collect_files(base, include=None):
+    """
+    Returns [(arcname, path)] of the regular files under base, sorted, keeping
+    only relative paths that match one of the `include` glob patterns (if any).
+    """
+    files = []
+    for root, dirs, names in os.walk(base):
+        dirs.sort()
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            arcname = os.path.relpath(path, base).replace(os.sep, "/")
+            if os.path.splitext(name)[1].lower() in SKIPPED_SUFFIXES or name.startswith("."):
+                continue
+            if include and not any(fnmatch(arcname, pattern) for pattern in include):
+                continue
+            if os.path.isfile(path):
+                files.append((arcname, path))
+    return files
+
+def iter_zip(files):
+    """
+    Yields a zip archive of `files` ([(arcname, path)]) chunk by chunk, reading
+    each file incrementally, so memory stays bounded by READ_CHUNK and the first
+    bytes go out before the last file is read.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+        for arcname, path in files:
+            try:
+                info = zipfile.ZipInfo.from_file(path, arcname)
+                source = open(path, "rb")
+            except OSError:
+                # Deleted or replaced since the listing
+                continue
+            if os.path.splitext(arcname)[1].lower() in STORED_SUFFIXES:
+                info.compress_type = zipfile.ZIP_STORED
+            else:
+                info.compress_type = zipfile.ZIP_DEFLATED
+            with source, archive.open(info, mode="w", force_zip64=True) as dest:
+                while True:
+                    chunk = source.read(READ_CHUNK)
+                    if not chunk:
+                        break
+                    dest.write(chunk)
+                    if sink.chunks:
+                        yield sink.drain()
+            yield sink.drain()
+    # Central directory
+    yield sink.drain()
@@ -6,13 +6,17 @@ import os
 import signal
 import logging
 import subprocess
+from collections import deque
 from pathlib import Path
 from tqdm import tqdm
 from db.db_manager import DBManager
-from inference.generator import FlashcardGenerator
-from inference.prompts import REPAIR_PROMPT_TEMPLATE
+from db.work_queue import HTTPQueue, CoordinatorError
 from verification.audit import CoverageAuditor, FactChecker
-from utils.logger import setup_logger, console
+from verification.dedup import DuplicateIndex
+from verification.semantic import AnswerIndex
+from utils.logger import setup_logger, console, exit_on_sigterm
+from utils import metrics
+from utils.profiling import Profiler
 from config import settings
 
 logger = setup_logger("Worker", log_file=settings.logs_dir / "worker.log")
@@ -27,31 +31,177 @@ def timeout_handler(signum, frame):
 
 class StudyWorker:
     def __init__(self, db_path=None, model_name=None):
-        self.db = DBManager(db_path if db_path else settings.db_path)
+        # Remote workers lease from a coordinator instead of the local database
+        queue = HTTPQueue(settings.coordinator_url, token=settings.coordinator_token) if settings.coordinator_url else None
+        self.db = DBManager(db_path if db_path else settings.db_path, queue=queue)
+        self.leased = deque()
         self.model_name = model_name if model_name else settings.model_name
         self.generator = None
         self.auditor = None
         self.fact_checker = None
+        self.dedup_index = None
+        self.answer_index = None
 
     def initialize_engine(self):
         logger.info("[bold cyan]Initializing Inference and Verification Engines...[/]")
+        # Imported here so the worker loop can run without vLLM (benchmarks, stub generators)
+        from inference.generator import FlashcardGenerator
         try:
             # Utilization 0.7 leaves room for Embeddings and Cross-Encoders.
             self.generator = FlashcardGenerator(
                 model_name=self.model_name, 
                 gpu_memory_utilization=0.7,
-                max_model_len=4096
+                max_model_len=4096,
+                structured_output=settings.structured_output
             )
-            self.auditor = CoverageAuditor()
-            self.fact_checker = FactChecker()
+            self.auditor = CoverageAuditor(
+                backend=settings.verification_backend,
+                num_threads=settings.verification_threads
+            )
+            self.fact_checker = FactChecker(
+                batch_size=settings.fact_check_batch_size,
+                backend=settings.verification_backend,
+                num_threads=settings.verification_threads
+            )
+            if settings.dedup_enabled:
+                # Reuses the auditor's embedding model
+                self.dedup_index = DuplicateIndex(
+                    target_notebook,
+                    self.auditor.model,
+                    threshold=settings.dedup_threshold
+                )
+            if settings.semantic_index_enabled:
+                self.answer_index = AnswerIndex(
+                    target_notebook,
+                    dim=self.auditor.model.get_sentence_embedding_dimension()
+                )
         except Exception as e:
             logger.error(f"Failed to initialize engines: {e}")
             raise
 
+    def process_job(self, job):
+        """
+        Runs one claimed chunk through generation, audit, repair, fact check and
+        near-duplicate flagging, then commits it. Returns the number of cards kept.
+        Exceptions propagate; the caller marks the chunk FAILED. Token usage is
+        recorded right after each LLM call, so it is kept for failed chunks too.
+        """
+        chunk_id = job["chunk_id"]
+        text = job["source_text"]
+        filename = (job.get("metadata") or {}).get("source_file")
+
+        def span(stage):
+            return metrics.span(stage, chunk_id=chunk_id, notebook=target_notebook, filename=filename)
+
+        with span("worker.chunk"):
+            # 1. Primary Extraction
+            with span("worker.generate"):
+                result = self.generator.generate_cards(text)
+            self._record_usage(chunk_id, filename, result.get("usage"))
+            cards = result.get("flashcards", [])
+
+            # 2. Coverage Audit (CoV Loop)
+            with span("worker.audit"):
+                uncovered, score = self.auditor.audit_coverage(text, cards)
+
+            if uncovered and score < 0.90:
+                with span("worker.repair"):
+                    repair_result = self.generator.generate_repair_cards(uncovered)
+                    self._record_usage(chunk_id, filename, repair_result.get("usage"))
+                    repair_cards = repair_result.get("flashcards", [])
+                    cards.extend(repair_cards)
+                    _, final_score = self.auditor.audit_coverage(text, cards)
+                score = final_score
+
+            # 3. Fact Check (all cards of the chunk in one batch)
+            with span("worker.fact_check"):
+                fact_scores = self.fact_checker.verify_batch(cards)
+            kept = [i for i, fact_score in enumerate(fact_scores) if fact_score > 0.4]
+            answer_vectors = self.auditor.last_card_embeddings
+            cards = [cards[i] for i in kept]
+
+            # 4. Near-duplicate flagging against the notebook's committed cards
+            unique_ids, unique_vectors = [], None
+            if self.dedup_index:
+                with span("worker.dedup"):
+                    unique_ids, unique_vectors = self.dedup_index.flag_duplicates(chunk_id, cards)
+
+            # 5. Commit
+            with span("worker.commit"):
+                accepted = self.db.update_chunk_status(
+                    chunk_id=chunk_id,
+                    status='COMPLETED',
+                    output_json=json.dumps({"flashcards": cards}),
+                    verification_score=score,
+                    notebook=target_notebook,
+                    card_count=len(cards)
+                )
+                if not accepted:
+                    logger.warning(f"[{chunk_id}] Lease was taken over by another worker, result dropped.")
+                    return 0
+                if self.dedup_index:
+                    self.dedup_index.add(unique_ids, unique_vectors)
+                if self.answer_index and cards:
+                    # Reuse the audit's embeddings; re-encode only if the audit skipped them
+                    if answer_vectors is not None and len(answer_vectors) == len(fact_scores):
+                        answer_vectors = answer_vectors[kept]
+                    else:
+                        answer_vectors = self.auditor.embed_answers(cards)
+                    self.answer_index.add(chunk_id, answer_vectors)
+        return len(cards)
+
+    def _record_usage(self, chunk_id, filename, usage):
+        if not usage:
+            return
+        # Best effort: losing a stats row must not fail a generated chunk
+        try:
+            self.db.record_generation_stats([(
+                chunk_id, target_notebook, filename, self.model_name, usage["kind"], usage["prompt_tokens"],
+                usage["completion_tokens"], usage["finish_reason"], usage["wall_s"]
+            )])
+        except CoordinatorError as e:
+            logger.warning(f"[{chunk_id}] Token stats not recorded: {e}")
+
+    def mark_failed(self, chunk_id, error_log):
+        # An unreachable coordinator must not stop the worker: the lease
+        # expires and the chunk is handed out again
+        try:
+            self.db.update_chunk_status(chunk_id=chunk_id, status='FAILED', error_log=error_log, notebook=target_notebook)
+        except CoordinatorError as e:
+            logger.error(f"[{chunk_id}] Could not mark the chunk as failed, its lease will expire: {e}")
+
+    def next_job(self):
+        """
+        Returns the next claimed chunk, or None when the queue is empty. Claims
+        settings.queue_batch_size chunks at a time; the leases of a batch's
+        remaining chunks are renewed before each one is started.
+        While the coordinator is unreachable, retries with a growing delay.
+        """
+        delay = 5
+        while True:
+            try:
+                return self._next_job()
+            except CoordinatorError as e:
+                logger.warning(f"Coordinator unavailable, retrying in {delay}s: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, 60)
+
+    def _next_job(self):
+        if self.leased:
+            held = set(self.db.renew_leases([job["chunk_id"] for job in self.leased]))
+            for job in self.leased:
+                if job["chunk_id"] not in held:
+                    logger.warning(f"Lease on {job['chunk_id']} expired, skipping it.")
+            self.leased = deque(job for job in self.leased if job["chunk_id"] in held)
+        if not self.leased:
+            self.leased.extend(self.db.claim_chunks(target_notebook, settings.queue_batch_size))
+        return self.leased.popleft() if self.leased else None
+
     def run(self):
         if not self.generator:
             self.initialize_engine()
 
+        profiler = Profiler("worker", unit="chunks")
         initial_count = self.db.get_pending_count(target_notebook)
         logger.info(f"Worker loop started. [bold cyan]{initial_count}[/] jobs pending.")
         
@@ -69,67 +219,41 @@ class StudyWorker:
             signal.signal(signal.SIGALRM, timeout_handler)
             
             idle_count = 0
-            while True:
-                job = self.db.get_pending_chunk(target_notebook)
-                
-                if job:
-                    idle_count = 0
-                    chunk_id = job["chunk_id"]
-                    text = job["source_text"]
-                    logger.info(f"Processing chunk: [bold cyan]{chunk_id}[/]")
-                    
-                    signal.alarm(600)
-                    try:
-                        # 1. Primary Extraction
-                        result = self.generator.generate_cards(text)
-                        cards = result.get("flashcards", [])
-                        
-                        # 2. Coverage Audit (CoV Loop)
-                        uncovered, score = self.auditor.audit_coverage(text, cards)
-                        
-                        if uncovered and score < 0.90:
-                            repair_text = "\n".join(uncovered)
-                            repair_prompt = REPAIR_PROMPT_TEMPLATE.format(uncovered_text=repair_text)
-                            repair_outputs = self.generator.llm.generate([repair_prompt], self.generator.sampling_params)
-                            repair_result = self.generator.parse_json_output(repair_outputs[0].outputs[0].text)
-                            repair_cards = repair_result.get("flashcards", [])
-                            cards.extend(repair_cards)
-                            _, final_score = self.auditor.audit_coverage(text, cards)
-                            score = final_score
-
-                        # 3. Fact Check
-                        verified_cards = []
-                        for i, card in enumerate(cards):
-                            if self.fact_checker.verify_consistency(card) > 0.4:
-                                verified_cards.append(card)
-                        cards = verified_cards
-
-                        # 4. Commit
-                        self.db.update_chunk_status(
-                            chunk_id=chunk_id,
-                            status='COMPLETED',
-                            output_json=json.dumps({"flashcards": cards}),
-                            verification_score=score,
-                            notebook=target_notebook
-                        )
-                        logger.info(f"[{chunk_id}] Completed. [bold green]{len(cards)}[/] cards.")
-
-                    except TimeoutException:
-                        logger.error(f"Timed out: {chunk_id}")
-                        self.db.update_chunk_status(chunk_id=chunk_id, status='FAILED', error_log="Timeout", notebook=target_notebook)
-                    except Exception as e:
-                        logger.error(f"Error: {e}")
-                        self.db.update_chunk_status(chunk_id=chunk_id, status='FAILED', error_log=str(e), notebook=target_notebook)
-                    finally:
-                        signal.alarm(0)
-                    
-                    progress.advance(task_id)
-                else:
-                    idle_count += 1
-                    if idle_count >= 2:
-                        logger.info("Worker shutting down due to inactivity.")
-                        break
-                    time.sleep(5)
+            # The profile is written however the loop ends (idle, cancel, Ctrl-C, error)
+            try:
+                while True:
+                    job = self.next_job()
+
+                    if job:
+                        idle_count = 0
+                        chunk_id = job["chunk_id"]
+                        logger.info(f"Processing chunk: [bold cyan]{chunk_id}[/]")
+
+                        signal.alarm(600)
+                        try:
+                            with profiler.window():
+                                card_count = self.process_job(job)
+                            logger.info(f"[{chunk_id}] Completed. [bold green]{card_count}[/] cards.")
+
+                        except TimeoutException:
+                            logger.error(f"Timed out: {chunk_id}")
+                            self.mark_failed(chunk_id, "Timeout")
+                        except Exception as e:
+                            logger.error(f"Error: {e}")
+                            self.mark_failed(chunk_id, str(e))
+                        finally:
+                            signal.alarm(0)
+                            metrics.flush()
+
+                        progress.advance(task_id)
+                    else:
+                        idle_count += 1
+                        if idle_count >= 2:
+                            logger.info("Worker shutting down due to inactivity.")
+                            break
+                        time.sleep(5)
+            finally:
+                profiler.finish()
 
 
 if __name__ == "__main__":
@@ -141,6 +265,7 @@ if __name__ == "__main__":
     override_model = os.getenv("MODEL_NAME")
     final_model = override_model if override_model else settings.model_name
     
+    exit_on_sigterm()
     worker = StudyWorker(model_name=final_model)
     try:
         worker.run()